@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+import sys
+
+from scripts.audit import AuditBudgets, audit_images, display_audit
+from scripts.images import build_image_index
+from scripts.manifest import get_manifest_path, load_manifest, save_manifest
+
+AUDIT_CACHE_PATH = os.path.join(".cache", "image_audit.json")
+
+
+def main(folders, budgets: AuditBudgets, report_path, workers: int) -> int:
+    image_index = build_image_index()
+    manifest_path = get_manifest_path("audit")
+
+    report, manifest, audit_cache = audit_images(
+        image_index, budgets, folders or None, load_manifest(manifest_path), load_manifest(AUDIT_CACHE_PATH), workers
+    )
+    save_manifest(manifest, manifest_path)
+    save_manifest(audit_cache, AUDIT_CACHE_PATH)
+
+    display_audit(report)
+
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(
+                {
+                    "images": report.images,
+                    "findings": [{"file": finding.file, "problem": finding.problem} for finding in report.findings],
+                },
+                f,
+                indent=2,
+            )
+
+    return 0 if report.ok else 1
+
+
+if __name__ == "__main__":
+    defaults = AuditBudgets()
+    parser = argparse.ArgumentParser(description="Decode every icon and check it against size and dimension budgets.")
+    parser.add_argument("folders", nargs="*", help="Image folders to audit (default: all of them)")
+    parser.add_argument("--max-bytes", type=int, default=defaults.max_bytes, help="Largest allowed file size")
+    parser.add_argument("--min-dimension", type=int, default=defaults.min_dimension, help="Smallest allowed side")
+    parser.add_argument("--max-dimension", type=int, default=defaults.max_dimension, help="Largest allowed side")
+    parser.add_argument("--allow-non-square", action="store_true", help="Don't require width == height")
+    parser.add_argument(
+        "--exact-dimensions",
+        type=int,
+        nargs=2,
+        metavar=("WIDTH", "HEIGHT"),
+        help="Require exactly these dimensions instead of a range",
+    )
+    parser.add_argument("--report", help="Write every icon's properties and the failures as JSON to this path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes decoding icons")
+    args = parser.parse_args()
+
+    budgets = AuditBudgets(
+        max_bytes=args.max_bytes,
+        min_dimension=args.min_dimension,
+        max_dimension=args.max_dimension,
+        require_square=not args.allow_non_square,
+        exact_dimensions=tuple(args.exact_dimensions) if args.exact_dimensions else None,
+    )
+    sys.exit(main(args.folders, budgets, args.report, args.workers))
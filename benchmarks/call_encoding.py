@@ -0,0 +1,118 @@
+"""
+CPU time per 10k ERC-20 metadata calls to build the aggregate3 payload and decode its response,
+comparing the previous path (a web3 contract per token, encodeABI per call, eth_abi for the batch,
+get_function_by_name and an eth_abi decode per result) with precomputed selectors, direct batch
+encoding/decoding and cached decoders. A share of the tokens returns name and symbol as bytes32,
+which only the new path decodes.
+
+    python -m benchmarks.call_encoding --tokens 10000 --bytes32 0.05
+"""
+
+import argparse
+import time
+
+from eth_abi import decode, encode
+from hexbytes import HexBytes
+from rich.console import Console
+from rich.table import Table
+from web3 import Web3
+
+from benchmarks.mock_node import encode_metadata, synthetic_tokens
+from scripts.calls import decode_aggregate3, decode_results, erc20_metadata_calls
+from scripts.constants import ERC20_ABI
+from scripts.utils import AGGREGATE3_SELECTOR, encode_aggregate3
+
+console = Console()
+
+
+def return_data(tokens):
+    """What a node returns for the name, symbol and decimals calls of every token."""
+    results = []
+    for token in tokens:
+        metadata_type = "bytes32" if token.bytes32_metadata else "string"
+        results.append(encode([metadata_type], [encode_metadata(token.name, token.bytes32_metadata)]))
+        results.append(encode([metadata_type], [encode_metadata(token.symbol, token.bytes32_metadata)]))
+        results.append(encode(["uint8"], [token.decimals]))
+    return results
+
+
+def legacy_build(w3, addresses):
+    calls = []
+    for address in addresses:
+        contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=ERC20_ABI)
+        calls.extend([(contract, "name", []), (contract, "symbol", []), (contract, "decimals", [])])
+    return calls
+
+
+def legacy_encode(calls):
+    encoded = [
+        (contract.address, True, HexBytes(contract.encodeABI(fn_name=fn_name, args=args)))
+        for contract, fn_name, args in calls
+    ]
+    return AGGREGATE3_SELECTOR + encode(["(address,bool,bytes)[]"], [encoded])
+
+
+def legacy_decode(calls, response):
+    decoded = []
+    for (contract, fn_name, _), (_, data) in zip(calls, decode(["(bool,bytes)[]"], response)[0]):
+        function = contract.get_function_by_name(fn_name)
+        output_types = [output["type"] for output in function.abi["outputs"]]
+        try:
+            decoded.append(decode(output_types, data))
+        except Exception:
+            decoded.append(None)
+    return decoded
+
+
+def timed(function, *args):
+    start = time.process_time()
+    result = function(*args)
+    return result, time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=10000, help="Number of tokens (3 calls each)")
+    parser.add_argument("--bytes32", type=float, default=0.05, help="Share of tokens with bytes32 name and symbol")
+    args = parser.parse_args()
+
+    tokens = synthetic_tokens(args.tokens, bytes32=int(args.tokens * args.bytes32))
+    addresses = [token.address.lower() for token in tokens]
+    results = return_data(tokens)
+    response = encode(["(bool,bytes)[]"], [[(True, data) for data in results]])
+    per_10k = 10_000 / len(results)
+
+    w3 = Web3()
+    legacy_calls, legacy_build_time = timed(legacy_build, w3, addresses)
+    _, legacy_encode_time = timed(legacy_encode, legacy_calls)
+    legacy_decoded, legacy_decode_time = timed(legacy_decode, legacy_calls, response)
+
+    calls, build_time = timed(lambda: [call for address in addresses for call in erc20_metadata_calls(address)])
+    _, encode_time = timed(encode_aggregate3, calls)
+    decoded, decode_time = timed(lambda: decode_results(calls, [data for _, data in decode_aggregate3(response)], []))
+
+    # Both paths agree wherever the previous one could decode
+    assert all(old is None or old == new for old, new in zip(legacy_decoded, decoded))
+
+    table = Table(title=f"CPU time per 10k calls ({len(results)} calls timed)")
+    table.add_column("Step", style="cyan")
+    table.add_column("Contract objects", style="red")
+    table.add_column("Selectors + cached decoders", style="green")
+    table.add_column("Speedup", style="yellow")
+    for step, old, new in (
+        ("build calls", legacy_build_time, build_time),
+        ("encode", legacy_encode_time, encode_time),
+        ("decode", legacy_decode_time, decode_time),
+        ("total", legacy_build_time + legacy_encode_time + legacy_decode_time, build_time + encode_time + decode_time),
+    ):
+        table.add_row(step, f"{old * per_10k * 1000:.1f} ms", f"{new * per_10k * 1000:.1f} ms", f"{old / new:.0f}x")
+    console.print(table)
+
+    console.print(
+        f"Undecodable results: {sum(result is None for result in legacy_decoded)} before, "
+        f"{sum(result is None for result in decoded)} after (bytes32 name/symbol)"
+    )
+
+
+if __name__ == "__main__":
+    main()
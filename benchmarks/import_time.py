@@ -0,0 +1,77 @@
+"""
+Import time of the offline commands, read from `python -X importtime`. Fails when a command imports
+one of the slow dependencies only needed to reach a node or GitHub (web3 and eth_abi alone take
+about two seconds), or when its imports take longer than the budget. Runs as a pre-commit hook, so
+a top-level import that drags them back in is caught before it is committed.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget 0.3
+"""
+
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+# Commands that must not need a node, GitHub or the schema
+COMMANDS = {
+    "python -m scripts --help": ["-m", "scripts", "--help"],
+    "python -m scripts scan --quiet": ["-m", "scripts", "scan", "--quiet"],
+    "python upkeep.py --help": ["upkeep.py", "--help"],
+}
+FORBIDDEN = ("web3", "eth_abi", "eth_account", "github", "aiohttp", "pydantic")
+
+
+def parse_importtime(stderr: str) -> Dict[str, float]:
+    """Seconds spent importing each module itself (children excluded), keyed by module name."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")  # noqa: E203
+        modules[name.strip()] = int(self_us) / 1e6
+    return modules
+
+
+def measure(args: List[str]) -> Tuple[float, List[str]]:
+    """Total import time of a command and the forbidden modules it imported."""
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with {result.returncode}:\n{result.stderr[-2000:]}")
+    modules = parse_importtime(result.stderr)
+    forbidden = sorted({name.split(".")[0] for name in modules if name.split(".")[0] in FORBIDDEN})
+    return sum(modules.values()), forbidden
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=0.5, help="Allowed import time per command, in seconds")
+    args = parser.parse_args()
+
+    table = Table(title=f"Import time of offline commands (budget {args.budget:.2f}s)")
+    table.add_column("Command", style="cyan")
+    table.add_column("Imports", style="green")
+    table.add_column("Slow dependencies", style="red")
+    failures = []
+    for command, command_args in COMMANDS.items():
+        total, forbidden = measure(command_args)
+        table.add_row(command, f"{total:.3f}s", ", ".join(forbidden))
+        if forbidden:
+            failures.append(f"{command} imports {', '.join(forbidden)}")
+        if total > args.budget:
+            failures.append(f"{command} spends {total:.3f}s importing, over the {args.budget:.2f}s budget")
+    console.print(table)
+
+    for failure in failures:
+        console.print(f"[red]{failure}[/red]")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import asyncio
+import random
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from eth_abi import decode, encode
+from web3 import Web3
+
+from scripts.constants import MULTICALL_ADDRESS
+from scripts.rpc import decode_hex, encode_hex
+
+
+def selector(signature: str) -> bytes:
+    return bytes(Web3.keccak(text=signature)[:4])
+
+
+AGGREGATE = selector("aggregate((address,bytes)[])")
+AGGREGATE3 = selector("aggregate3((address,bool,bytes)[])")
+NAME = selector("name()")
+SYMBOL = selector("symbol()")
+DECIMALS = selector("decimals()")
+
+
+@dataclass(frozen=True)
+class MockToken:
+    address: str
+    name: str
+    symbol: str
+    decimals: int = 18
+    reverts: bool = False
+    # Older tokens (MKR, SAI, ...) return name and symbol as bytes32
+    bytes32_metadata: bool = False
+
+
+# Rough gas of one ERC-20 metadata call inside a multicall, for nodes with an eth_call gas cap
+CALL_GAS = 30_000
+
+
+def encode_metadata(value: str, as_bytes32: bool):
+    return value.encode().ljust(32, b"\0") if as_bytes32 else value
+
+
+class CallReverted(Exception):
+    pass
+
+
+class NodeLimitExceeded(Exception):
+    """A node-side cap on eth_call (gas or response size) was hit, reported as a plain JSON-RPC error."""
+
+
+class MockNode:
+    """
+    Local JSON-RPC stand-in for an EVM node, serving `eth_chainId`, `eth_blockNumber` and `eth_call`
+    against Multicall `aggregate`/`aggregate3` for a set of synthetic ERC-20 tokens.
+
+    Every HTTP request and JSON-RPC call is counted, so benchmarks can compare how many round trips
+    a code path needs. Like hosted endpoints, the node can cap eth_call gas (`gas_limit`, at CALL_GAS
+    per call) and return data size (`max_response_bytes`), and answer after `latency` seconds plus
+    `latency_per_call` for each call executed, plus up to `jitter` seconds at random (seeded by
+    `seed`). Its first `rate_limited_requests` HTTP requests are answered, in an HTTP 200, with a
+    JSON-RPC rate limit error for every call. The node runs its own event loop in a background thread:
+
+        with MockNode(1, tokens) as node:
+            w3 = Web3(Web3.HTTPProvider(node.url))
+    """
+
+    def __init__(
+        self,
+        chain_id: int,
+        tokens: Iterable[MockToken],
+        block_number: int = 20_000_000,
+        supports_aggregate3: bool = True,
+        gas_limit: Optional[int] = None,
+        max_response_bytes: Optional[int] = None,
+        latency: float = 0.0,
+        latency_per_call: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 1,
+        rate_limited_requests: int = 0,
+    ):
+        self.chain_id = chain_id
+        self.tokens: Dict[str, MockToken] = {token.address.lower(): token for token in tokens}
+        self.block_number = block_number
+        self.supports_aggregate3 = supports_aggregate3
+        self.gas_limit = gas_limit
+        self.max_response_bytes = max_response_bytes
+        self.latency = latency
+        self.latency_per_call = latency_per_call
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self.rate_limited_requests = rate_limited_requests
+        self.http_requests = 0
+        self.rpc_calls: Counter = Counter()
+        self.rpc_errors: Counter = Counter()
+        self.calls_executed = 0
+        self.url = ""
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def reset_counters(self) -> None:
+        self.http_requests = 0
+        self.rpc_calls.clear()
+        self.rpc_errors.clear()
+        self.calls_executed = 0
+
+    def check_limits(self, call_count: int, return_data: bytes) -> bytes:
+        if self.gas_limit is not None and call_count * CALL_GAS > self.gas_limit:
+            raise NodeLimitExceeded(f"gas required exceeds allowance ({self.gas_limit})")
+        if self.max_response_bytes is not None and len(return_data) > self.max_response_bytes:
+            raise NodeLimitExceeded(f"response size exceeded: {len(return_data)} > {self.max_response_bytes} bytes")
+        return return_data
+
+    # Token calls
+
+    def call_token(self, target: str, data: bytes) -> bytes:
+        self.calls_executed += 1
+        token = self.tokens.get(target.lower())
+        if token is None:
+            # Calling an address without code succeeds with empty return data
+            return b""
+        if token.reverts:
+            raise CallReverted(f"{target} reverted")
+
+        metadata_type = "bytes32" if token.bytes32_metadata else "string"
+        if data[:4] == NAME:
+            return encode([metadata_type], [encode_metadata(token.name, token.bytes32_metadata)])
+        if data[:4] == SYMBOL:
+            return encode([metadata_type], [encode_metadata(token.symbol, token.bytes32_metadata)])
+        if data[:4] == DECIMALS:
+            return encode(["uint8"], [token.decimals])
+        raise CallReverted(f"Unknown selector {data[:4].hex()}")
+
+    def aggregate(self, data: bytes) -> bytes:
+        (calls,) = decode(["(address,bytes)[]"], data)
+        return_data = [self.call_token(target, call_data) for target, call_data in calls]
+        return self.check_limits(len(calls), encode(["uint256", "bytes[]"], [self.block_number, return_data]))
+
+    def aggregate3(self, data: bytes) -> bytes:
+        (calls,) = decode(["(address,bool,bytes)[]"], data)
+        results = []
+        for target, allow_failure, call_data in calls:
+            try:
+                results.append((True, self.call_token(target, call_data)))
+            except CallReverted:
+                if not allow_failure:
+                    raise
+                results.append((False, b""))
+        return self.check_limits(len(calls), encode(["(bool,bytes)[]"], [results]))
+
+    def eth_call(self, params: List) -> bytes:
+        call = params[0]
+        data = decode_hex(call.get("data") or call.get("input", "0x"))
+        if call["to"].lower() != MULTICALL_ADDRESS.lower():
+            return self.call_token(call["to"], data)
+        if data[:4] == AGGREGATE:
+            return self.aggregate(data[4:])
+        if data[:4] == AGGREGATE3 and self.supports_aggregate3:
+            return self.aggregate3(data[4:])
+        raise CallReverted(f"Unknown multicall selector {data[:4].hex()}")
+
+    # JSON-RPC handling
+
+    def dispatch(self, request: Dict) -> Dict:
+        method = request.get("method")
+        self.rpc_calls[method] += 1
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        if self.http_requests <= self.rate_limited_requests:
+            self.rpc_errors[method] += 1
+            reply["error"] = {"code": -32005, "message": "Too many requests, rate limit exceeded"}
+            return reply
+        try:
+            if method == "eth_chainId":
+                reply["result"] = hex(self.chain_id)
+            elif method == "eth_blockNumber":
+                reply["result"] = hex(self.block_number)
+            elif method == "eth_call":
+                reply["result"] = encode_hex(self.eth_call(request.get("params", [])))
+            else:
+                reply["error"] = {"code": -32601, "message": f"Method {method} not found"}
+        except CallReverted as e:
+            reply["error"] = {"code": 3, "message": f"execution reverted: {e}"}
+        except NodeLimitExceeded as e:
+            self.rpc_errors[method] += 1
+            reply["error"] = {"code": -32000, "message": str(e)}
+        return reply
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.http_requests += 1
+        payload = await request.json()
+        executed = self.calls_executed
+        replies = [self.dispatch(item) for item in payload] if isinstance(payload, list) else self.dispatch(payload)
+        # Dispatch never awaits, so the difference only counts this request's calls
+        delay = self.latency + self.latency_per_call * (self.calls_executed - executed)
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response(replies)
+
+    # Lifecycle
+
+    async def _start(self) -> Tuple[str, int]:
+        app = web.Application(client_max_size=64 * 1024**2)
+        app.router.add_post("/", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[:2]
+
+    def start(self) -> str:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        host, port = asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        self.url = f"http://{host}:{port}/"
+        return self.url
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "MockNode":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def spread(i: int, share: int, count: int) -> bool:
+    """Whether the i-th of `count` items is one of `share` items spread evenly among them."""
+    return (i * share) // count != ((i + 1) * share) // count
+
+
+def synthetic_tokens(count: int, reverting: int = 0, seed: int = 1, bytes32: int = 0) -> List[MockToken]:
+    """
+    Generate `count` deterministic tokens, `reverting` of which (spread evenly) revert on every call and
+    `bytes32` of which return name and symbol as bytes32.
+    """
+    tokens = []
+    for i in range(count):
+        address = Web3.to_checksum_address(Web3.keccak(text=f"token-{seed}-{i}")[-20:])
+        tokens.append(
+            MockToken(
+                address,
+                f"Token {i}",
+                f"TKN{i}",
+                18,
+                reverts=spread(i, reverting, count),
+                # Counted from the end, so they don't coincide with the reverting ones
+                bytes32_metadata=spread(count - 1 - i, bytes32, count),
+            )
+        )
+    return tokens
@@ -0,0 +1,83 @@
+"""
+Compare fixed 1000-call multicall batches with adaptive batch sizing against mock nodes with different
+eth_call caps and latencies. Each adaptive chain runs twice: with a fresh sizer, then with the sizer
+state a first run would have persisted.
+
+    python -m benchmarks.multicall_batching --tokens 5000
+"""
+
+import argparse
+import time
+
+from rich.console import Console
+from rich.table import Table
+from web3 import Web3
+
+from benchmarks.mock_node import CALL_GAS, MockNode, synthetic_tokens
+from scripts import utils
+from scripts.batching import BatchSizer
+from scripts.calls import erc20_metadata_calls
+from scripts.constants import NETWORKS
+from scripts.rpc import EndpointPool, RPCError
+
+console = Console()
+
+# name -> MockNode limits
+PROFILES = {
+    "uncapped": {"latency": 0.05, "latency_per_call": 0.00002},
+    "gas cap (600 calls)": {"gas_limit": 600 * CALL_GAS, "latency": 0.05, "latency_per_call": 0.00002},
+    "64 KiB response cap": {"max_response_bytes": 64 * 1024, "latency": 0.05, "latency_per_call": 0.00002},
+}
+
+
+def run(tokens, w3, calls, limits, sizer=None):
+    with MockNode(1, tokens, **limits) as node:
+        start = time.perf_counter()
+        try:
+            results, _ = utils.multicall(
+                w3, calls, NETWORKS["ethereum"], endpoint_pool=EndpointPool([node.url]), batch_sizer=sizer
+            )
+            assert len(results) == len(calls)
+            outcome = "ok"
+        except RPCError as e:
+            outcome = f"failed: {e}"
+        elapsed = time.perf_counter() - start
+    return node.rpc_calls["eth_call"], node.rpc_errors["eth_call"], elapsed, outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=5000, help="Number of tokens (3 calls each)")
+    args = parser.parse_args()
+
+    utils.console.quiet = True
+    tokens = synthetic_tokens(args.tokens)
+    # Every run sends the calls to its own node
+    w3 = Web3()
+    calls = [call for token in tokens for call in erc20_metadata_calls(token.address)]
+
+    table = Table(title=f"multicall of {args.tokens * 3} calls")
+    table.add_column("Node", style="cyan")
+    table.add_column("Batching", style="cyan")
+    table.add_column("eth_calls", style="green")
+    table.add_column("Capped", style="red")
+    table.add_column("Time", style="magenta")
+    table.add_column("Batch size after", style="yellow")
+    table.add_column("Outcome")
+
+    for name, limits in PROFILES.items():
+        eth_calls, capped, elapsed, outcome = run(tokens, w3, calls, limits)
+        table.add_row(name, "fixed 1000", str(eth_calls), str(capped), f"{elapsed:.2f}s", "1000", outcome)
+
+        sizer = BatchSizer()
+        for label in ("adaptive, first run", "adaptive, next run"):
+            eth_calls, capped, elapsed, outcome = run(tokens, w3, calls, limits, sizer)
+            table.add_row(name, label, str(eth_calls), str(capped), f"{elapsed:.2f}s", str(sizer.size), outcome)
+            # What the next run loads from the batch size store
+            sizer = BatchSizer.from_dict(sizer.to_dict())
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
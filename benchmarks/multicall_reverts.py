@@ -0,0 +1,71 @@
+"""
+Count the RPC round trips multicall needs when some tokens in a batch revert, comparing
+`aggregate3` (per-call allowFailure) against `aggregate` with recursive bisection.
+
+    python -m benchmarks.multicall_reverts --tokens 333 --reverting 0 1 5 10 50
+"""
+
+import argparse
+import time
+
+from rich.console import Console
+from rich.table import Table
+from web3 import Web3
+
+from benchmarks.mock_node import MockNode, synthetic_tokens
+from scripts import utils
+from scripts.calls import erc20_metadata_calls
+from scripts.constants import NETWORKS
+
+console = Console()
+
+
+def run(token_count: int, reverting: int, use_aggregate3: bool, batch_size: int):
+    tokens = synthetic_tokens(token_count, reverting=reverting)
+    with MockNode(1, tokens) as node:
+        w3 = Web3(Web3.HTTPProvider(node.url))
+        calls = [call for token in tokens for call in erc20_metadata_calls(token.address)]
+
+        node.reset_counters()
+        start = time.perf_counter()
+        results, failed_calls = utils.multicall(
+            w3, calls, NETWORKS["ethereum"], batch_size=batch_size, use_aggregate3=use_aggregate3
+        )
+        elapsed = time.perf_counter() - start
+
+    return node.rpc_calls["eth_call"], len(failed_calls), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=333, help="Number of tokens (3 calls each)")
+    parser.add_argument("--reverting", type=int, nargs="+", default=[0, 1, 5, 10, 50])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    utils.console.quiet = True
+
+    table = Table(title=f"eth_calls for {args.tokens * 3} calls with N reverting tokens")
+    table.add_column("Reverting tokens", style="cyan")
+    table.add_column("aggregate (bisection)", style="yellow")
+    table.add_column("aggregate3", style="green")
+    table.add_column("Failed calls", style="red")
+    table.add_column("Time bisection / aggregate3", style="magenta")
+
+    for reverting in args.reverting:
+        bisect_calls, bisect_failed, bisect_time = run(args.tokens, reverting, False, args.batch_size)
+        agg3_calls, agg3_failed, agg3_time = run(args.tokens, reverting, True, args.batch_size)
+        assert bisect_failed == agg3_failed, "aggregate and aggregate3 disagree on failed calls"
+        table.add_row(
+            str(reverting),
+            str(bisect_calls),
+            str(agg3_calls),
+            str(agg3_failed),
+            f"{bisect_time:.3f}s / {agg3_time:.3f}s",
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Report the published size (raw, gzip, brotli) and JSON parse time of tokenlists for every output profile.
+
+    python -m benchmarks.output_sizes curve_tokenlist.json
+    python -m benchmarks.output_sizes --from-pages ethereum arbitrum all_networks
+"""
+
+import argparse
+
+from rich.console import Console
+from rich.table import Table
+
+from scripts.output import OUTPUT_PROFILES, size_report
+from scripts.pages import load_gh_pages_tokenlist
+from scripts.stream import load_tokenlist
+
+console = Console()
+
+REPO_NAME = "curvefi/curve-assets"
+
+
+def format_bytes(size) -> str:
+    return f"{size / 1024:.1f} KiB" if size is not None else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="Local tokenlist files")
+    parser.add_argument("--from-pages", nargs="+", default=[], metavar="NAME", help="Published <NAME>.json files")
+    args = parser.parse_args()
+
+    tokenlists = {path: load_tokenlist(path) for path in args.paths}
+    for name in args.from_pages:
+        tokenlists[f"{name}.json"] = load_gh_pages_tokenlist(REPO_NAME, f"{name}.json")
+
+    table = Table(title="Tokenlist size and parse time per output profile")
+    table.add_column("File", style="cyan")
+    table.add_column("Tokens", style="cyan")
+    for profile in OUTPUT_PROFILES:
+        table.add_column(f"{profile} raw / gzip / br", style="yellow")
+        table.add_column(f"{profile} parse", style="green")
+
+    for path, tokenlist in tokenlists.items():
+        if not tokenlist:
+            console.print(f"[red]Could not load {path}[/red]")
+            continue
+        report = size_report(tokenlist)
+        row = [path, str(len(tokenlist.get("tokens", [])))]
+        for profile in OUTPUT_PROFILES:
+            entry = report[profile]
+            row.append(" / ".join(format_bytes(entry[key]) for key in ("bytes", "gzip_bytes", "brotli_bytes")))
+            row.append(f"{entry['parse_seconds'] * 1000:.1f} ms")
+        table.add_row(*row)
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+End-to-end benchmark of the generation pipeline against local mock nodes, with no network access.
+
+For each size, a synthetic images/ tree is spread over several networks and every network gets a
+MockNode serving its tokens. A fresh interpreter then runs the stages one after the other:
+
+    index    build_image_index + scan_images_folder
+    process  process_network for every network (RPC against the mock nodes)
+    update   update_tokenlist, including validation
+    render   serialization with the chosen output profile
+
+and reports per stage the wall time, throughput in icons per second and the peak memory the stage
+allocated, next to the RPC requests the mock nodes served. Memory is traced with tracemalloc, so
+every stage is measured on its own, in a second run whose timings are dropped: tracing slows the
+stages down several times. Results can be saved with --json and
+checked against a saved baseline with --baseline, which exits with an error when any run needed
+more RPC requests or calls, or a stage of a run of at least --timed-size icons got slower than the
+tolerance. Shorter runs are over in a fraction of a second, too noisy to gate CI on their timings.
+
+    python -m benchmarks.pipeline --sizes 1000 10000 100000
+    python -m benchmarks.pipeline --sizes 1000 10000 --json results.json
+    python -m benchmarks.pipeline --sizes 1000 10000 --baseline results.json --tolerance 0.5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.mock_node import MockNode, synthetic_tokens
+from scripts.constants import NETWORKS
+from scripts.output import OUTPUT_PROFILES
+
+console = Console()
+
+STAGES = ("index", "process", "update", "render")
+# Minimal PNG signature, the pipeline never decodes icons
+ICON = b"\x89PNG\r\n\x1a\n"
+# Slowdowns below this many seconds are noise, whatever the tolerance
+MIN_SLOWDOWN = 0.05
+# Smallest run whose timings are compared against the baseline
+TIMED_SIZE = 10000
+
+
+def build_tree(images_dir: str, size: int, networks: int, reverting: float):
+    """Write `size` icons spread over the first `networks` networks, returning their tokens by network."""
+    tokens_by_network = {}
+    names = [name for name in NETWORKS if NETWORKS[name].folder_name][:networks]
+    for k, network in enumerate(names):
+        count = size // len(names) + (1 if k < size % len(names) else 0)
+        tokens = synthetic_tokens(count, reverting=int(count * reverting), seed=k)
+        folder = os.path.join(images_dir, NETWORKS[network].folder_name)
+        os.makedirs(folder)
+        for token in tokens:
+            with open(os.path.join(folder, f"{token.address.lower()}.png"), "wb") as f:
+                f.write(ICON)
+        tokens_by_network[network] = tokens
+    return tokens_by_network
+
+
+@contextmanager
+def measure(results: dict, stage: str):
+    """
+    Record the wall time of a stage and, when tracemalloc is tracing, the most memory it had allocated
+    on top of what it started with.
+    """
+    tracemalloc.reset_peak()
+    allocated, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    yield
+    results[stage] = {"time": time.perf_counter() - start}
+    if tracemalloc.is_tracing():
+        _, peak = tracemalloc.get_traced_memory()
+        results[stage]["peak_memory"] = (peak - allocated) / 1024**2
+
+
+def run_stages(images_dir: str, rpc_urls: dict, profile: str, trace_memory: bool = False):
+    """Child process: run every stage once and print their measurements as JSON."""
+    from scripts import generate, pages, process, scan, utils
+    from scripts.images import build_image_index
+    from scripts.output import render_files
+
+    for module in (generate, pages, process, scan, utils):
+        module.console.quiet = True
+
+    results = {}
+    if trace_memory:
+        # Started after the imports, which are the same for every run
+        tracemalloc.start()
+
+    with measure(results, "index"):
+        image_index = build_image_index(images_dir)
+        networks, _, _ = scan.scan_images_folder({}, image_index)
+
+    with measure(results, "process"):
+        failed_tokens = {}
+        tokens = []
+        for network in networks:
+            network_tokens, _ = process.process_network(
+                network, {}, failed_tokens, {}, image_index=image_index, rpc_urls=[rpc_urls[network]]
+            )
+            tokens.extend(network_tokens)
+
+    with measure(results, "update"):
+        tokenlist = process.update_tokenlist(tokens, {})
+
+    with measure(results, "render"):
+        files = render_files(tokenlist, "all_networks.json", OUTPUT_PROFILES[profile])
+
+    results["tokens"] = len(tokenlist["tokens"])
+    results["failed"] = sum(map(len, failed_tokens.values()))
+    results["bytes"] = sum(map(len, files.values()))
+    print(json.dumps(results))
+
+
+def run_size(size: int, networks: int, reverting: float, profile: str, latency: float):
+    with tempfile.TemporaryDirectory() as images_dir:
+        tokens_by_network = build_tree(images_dir, size, networks, reverting)
+        nodes = {
+            network: MockNode(NETWORKS[network].chain_id, tokens, latency=latency)
+            for network, tokens in tokens_by_network.items()
+        }
+        for node in nodes.values():
+            node.start()
+        try:
+            spec = {"images_dir": images_dir, "rpc_urls": {n: node.url for n, node in nodes.items()}}
+            results = run_child(spec, profile)
+            results["http_requests"] = sum(node.http_requests for node in nodes.values())
+            results["rpc_calls"] = sum(sum(node.rpc_calls.values()) for node in nodes.values())
+            traced = run_child({**spec, "trace_memory": True}, profile)
+        finally:
+            for node in nodes.values():
+                node.stop()
+
+    for stage in STAGES:
+        results[stage]["peak_memory"] = traced[stage]["peak_memory"]
+    return results
+
+
+def run_child(spec: dict, profile: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.pipeline", "--child", json.dumps(spec), "--profile", profile],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float, timed_size: int = TIMED_SIZE) -> list:
+    """
+    Regressions of `results` against `baseline`, both keyed by size: more RPC requests or calls for
+    any size, and slower stages for sizes of at least `timed_size` icons.
+    """
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get(size)
+        if base is None:
+            continue
+        for key, label in (("http_requests", "RPC requests"), ("rpc_calls", "RPC calls")):
+            if key in base and result[key] > base[key]:
+                regressions.append(f"{size} icons: {result[key]} {label} vs {base[key]}")
+        if int(size) < timed_size:
+            continue
+        for stage in STAGES:
+            allowed = max(base[stage]["time"] * (1 + tolerance), base[stage]["time"] + MIN_SLOWDOWN)
+            if result[stage]["time"] > allowed:
+                regressions.append(f"{size} icons, {stage}: {result[stage]['time']:.3f}s vs {base[stage]['time']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Icons per run")
+    parser.add_argument("--networks", type=int, default=8, help="Networks the icons are spread over")
+    parser.add_argument("--reverting", type=float, default=0.01, help="Share of tokens whose calls revert")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock node latency per request, in seconds")
+    parser.add_argument("--profile", choices=sorted(OUTPUT_PROFILES), default="default")
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument("--baseline", help="Compare against results saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown per stage (default: 50%%)")
+    parser.add_argument(
+        "--timed-size",
+        type=int,
+        default=TIMED_SIZE,
+        help=f"Only compare the timings of runs over at least this many icons (default: {TIMED_SIZE})",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        spec = json.loads(args.child)
+        run_stages(spec["images_dir"], spec["rpc_urls"], args.profile, spec.get("trace_memory", False))
+        return
+
+    results = {}
+    for size in args.sizes:
+        console.print(f"[cyan]Running the pipeline over {size} icons...[/cyan]")
+        results[str(size)] = run_size(size, args.networks, args.reverting, args.profile, args.latency)
+
+    table = Table(title=f"Pipeline stages ({args.networks} networks, {args.profile} profile)")
+    table.add_column("Icons", style="cyan")
+    table.add_column("Stage", style="cyan")
+    table.add_column("Time", style="green")
+    table.add_column("Icons/s", style="green")
+    table.add_column("Peak memory", style="yellow")
+    table.add_column("RPC requests / calls", style="magenta")
+    for size, result in results.items():
+        for stage in STAGES:
+            elapsed = result[stage]["time"]
+            rpc = f"{result['http_requests']} / {result['rpc_calls']}" if stage == "process" else ""
+            table.add_row(
+                size,
+                stage,
+                f"{elapsed:.3f}s",
+                f"{int(size) / elapsed:,.0f}" if elapsed else "-",
+                f"{result[stage]['peak_memory']:.1f} MiB",
+                rpc,
+            )
+        table.add_row(
+            size, "output", "", "", "", f"{result['tokens']} tokens, {result['failed']} failed, {result['bytes']} bytes"
+        )
+    console.print(table)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.timed_size)
+        for regression in regressions:
+            console.print(f"[red]Regression: {regression}[/red]")
+        if regressions:
+            sys.exit(1)
+        console.print("[green]No regressions against the baseline[/green]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Count GitHub API calls and commits needed to publish every network's tokenlist to gh-pages, against a
+local fake of the GitHub API: one upload per file (the previous flow) versus one multi-file publish,
+then a republish where only the timestamps changed and one where a single list changed.
+
+    python -m benchmarks.publish --networks 30 --tokens 200
+"""
+
+import argparse
+import base64
+import os
+from datetime import datetime, timezone
+
+from github import InputGitTreeElement
+from rich.console import Console
+from rich.table import Table
+
+from scripts import pages
+from scripts.output import OUTPUT_PROFILES, render_files
+from scripts.pages import get_github_repo, publish_to_github_pages
+from tests.fake_github import FakeGitHub
+
+console = Console()
+
+REPO_NAME = "curvefi/curve-assets"
+
+
+def synthetic_tokenlists(networks: int, tokens: int, timestamp: str):
+    tokenlists = {}
+    for n in range(networks):
+        token_list = [
+            {
+                "chainId": n + 1,
+                "address": f"0x{i:040x}",
+                "name": f"Token {i}",
+                "symbol": f"TKN{i}",
+                "decimals": 18,
+                "logoURI": f"https://example.com/{n}/{i}.png",
+            }
+            for i in range(tokens)
+        ]
+        tokenlists[f"network-{n}.json"] = {
+            "name": "Curve Token List",
+            "timestamp": timestamp,
+            "version": {"major": 1, "minor": 0, "patch": 0},
+            "tokens": token_list,
+        }
+    return tokenlists
+
+
+def legacy_upload(repo, content, file_path, profile):
+    """The previous flow: branch, blobs, base tree, parent commit, tree, commit and ref for every file."""
+    branch = repo.get_branch("gh-pages")
+    elements = []
+    for path, data in render_files(content, file_path, profile).items():
+        if path == file_path:
+            blob = repo.create_git_blob(data.decode("utf-8"), "utf-8")
+        else:
+            blob = repo.create_git_blob(base64.b64encode(data).decode("ascii"), "base64")
+        elements.append(InputGitTreeElement(path=path, mode="100644", type="blob", sha=blob.sha))
+    head_sha = branch.commit.sha
+    base_tree = repo.get_git_tree(sha=head_sha)
+    tree = repo.create_git_tree(elements, base_tree)
+    parent = repo.get_git_commit(sha=head_sha)
+    commit = repo.create_git_commit("Update tokenlist", tree, [parent])
+    repo.get_git_ref("heads/gh-pages").edit(sha=commit.sha)
+
+
+def measure(api, fn):
+    api.reset_counters()
+    commits = len(api.commits)
+    fn()
+    return api.api_calls, len(api.commits) - commits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--networks", type=int, default=30)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--profile", choices=sorted(OUTPUT_PROFILES), default="default")
+    args = parser.parse_args()
+
+    profile = OUTPUT_PROFILES[args.profile]
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc).isoformat()
+    second = datetime(2024, 1, 1, 1, tzinfo=timezone.utc).isoformat()
+    tokenlists = synthetic_tokenlists(args.networks, args.tokens, first)
+    # Only the published timestamps are needed, don't read them from a local mirror
+    published = {file_path: first for file_path in tokenlists}
+
+    table = Table(title=f"Publishing {args.networks} tokenlists ({args.profile} profile)")
+    table.add_column("Scenario", style="cyan")
+    table.add_column("API calls", style="green")
+    table.add_column("Commits", style="yellow")
+
+    with FakeGitHub(REPO_NAME) as api:
+        os.environ["GITHUB_API_URL"] = api.url
+        os.environ.setdefault("GITHUB_TOKEN", "fake")
+        repo = get_github_repo(REPO_NAME)
+        api.refs["heads/gh-pages"] = api.refs[f"heads/{api.default_branch}"]
+
+        calls, commits = measure(
+            api, lambda: [legacy_upload(repo, tokenlist, path, profile) for path, tokenlist in tokenlists.items()]
+        )
+        table.add_row("One upload per file", str(calls), str(commits))
+
+        api.refs["heads/gh-pages"] = api.refs[f"heads/{api.default_branch}"]
+        calls, commits = measure(api, lambda: publish_to_github_pages(tokenlists, REPO_NAME, profile, {}, repo))
+        table.add_row("Multi-file publish", str(calls), str(commits))
+
+        republished = {path: {**tokenlist, "timestamp": second} for path, tokenlist in tokenlists.items()}
+        calls, commits = measure(api, lambda: publish_to_github_pages(republished, REPO_NAME, profile, published, repo))
+        table.add_row("Republish, only timestamps changed", str(calls), str(commits))
+
+        changed_path = next(iter(republished))
+        republished[changed_path]["tokens"] = republished[changed_path]["tokens"][:-1]
+        result = None
+
+        def publish_one_change():
+            nonlocal result
+            result = publish_to_github_pages(republished, REPO_NAME, profile, published, repo)
+
+        calls, commits = measure(api, publish_one_change)
+        table.add_row(f"Republish, {len(result.changed)} list changed", str(calls), str(commits))
+
+        files = api.files()
+        assert pages.git_blob_sha(files[changed_path]) == pages.git_blob_sha(
+            render_files(republished[changed_path], changed_path, profile)[changed_path]
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Compare peak RSS and wall time of writing and reading a tokenlist with the previous in-memory path
+(full dict with tokenMap, json.dump/json.load) against scripts.stream.
+
+Each measurement runs in a fresh interpreter so peak RSS is not shared between runs.
+
+    python -m benchmarks.serialization --sizes 10000 100000 300000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from scripts.stream import iter_tokens, save_tokenlist, token_key
+
+console = Console()
+
+HEADER = {
+    "name": "Curve Token List",
+    "logoURI": "https://cdn.jsdelivr.net/gh/curvefi/curve-assets/branding/logo.png",
+    "keywords": ["curve", "defi"],
+    "tags": {},
+    "timestamp": "2024-01-01T00:00:00+00:00",
+    "version": {"major": 1, "minor": 0, "patch": 0},
+}
+
+
+def synthetic_tokens(size: int):
+    for i in range(size):
+        address = f"0x{i:040x}"
+        yield {
+            "chainId": 1 + i % 16,
+            "address": address,
+            "name": f"Token {i}",
+            "symbol": f"TKN{i}",
+            "decimals": 18,
+            "logoURI": f"https://cdn.jsdelivr.net/gh/curvefi/curve-assets/images/assets/{address}.png",
+        }
+
+
+def write_in_memory(size: int, path: str):
+    tokens = list(synthetic_tokens(size))
+    tokenlist = {**HEADER, "tokens": tokens, "tokenMap": {token_key(token): token for token in tokens}}
+    with open(path, "w") as f:
+        json.dump(tokenlist, f, indent=2)
+
+
+def write_streaming(size: int, path: str):
+    save_tokenlist(HEADER, path, tokens=synthetic_tokens(size))
+
+
+def read_in_memory(path: str) -> int:
+    with open(path) as f:
+        return len(json.load(f)["tokens"])
+
+
+def read_streaming(path: str) -> int:
+    return sum(1 for _ in iter_tokens(path))
+
+
+def worker(mode: str, size: int, path: str):
+    start = time.perf_counter()
+    {
+        "write-memory": lambda: write_in_memory(size, path),
+        "write-stream": lambda: write_streaming(size, path),
+        "read-memory": lambda: read_in_memory(path),
+        "read-stream": lambda: read_streaming(path),
+    }[mode]()
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    print(json.dumps({"time": elapsed, "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+def measure(mode: str, size: int, path: str):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.serialization", "--worker", mode, str(size), path],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 300_000])
+    parser.add_argument("--worker", nargs=3, metavar=("MODE", "SIZE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, size, path = args.worker
+        worker(mode, int(size), path)
+        return
+
+    table = Table(title="Tokenlist serialization: in-memory vs streaming")
+    table.add_column("Tokens", style="cyan")
+    table.add_column("Stage", style="cyan")
+    table.add_column("In-memory peak RSS / time", style="red")
+    table.add_column("Streaming peak RSS / time", style="green")
+    table.add_column("File size", style="yellow")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            memory_path = os.path.join(tmp, f"memory-{size}.json")
+            stream_path = os.path.join(tmp, f"stream-{size}.json")
+            results = {
+                "write": (measure("write-memory", size, memory_path), measure("write-stream", size, stream_path)),
+                "read": (measure("read-memory", size, memory_path), measure("read-stream", size, stream_path)),
+            }
+            for stage, (memory, stream) in results.items():
+                table.add_row(
+                    str(size),
+                    stage,
+                    f"{memory['rss']:.0f} MiB / {memory['time']:.2f}s",
+                    f"{stream['rss']:.0f} MiB / {stream['time']:.2f}s",
+                    f"{os.path.getsize(stream_path) / 1024**2:.1f} MiB",
+                )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Show that per-network token processing scales linearly with the size of the existing tokenlist
+now that lookups go through a (chainId, address) index instead of a linear scan per address.
+
+    python -m benchmarks.token_index --sizes 1000 5000 10000 50000
+"""
+
+import argparse
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from scripts import utils
+from scripts.constants import NETWORKS
+from scripts.process import process_token
+from scripts.utils import build_token_index, get_token_info_batch
+
+console = Console()
+
+CHAIN_ID = 1
+
+
+def synthetic_tokenlist(size: int):
+    return [
+        {
+            "chainId": CHAIN_ID,
+            "address": f"0x{i:040x}",
+            "name": f"Token {i}",
+            "symbol": f"TKN{i}",
+            "decimals": 18,
+            "logoURI": f"https://example.com/{i}.png",
+        }
+        for i in range(size)
+    ]
+
+
+def legacy_lookups(tokens, addresses):
+    """The previous lookup: one generator scan over all existing tokens per address."""
+    for address in addresses:
+        next((t for t in tokens if t["address"].lower() == address.lower() and t["chainId"] == CHAIN_ID), None)
+
+
+def run(size: int, legacy_limit: int):
+    tokens = synthetic_tokenlist(size)
+    addresses = [token["address"] for token in tokens]
+    infos = [{key: token[key] for key in ("address", "name", "symbol", "decimals")} for token in tokens]
+
+    start = time.perf_counter()
+    token_index = build_token_index(tokens)
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, _, skipped = get_token_info_batch(None, addresses, token_index, NETWORKS["ethereum"])
+    processed = [process_token(info, CHAIN_ID, "ethereum", token_index) for info in infos]
+    pipeline_time = time.perf_counter() - start
+    assert len(skipped) == size and len(processed) == size
+
+    legacy_time = None
+    if size <= legacy_limit:
+        start = time.perf_counter()
+        legacy_lookups(tokens, addresses)
+        legacy_time = time.perf_counter() - start
+
+    return index_time, pipeline_time, legacy_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000, 25000, 50000])
+    parser.add_argument("--legacy-limit", type=int, default=5000, help="Largest size to time the linear scan on")
+    args = parser.parse_args()
+
+    utils.console.quiet = True
+
+    table = Table(title="Token lookups with a prebuilt index")
+    table.add_column("Tokens", style="cyan")
+    table.add_column("Index build", style="green")
+    table.add_column("Lookup + process", style="green")
+    table.add_column("µs / token", style="yellow")
+    table.add_column("Linear scan lookups", style="red")
+
+    for size in args.sizes:
+        index_time, pipeline_time, legacy_time = run(size, args.legacy_limit)
+        table.add_row(
+            str(size),
+            f"{index_time * 1000:.1f} ms",
+            f"{pipeline_time * 1000:.1f} ms",
+            f"{pipeline_time / size * 1e6:.1f}",
+            f"{legacy_time * 1000:.1f} ms" if legacy_time is not None else "skipped",
+        )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
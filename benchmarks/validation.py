@@ -0,0 +1,112 @@
+"""
+Time tokenlist validation: the previous per-model validation (tokens and tokenMap through TokenList),
+the batch TypeAdapter validation, and a second run, after a token was inserted at the start of the list,
+where unchanged runs of tokens are skipped through the validation cache.
+
+    python -m benchmarks.validation --sizes 10000 100000
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from scripts.cache import ValidationCache
+from scripts.models import TokenList, check_tokenlist
+
+console = Console()
+
+
+def synthetic_token(i: int):
+    # Spread over the address space like real addresses
+    address = f"0x{hashlib.sha1(str(i).encode()).hexdigest()}"
+    return {
+        "chainId": 1,
+        "address": address,
+        "name": f"Token {i}",
+        "symbol": f"TKN{i}",
+        "decimals": 18,
+        "logoURI": f"https://cdn.jsdelivr.net/gh/curvefi/curve-assets/images/assets/{address}.png",
+    }
+
+
+def synthetic_tokenlist(size: int):
+    tokens = [synthetic_token(i) for i in range(size)]
+    return {
+        "name": "Curve Token List",
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "version": {"major": 1, "minor": 0, "patch": 0},
+        "tokens": tokens,
+        "tokenMap": {f"1_{token['address']}": token for token in tokens},
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def run(size: int, legacy_limit: int, cache_dir: str):
+    tokenlist = synthetic_tokenlist(size)
+
+    legacy_time = None
+    if size <= legacy_limit:
+        legacy_time, _ = timed(lambda: TokenList(**tokenlist))
+
+    batch_time, report = timed(lambda: check_tokenlist(tokenlist))
+    assert report.ok, report
+
+    cache_path = os.path.join(cache_dir, f"validated-{size}.json")
+    cold_cache = ValidationCache(cache_path)
+    cold_time, _ = timed(lambda: check_tokenlist(tokenlist, cold_cache))
+    cold_cache.save()
+
+    # A token inserted at the start invalidates only its own run
+    added = synthetic_token(size)
+    tokenlist["tokens"].insert(0, added)
+    tokenlist["tokenMap"][f"1_{added['address']}"] = added
+    warm_cache = ValidationCache(cache_path)
+    warm_time, report = timed(lambda: check_tokenlist(tokenlist, warm_cache))
+    assert report.ok and report.validated < size // 10
+    # The cache is only worth keeping if hashing is cheaper than the validation it skips
+    assert warm_time < batch_time, (warm_time, batch_time)
+
+    return legacy_time, batch_time, cold_time, warm_time, report.validated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-limit", type=int, default=100000, help="Largest size to time TokenList on")
+    args = parser.parse_args()
+
+    table = Table(title="Tokenlist validation")
+    table.add_column("Tokens", style="cyan")
+    table.add_column("TokenList model", style="red")
+    table.add_column("Batch", style="green")
+    table.add_column("Batch + cold cache", style="green")
+    table.add_column("Warm cache, 1 inserted", style="green")
+    table.add_column("Revalidated", style="yellow")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for size in args.sizes:
+            legacy_time, batch_time, cold_time, warm_time, validated = run(size, args.legacy_limit, cache_dir)
+            table.add_row(
+                str(size),
+                f"{legacy_time * 1000:.0f} ms" if legacy_time is not None else "skipped",
+                f"{batch_time * 1000:.0f} ms",
+                f"{cold_time * 1000:.0f} ms",
+                f"{warm_time * 1000:.0f} ms",
+                str(validated),
+            )
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+
+from rich.console import Console
+from rich.table import Table
+from rich.theme import Theme
+
+from scripts.duplicates import DEFAULT_STORE_DIR, DEFAULT_THRESHOLD, HASH_WORDS, build_store, find_duplicates
+from scripts.images import build_image_index
+from scripts.manifest import get_manifest_path, load_manifest, save_manifest
+
+PERCEPTUAL_HASHES_PATH = os.path.join(".cache", "perceptual_hashes.json")
+
+custom_theme = Theme(
+    {
+        "info": "cyan",
+        "warning": "yellow",
+        "error": "bold red",
+        "success": "bold green",
+    }
+)
+
+console = Console(theme=custom_theme)
+
+
+def main(folders, threshold, report_path, store_dir, symlinks: bool, workers: int, limit: int = 20):
+    image_index = build_image_index()
+    manifest_path = get_manifest_path("duplicates")
+
+    console.print("[info]Hashing icons...[/info]")
+    report, manifest, hash_cache = find_duplicates(
+        image_index,
+        folders or None,
+        load_manifest(manifest_path),
+        load_manifest(PERCEPTUAL_HASHES_PATH),
+        threshold,
+        workers,
+    )
+    save_manifest(manifest, manifest_path)
+    save_manifest(hash_cache, PERCEPTUAL_HASHES_PATH)
+
+    duplicated = sum(len(files) for files in report.exact.values())
+    table = Table(title=f"Identical icons: {duplicated} files share {len(report.exact)} contents")
+    table.add_column("Copies", style="cyan")
+    table.add_column("Content", style="yellow")
+    table.add_column("Files", style="green")
+    for sha256, files in list(report.exact.items())[:limit]:
+        table.add_row(str(len(files)), sha256[:12], "\n".join(files))
+    console.print(table)
+    console.print(f"[info]Storing each content once saves {report.exact_savings / 1024:.0f} KiB[/info]")
+
+    if threshold is not None:
+        table = Table(title=f"Near-duplicate clusters (<= {threshold} of {HASH_WORDS * 64} bits): {len(report.near)}")
+        table.add_column("Files", style="green")
+        table.add_column("Max distance", style="yellow")
+        for files, distance in report.near[:limit]:
+            table.add_row("\n".join(files), str(distance))
+        console.print(table)
+
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(
+                {
+                    "exact": report.exact,
+                    "exact_savings": report.exact_savings,
+                    "near": [{"files": files, "max_distance": distance} for files, distance in report.near],
+                },
+                f,
+                indent=2,
+            )
+        console.print(f"[success]Report written to {report_path}[/success]")
+
+    if store_dir:
+        entries = build_store(image_index, manifest, store_dir, symlinks)
+        save_manifest(entries, os.path.join(store_dir, "manifest.json"))
+        objects = len(set(entries.values()))
+        console.print(
+            f"[success]Content-addressed store in {store_dir}: {len(entries)} icons, {objects} objects[/success]"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find identical and near-identical icons across image folders.")
+    parser.add_argument("folders", nargs="*", help="Image folders to scan (default: all of them)")
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=DEFAULT_THRESHOLD,
+        help=(
+            f"Largest perceptual hash distance for near-duplicates, in bits out of {HASH_WORDS * 64} "
+            f"(default: {DEFAULT_THRESHOLD})"
+        ),
+    )
+    parser.add_argument("--exact-only", action="store_true", help="Skip perceptual hashing")
+    parser.add_argument("--report", help="Write the clusters as JSON to this path")
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const=DEFAULT_STORE_DIR,
+        help=f"Write a deduplicated content-addressed store (default: {DEFAULT_STORE_DIR})",
+    )
+    parser.add_argument("--symlinks", action="store_true", help="Link <folder>/<file> in the store to its object")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes decoding icons")
+    args = parser.parse_args()
+
+    main(
+        args.folders,
+        None if args.exact_only else args.threshold,
+        args.report,
+        args.store,
+        args.symlinks,
+        args.workers,
+    )
@@ -1,13 +1,12 @@
-import json
 import os
 
 from scripts.generate import generate_tokenlist
+from scripts.stream import load_tokenlist, save_tokenlist
 
 if __name__ == "__main__":
 
     if os.path.exists("curve_tokenlist.json"):
-        with open("curve_tokenlist.json", "r") as file:
-            existing_tokenlist = json.load(file)
+        existing_tokenlist = load_tokenlist("curve_tokenlist.json")
     else:
         existing_tokenlist = {}
 
@@ -15,5 +14,4 @@ if __name__ == "__main__":
         existing_tokenlist, networks_to_include=["mantle"], networks_to_ignore=["assets-harmony"]
     )
 
-    with open("curve_tokenlist.json", "w") as file:
-        json.dump(new_tokenlist, file, indent=4)
+    save_tokenlist(new_tokenlist, "curve_tokenlist.json", indent=4)
@@ -0,0 +1,182 @@
+import argparse
+import os
+import sys
+
+from rich.console import Console
+from rich.table import Table
+from rich.theme import Theme
+
+from scripts.derivatives import DEFAULT_DERIVATIVES_DIR, DEFAULT_SIZES, DERIVATIVES_MANIFEST, build_derivatives
+from scripts.formats import find_format_mismatches
+from scripts.images import build_image_index
+from scripts.manifest import get_manifest_path, load_manifest, save_manifest
+from scripts.optimize import (
+    DEFAULT_VARIANTS_DIR,
+    VARIANT_FORMATS,
+    VARIANTS_MANIFEST,
+    optimize_images,
+    transcode_to_png,
+    variant_sizes,
+)
+
+custom_theme = Theme(
+    {
+        "info": "cyan",
+        "warning": "yellow",
+        "error": "bold red",
+        "success": "bold green",
+    }
+)
+
+console = Console(theme=custom_theme)
+
+
+def print_broken_icons(manifest) -> None:
+    for key, entry in manifest["images"].items():
+        if "error" in entry:
+            console.print(f"[warning]Skipped {key}, it does not decode ({entry['error']})[/warning]")
+
+
+def main(
+    folders,
+    fix: bool,
+    check: bool,
+    formats,
+    output_dir: str,
+    variants: bool,
+    sizes=None,
+    derivatives_dir: str = DEFAULT_DERIVATIVES_DIR,
+    workers: int = 1,
+) -> int:
+    image_index = build_image_index()
+    folders = folders or list(image_index.folders)
+
+    console.print("[info]Checking icon formats...[/info]")
+    mismatches = find_format_mismatches(image_index, folders)
+    if mismatches:
+        table = Table(title="Icons whose content is not PNG")
+        table.add_column("Icon", style="cyan")
+        table.add_column("Actual format", style="yellow")
+        table.add_column("Size", style="green")
+        for mismatch in mismatches:
+            table.add_row(
+                f"{mismatch.folder}/{mismatch.image.name}", mismatch.actual or "unknown", str(mismatch.image.size)
+            )
+        console.print(table)
+    else:
+        console.print("[success]All icons are PNG files.[/success]")
+
+    if mismatches and fix:
+        for mismatch in mismatches:
+            new_size = transcode_to_png(mismatch)
+            console.print(f"[info]Transcoded {mismatch.folder}/{mismatch.image.name} to PNG ({new_size} bytes)[/info]")
+        # Sizes and mtimes changed, the variants need a fresh index
+        image_index = build_image_index()
+    elif mismatches and check:
+        console.print(f"[error]{len(mismatches)} icons are not PNG files, run with --fix to transcode them[/error]")
+        return 1
+
+    if variants:
+        manifest_path = os.path.join(output_dir, VARIANTS_MANIFEST)
+        console.print(f"[info]Building {', '.join(formats)} variants in {output_dir}...[/info]")
+        manifest = optimize_images(image_index, output_dir, formats, folders, load_manifest(manifest_path), workers)
+        save_manifest(manifest, manifest_path)
+        print_broken_icons(manifest)
+
+        totals = variant_sizes(manifest)
+        table = Table(title=f"Variant sizes ({len(manifest['images'])} icons)")
+        table.add_column("Format", style="cyan")
+        table.add_column("Total", style="green")
+        table.add_column("vs source", style="yellow")
+        for image_format, total in totals.items():
+            ratio = total / totals["source"] if totals["source"] else 0
+            table.add_row(image_format, f"{total / 1024:.0f} KiB", f"{ratio:.0%}")
+        console.print(table)
+
+    if sizes:
+        manifest_path = os.path.join(derivatives_dir, DERIVATIVES_MANIFEST)
+        console.print(
+            f"[info]Building {', '.join(map(str, sizes))} px derivatives and sprites in {derivatives_dir}...[/info]"
+        )
+        images_manifest_path = get_manifest_path("derivatives")
+        manifest, images_manifest = build_derivatives(
+            image_index,
+            derivatives_dir,
+            sizes,
+            folders,
+            load_manifest(manifest_path),
+            load_manifest(images_manifest_path),
+            workers,
+        )
+        save_manifest(manifest, manifest_path)
+        save_manifest(images_manifest, images_manifest_path)
+        print_broken_icons(manifest)
+
+        table = Table(title=f"Sprites ({len(manifest['images'])} icons)")
+        table.add_column("Folder", style="cyan")
+        table.add_column("Icons", style="green")
+        table.add_column("Atlases", style="yellow")
+        for folder in folders:
+            folder_sprites = manifest["sprites"].get(folder, {})
+            if folder_sprites:
+                count = next(iter(folder_sprites.values()))["count"]
+                table.add_row(folder, str(count), ", ".join(sprite["image"] for sprite in folder_sprites.values()))
+        console.print(table)
+
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check icon formats and build size-optimized variants.")
+    parser.add_argument("folders", nargs="*", help="Image folders to process (default: all of them)")
+    parser.add_argument("--fix", action="store_true", help="Transcode icons that are not really PNG in place")
+    parser.add_argument("--check", action="store_true", help="Exit with an error if any icon is not really PNG")
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=VARIANT_FORMATS,
+        default=list(VARIANT_FORMATS),
+        help="Variant formats to build (default: all)",
+    )
+    parser.add_argument(
+        "--output", default=DEFAULT_VARIANTS_DIR, help=f"Variants directory (default: {DEFAULT_VARIANTS_DIR})"
+    )
+    parser.add_argument("--no-variants", action="store_true", help="Only check formats, don't build variants")
+    parser.add_argument(
+        "--derivatives",
+        action="store_true",
+        help="Also build fixed-size derivatives and per-folder sprite atlases",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_SIZES),
+        help=f"Derivative sizes in px (default: {' '.join(map(str, DEFAULT_SIZES))})",
+    )
+    parser.add_argument(
+        "--derivatives-output",
+        default=DEFAULT_DERIVATIVES_DIR,
+        help=f"Derivatives directory (default: {DEFAULT_DERIVATIVES_DIR})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes encoding icons (default: one per CPU)",
+    )
+    args = parser.parse_args()
+
+    sys.exit(
+        main(
+            args.folders,
+            args.fix,
+            args.check,
+            args.formats,
+            args.output,
+            not args.no_variants,
+            args.sizes if args.derivatives else None,
+            args.derivatives_output,
+            args.workers,
+        )
+    )
@@ -0,0 +1,163 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+from scripts.formats import PNG, sniff_file
+from scripts.images import ImageIndex
+from scripts.manifest import scan_manifest
+from scripts.optimize import parallel_map, require_pillow
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, see scripts.optimize
+    Image = None
+
+console = Console()
+
+
+@dataclass(frozen=True)
+class AuditBudgets:
+    # Icons are requested at 200x200, see README.md
+    max_bytes: int = 100 * 1024
+    min_dimension: int = 64
+    max_dimension: int = 1024
+    require_square: bool = True
+    exact_dimensions: Optional[Tuple[int, int]] = None
+    formats: Sequence[str] = (PNG,)
+
+
+@dataclass(frozen=True)
+class AuditFinding:
+    file: str
+    problem: str
+
+
+@dataclass
+class AuditReport:
+    # "<folder>/<file name>" -> decoded properties, see audit_image
+    images: Dict[str, Dict] = field(default_factory=dict)
+    findings: List[AuditFinding] = field(default_factory=list)
+    decoded: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.findings
+
+
+def audit_image(path: str) -> Dict:
+    """Decode one image fully and record its format, dimensions, byte size and whether it uses transparency."""
+    require_pillow()
+    record = {"bytes": os.path.getsize(path), "format": sniff_file(path)}
+    try:
+        with Image.open(path) as image:
+            image.load()
+            record.update(width=image.width, height=image.height, mode=image.mode)
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            record["has_alpha"] = has_alpha
+            if has_alpha:
+                alpha = image.convert("RGBA").getchannel("A")
+                record["alpha_used"] = alpha.getextrema()[0] < 255
+            else:
+                record["alpha_used"] = False
+    except Exception as e:  # Any decoder failure means the icon is broken
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def check_budgets(file: str, record: Dict, budgets: AuditBudgets) -> List[AuditFinding]:
+    if "error" in record:
+        return [AuditFinding(file, f"does not decode ({record['error']})")]
+
+    findings = []
+    if record["format"] not in budgets.formats:
+        expected = " or ".join(budgets.formats)
+        findings.append(AuditFinding(file, f"is {record['format'] or 'an unknown format'}, expected {expected}"))
+    if record["bytes"] > budgets.max_bytes:
+        findings.append(AuditFinding(file, f"is {record['bytes']} bytes, over the {budgets.max_bytes} byte budget"))
+
+    width, height = record["width"], record["height"]
+    if budgets.exact_dimensions and (width, height) != tuple(budgets.exact_dimensions):
+        findings.append(
+            AuditFinding(file, f"is {width}x{height}, expected {'x'.join(map(str, budgets.exact_dimensions))}")
+        )
+    elif min(width, height) < budgets.min_dimension or max(width, height) > budgets.max_dimension:
+        findings.append(
+            AuditFinding(file, f"is {width}x{height}, outside {budgets.min_dimension}-{budgets.max_dimension} px")
+        )
+    if budgets.require_square and width != height:
+        findings.append(AuditFinding(file, f"is {width}x{height}, not square"))
+    return findings
+
+
+def audit_images(
+    image_index: ImageIndex,
+    budgets: AuditBudgets = AuditBudgets(),
+    folders: Optional[Iterable[str]] = None,
+    previous_manifest: Optional[Dict] = None,
+    audit_cache: Optional[Dict[str, Dict]] = None,
+    workers: int = 1,
+) -> Tuple[AuditReport, Dict, Dict[str, Dict]]:
+    """
+    Decode every icon and check it against `budgets`. Returns the report, the images manifest and the
+    audit cache (decoded properties keyed by sha256), so both can be saved for the next run.
+
+    Content hashes are reused from the manifest for files whose size and mtime are unchanged, and only
+    contents missing from the cache are decoded, in `workers` processes. Budgets are applied to the
+    cached properties, so changing them never requires decoding again.
+    """
+    manifest = scan_manifest(image_index, folders, previous_manifest)
+    audit_cache = dict(audit_cache or {})
+
+    files_by_sha: Dict[str, List[str]] = {}
+    paths: Dict[str, str] = {}
+    for folder, folder_manifest in manifest["folders"].items():
+        for name, entry in folder_manifest["files"].items():
+            files_by_sha.setdefault(entry["sha256"], []).append(f"{folder}/{name}")
+            paths.setdefault(entry["sha256"], os.path.join(image_index.folders[folder].path, name))
+
+    missing = [sha256 for sha256 in files_by_sha if sha256 not in audit_cache]
+    for sha256, record in zip(missing, parallel_map(audit_image, [(paths[sha256],) for sha256 in missing], workers)):
+        audit_cache[sha256] = record
+
+    report = AuditReport(decoded=len(missing))
+    for sha256, files in files_by_sha.items():
+        for file in files:
+            report.images[file] = {"sha256": sha256, **audit_cache[sha256]}
+            report.findings.extend(check_budgets(file, audit_cache[sha256], budgets))
+    report.images = dict(sorted(report.images.items()))
+    report.findings.sort(key=lambda finding: finding.file)
+
+    # Only keep records of content that still exists
+    audit_cache = {sha256: audit_cache[sha256] for sha256 in files_by_sha}
+    return report, manifest, audit_cache
+
+
+def display_audit(report: AuditReport, limit: int = 50) -> None:
+    images = report.images.values()
+    table = Table(title="Image Audit")
+    table.add_column("Icons", style="cyan")
+    table.add_column("Decoded", style="green")
+    table.add_column("Total size", style="green")
+    table.add_column("With transparency", style="green")
+    table.add_column("Failing checks", style="red" if report.findings else "green")
+    table.add_row(
+        str(len(report.images)),
+        str(report.decoded),
+        f"{sum(image['bytes'] for image in images) / 1024 ** 2:.1f} MiB",
+        str(sum(1 for image in images if image.get("alpha_used"))),
+        str(len(report.findings)),
+    )
+    console.print(table)
+
+    if report.findings:
+        table = Table(title="Failing icons")
+        table.add_column("Icon", style="cyan")
+        table.add_column("Problem", style="red")
+        for finding in report.findings[:limit]:
+            table.add_row(finding.file, finding.problem)
+        if len(report.findings) > limit:
+            table.add_row("...", f"{len(report.findings) - limit} more")
+        console.print(table)
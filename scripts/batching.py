@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+DEFAULT_BATCH_SIZES_PATH = ".cache/multicall_batch_sizes.json"
+
+DEFAULT_BATCH_SIZE = 1000
+MIN_BATCH_SIZE = 1
+MAX_BATCH_SIZE = 10_000
+# Batches answered within these bounds are allowed to grow
+TARGET_LATENCY = 3.0
+TARGET_RESPONSE_BYTES = 2 * 1024**2
+# A cap found on a chain is trusted for a week, then larger batches are probed again
+FAILURE_TTL = 7 * 24 * 3600
+
+
+class BatchSizer:
+    """
+    Learns how many calls one multicall eth_call of a chain should carry.
+
+    Batches grow (doubling, or halfway towards the smallest batch that hit a node cap) as long as
+    they come back within TARGET_LATENCY, and shrink by a quarter when they are slower than twice
+    that. A batch that hits a gas or response size cap bounds all later growth, and the size falls
+    back to the largest batch known to pass (or half the failed one), so the cap is found by
+    bisection. The size is also kept under TARGET_RESPONSE_BYTES, from the return data seen per call.
+
+    Only one batch at a time is larger than the largest batch known to pass, so concurrent requests
+    don't all hit a cap together.
+    """
+
+    def __init__(
+        self,
+        size: int = DEFAULT_BATCH_SIZE,
+        max_ok: int = 0,
+        min_failed: Optional[int] = None,
+        failed_at: Optional[float] = None,
+        bytes_per_call: Optional[float] = None,
+        min_size: int = MIN_BATCH_SIZE,
+        max_size: int = MAX_BATCH_SIZE,
+        target_latency: float = TARGET_LATENCY,
+        target_bytes: int = TARGET_RESPONSE_BYTES,
+    ):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.target_bytes = target_bytes
+        self.max_ok = max_ok
+        self.min_failed = min_failed
+        self.failed_at = failed_at
+        self.bytes_per_call = bytes_per_call
+        self.size = self.bounded(size)
+        self.probing = False
+
+    def ceiling(self) -> int:
+        ceiling = self.max_size
+        if self.min_failed is not None:
+            ceiling = min(ceiling, self.min_failed - 1)
+        if self.bytes_per_call:
+            ceiling = min(ceiling, int(self.target_bytes / self.bytes_per_call))
+        return max(self.min_size, ceiling)
+
+    def bounded(self, size: int) -> int:
+        return max(self.min_size, min(self.ceiling(), int(size)))
+
+    def next_batch(self, available: int) -> int:
+        """How many of `available` calls to send in the next batch."""
+        size = min(self.size, available)
+        if self.max_ok and size > self.max_ok:
+            if self.probing:
+                return self.max_ok
+            self.probing = True
+        return size
+
+    def record_success(self, calls: int, latency: float, response_bytes: int) -> None:
+        if calls > self.max_ok:
+            self.probing = False
+        self.max_ok = max(self.max_ok, calls)
+        per_call = response_bytes / max(calls, 1)
+        self.bytes_per_call = per_call if self.bytes_per_call is None else 0.7 * self.bytes_per_call + 0.3 * per_call
+
+        if latency > 2 * self.target_latency:
+            self.size = self.bounded(self.size * 0.75)
+        elif calls >= self.size and latency <= self.target_latency:
+            # Only full batches say anything about a larger size
+            target = self.size * 2 if self.min_failed is None else (self.size + self.min_failed) // 2
+            self.size = self.bounded(max(target, self.size + 1))
+        else:
+            self.size = self.bounded(self.size)
+
+    def record_failure(self, calls: int) -> None:
+        """A batch of `calls` hit a node cap."""
+        self.probing = False
+        self.min_failed = calls if self.min_failed is None else min(self.min_failed, calls)
+        self.failed_at = time.time()
+        if self.max_ok >= self.min_failed:
+            # The cap moved (or is not just about size): what passed before is no evidence anymore
+            self.max_ok = 0
+        self.size = self.bounded(min(self.size, max(self.max_ok, calls // 2)))
+
+    def to_dict(self) -> Dict:
+        return {
+            "size": self.size,
+            "max_ok": self.max_ok,
+            "min_failed": self.min_failed,
+            "failed_at": self.failed_at,
+            "bytes_per_call": self.bytes_per_call,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, **kwargs) -> "BatchSizer":
+        min_failed, failed_at = data.get("min_failed"), data.get("failed_at")
+        if failed_at is None or time.time() - failed_at > FAILURE_TTL:
+            min_failed, failed_at = None, None
+        return cls(
+            data.get("size", DEFAULT_BATCH_SIZE),
+            data.get("max_ok", 0),
+            min_failed,
+            failed_at,
+            data.get("bytes_per_call"),
+            **kwargs,
+        )
+
+
+class BatchSizeStore:
+    """
+    Learned batch sizes of every chain, persisted as JSON between runs. Sizers can be taken by the
+    threads processing different networks; save writes atomically.
+    """
+
+    def __init__(self, path: str = DEFAULT_BATCH_SIZES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._saved: Dict[str, Dict] = {}
+        self._sizers: Dict[int, BatchSizer] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._saved = json.load(f)
+            except (OSError, ValueError):
+                self._saved = {}
+
+    def sizer(self, chain_id: int) -> BatchSizer:
+        with self._lock:
+            if chain_id not in self._sizers:
+                self._sizers[chain_id] = BatchSizer.from_dict(self._saved.get(str(chain_id), {}))
+            return self._sizers[chain_id]
+
+    def save(self) -> None:
+        with self._lock:
+            data = {**self._saved, **{str(chain_id): sizer.to_dict() for chain_id, sizer in self._sizers.items()}}
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(sorted(data.items())), f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,170 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+DEFAULT_CACHE_PATH = os.environ.get("TOKEN_CACHE_PATH", ".cache/token_metadata.sqlite")
+DEFAULT_VALIDATION_CACHE_DIR = ".cache"
+
+# ERC-20 metadata is practically immutable, reverting tokens are retried sooner
+TOKEN_TTL = 30 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600
+
+
+@dataclass(frozen=True)
+class CachedToken:
+    address: str
+    name: Optional[str]
+    symbol: Optional[str]
+    decimals: Optional[int]
+    block_number: int
+    fetched_at: float
+    failed: bool = False
+
+    def to_info(self) -> Dict:
+        return {"address": self.address, "name": self.name, "symbol": self.symbol, "decimals": self.decimals}
+
+
+class TokenCache:
+    """
+    Persistent SQLite cache of ERC-20 name/symbol/decimals keyed by (chainId, lowercase address).
+
+    Each entry records the block it was fetched at. Tokens whose calls reverted are stored as negative
+    entries with a shorter TTL so they are not re-queried on every run. The cache can be shared by
+    the threads processing different networks.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = TOKEN_TTL, negative_ttl: float = NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tokens (
+                chain_id INTEGER NOT NULL,
+                address TEXT NOT NULL,
+                name TEXT,
+                symbol TEXT,
+                decimals INTEGER,
+                block_number INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                failed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (chain_id, address)
+            )
+            """
+        )
+        self._connection.commit()
+
+    def get_many(self, chain_id: int, addresses: Iterable[str]) -> Dict[str, CachedToken]:
+        """Return fresh entries for the given addresses, keyed by lowercase address."""
+        addresses = list({address.lower() for address in addresses})
+        now = time.time()
+        entries = {}
+
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(addresses), 500):
+                chunk = addresses[i : i + 500]  # noqa: E203
+                rows = self._connection.execute(
+                    "SELECT address, name, symbol, decimals, block_number, fetched_at, failed FROM tokens "
+                    f"WHERE chain_id = ? AND address IN ({','.join('?' * len(chunk))})",
+                    [chain_id, *chunk],
+                ).fetchall()
+                for row in rows:
+                    entry = CachedToken(*row[:6], failed=bool(row[6]))
+                    if now - entry.fetched_at < (self.negative_ttl if entry.failed else self.ttl):
+                        entries[entry.address] = entry
+
+        return entries
+
+    def put_many(self, chain_id: int, token_infos: Iterable[Dict], block_number: int) -> None:
+        now = time.time()
+        rows = [
+            (chain_id, info["address"].lower(), info["name"], info["symbol"], info["decimals"], block_number, now)
+            for info in token_infos
+        ]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO tokens (chain_id, address, name, symbol, decimals, block_number, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._connection.commit()
+
+    def put_failures(self, chain_id: int, addresses: Iterable[str], block_number: int) -> None:
+        now = time.time()
+        rows = [(chain_id, address.lower(), block_number, now) for address in addresses]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO tokens (chain_id, address, block_number, fetched_at, failed) "
+                "VALUES (?, ?, ?, ?, 1)",
+                rows,
+            )
+            self._connection.commit()
+
+    def invalidate(self, chain_id: int, addresses: Optional[List[str]] = None) -> None:
+        with self._lock:
+            if addresses is None:
+                self._connection.execute("DELETE FROM tokens WHERE chain_id = ?", (chain_id,))
+            else:
+                self._connection.executemany(
+                    "DELETE FROM tokens WHERE chain_id = ? AND address = ?",
+                    [(chain_id, address.lower()) for address in addresses],
+                )
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def get_validation_cache_path(output_name: str) -> str:
+    return os.path.join(DEFAULT_VALIDATION_CACHE_DIR, f"validated_tokens-{output_name}.json")
+
+
+class ValidationCache:
+    """
+    Content digests of token groups that passed validation, persisted between runs.
+
+    Only digests looked up or added during the current run are saved, so entries for content that no
+    longer exists are dropped instead of accumulating.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._previous: Set[str] = set()
+        self._current: Set[str] = set()
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._previous = set(json.load(f))
+            except (OSError, ValueError):
+                self._previous = set()
+
+    def __contains__(self, digest: str) -> bool:
+        if digest in self._previous or digest in self._current:
+            self._current.add(digest)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def add(self, digest: str) -> None:
+        self._current.add(digest)
+
+    def save(self) -> None:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(sorted(self._current), f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,189 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from eth_abi import decode, encode
+from eth_utils import function_abi_to_4byte_selector
+
+from scripts.constants import ERC20_ABI
+
+# The ERC-20 metadata read for every token, in the order results are returned
+ERC20_METADATA = ("name", "symbol", "decimals")
+
+
+class Function(NamedTuple):
+    name: str
+    selector: bytes
+    input_types: Tuple[str, ...]
+    output_types: Tuple[str, ...]
+
+
+class Call(NamedTuple):
+    """One call inside a multicall: the target, the function name (for reports), calldata and output types."""
+
+    address: str
+    fn_name: str
+    call_data: bytes
+    output_types: Tuple[str, ...]
+
+
+def functions_from_abi(abi: Iterable[Dict]) -> Dict[str, Function]:
+    return {
+        entry["name"]: Function(
+            entry["name"],
+            bytes(function_abi_to_4byte_selector(entry)),
+            tuple(item["type"] for item in entry["inputs"]),
+            tuple(item["type"] for item in entry["outputs"]),
+        )
+        for entry in abi
+        if entry.get("type") == "function"
+    }
+
+
+# Selectors are computed once, not per token
+ERC20_FUNCTIONS = functions_from_abi(ERC20_ABI)
+
+
+def build_call(address: str, function: Function, args: Sequence = ()) -> Call:
+    call_data = function.selector + encode(list(function.input_types), list(args)) if args else function.selector
+    return Call(address, function.name, call_data, function.output_types)
+
+
+def erc20_metadata_calls(address: str) -> List[Call]:
+    """The name, symbol and decimals calls of one token."""
+    return [build_call(address, ERC20_FUNCTIONS[fn_name]) for fn_name in ERC20_METADATA]
+
+
+def _word(value: int) -> bytes:
+    return value.to_bytes(32, "big")
+
+
+def encode_call_array(calls: Sequence[Call], allow_failure: Optional[bool] = None) -> bytes:
+    """
+    ABI encoding of `calls` as the single `(address,bytes)[]` argument of Multicall `aggregate`, or
+    `(address,bool,bytes)[]` of `aggregate3` when allow_failure is given. Written out directly, since
+    eth_abi's generic encoder costs more than everything else about a batch.
+    """
+    flag = None if allow_failure is None else _word(int(allow_failure))
+    # Address, the flag, then the offset of the calldata within the tuple
+    tuple_head = 64 if flag is None else 96
+    heads = []
+    tails = []
+    offset = 32 * len(calls)
+    for call in calls:
+        heads.append(_word(offset))
+        target = bytes.fromhex(call.address[2:] if call.address[:2] in ("0x", "0X") else call.address)
+        if len(target) != 20:
+            raise ValueError(f"Invalid call target {call.address}")
+        padding = -len(call.call_data) % 32
+        tail = [bytes(12), target]
+        if flag is not None:
+            tail.append(flag)
+        tail += [_word(tuple_head), _word(len(call.call_data)), call.call_data, bytes(padding)]
+        tails.extend(tail)
+        offset += tuple_head + 32 + len(call.call_data) + padding
+    return b"".join([_word(32), _word(len(calls)), *heads, *tails])
+
+
+def _read_word(data: bytes, position: int) -> int:
+    if position + 32 > len(data):
+        raise ValueError("Return data too short")
+    return int.from_bytes(data[position : position + 32], "big")  # noqa: E203
+
+
+def _read_bytes(data: bytes, position: int) -> bytes:
+    length = _read_word(data, position)
+    end = position + 32 + length
+    padded_end = end + (-length % 32)
+    if padded_end > len(data) or data[end:padded_end].strip(b"\0"):
+        raise ValueError("Malformed bytes in return data")
+    return data[position + 32 : end]  # noqa: E203
+
+
+def _decode_array(data: bytes, base: int, with_success: bool) -> List:
+    results = []
+    count = _read_word(data, base)
+    heads = base + 32
+    for i in range(count):
+        position = heads + _read_word(data, heads + 32 * i)
+        if not with_success:
+            results.append(_read_bytes(data, position))
+            continue
+        success = _read_word(data, position)
+        if success > 1:
+            raise ValueError("Malformed bool in return data")
+        results.append((bool(success), _read_bytes(data, position + _read_word(data, position + 32))))
+    return results
+
+
+def decode_aggregate3(data: bytes) -> List[Tuple[bool, bytes]]:
+    """(success, return data) of every call, from the return data of `aggregate3`."""
+    try:
+        return _decode_array(data, _read_word(data, 0), with_success=True)
+    except ValueError:
+        # Let eth_abi report what exactly is malformed
+        return list(decode(["(bool,bytes)[]"], data)[0])
+
+
+def decode_aggregate(data: bytes) -> List[bytes]:
+    """Return data of every call, from the `(uint256 blockNumber, bytes[] returnData)` of `aggregate`."""
+    try:
+        return _decode_array(data, _read_word(data, 32), with_success=False)
+    except ValueError:
+        return list(decode(["uint256", "bytes[]"], data)[1])
+
+
+def decode_string(data: bytes) -> str:
+    # Canonical encoding of a single string: offset 32, length, then the zero padded bytes
+    if len(data) >= 64 and int.from_bytes(data[:32], "big") == 32:
+        length = int.from_bytes(data[32:64], "big")
+        end = 64 + length
+        padded_end = end + (-length % 32)
+        if len(data) >= padded_end and not data[end:padded_end].strip(b"\0"):
+            return data[64:end].decode("utf-8")
+    if len(data) == 32:
+        # Older tokens (MKR, SAI, ...) return name and symbol as bytes32
+        return data.rstrip(b"\0").decode("utf-8")
+    # Anything else is left to eth_abi, which raises on malformed data
+    return decode(["string"], data)[0]
+
+
+def uint_decoder(bits: int) -> Callable[[bytes], int]:
+    def decode_uint(data: bytes) -> int:
+        value = int.from_bytes(data[:32], "big")
+        if len(data) >= 32 and not value >> bits:
+            return value
+        return decode([f"uint{bits}"], data)[0]
+
+    return decode_uint
+
+
+@lru_cache(maxsize=None)
+def get_decoder(output_types: Tuple[str, ...]) -> Callable[[bytes], Tuple[Any, ...]]:
+    """Decoder of return data into a tuple of values, built once per output types."""
+    if output_types == ("string",):
+        return lambda data: (decode_string(data),)
+    if len(output_types) == 1 and output_types[0].startswith("uint"):
+        decode_uint = uint_decoder(int(output_types[0][4:] or 256))
+        return lambda data: (decode_uint(data),)
+    types = list(output_types)
+    return lambda data: decode(types, data)
+
+
+def decode_results(
+    calls: Sequence[Call], results: Sequence[Optional[bytes]], failed_calls: List[Tuple[str, str, str]]
+) -> List[Optional[Tuple[Any, ...]]]:
+    """
+    Decode the return data of a whole batch, aligned with `calls`. Missing return data stays None;
+    return data that does not decode is None as well and reported in `failed_calls`.
+    """
+    decoded = []
+    for call, return_data in zip(calls, results):
+        if return_data is None:
+            decoded.append(None)
+            continue
+        try:
+            decoded.append(get_decoder(call.output_types)(return_data))
+        except Exception as e:  # Any malformed return data means the call failed
+            failed_calls.append((call.address, call.fn_name, str(e)))
+            decoded.append(None)
+    return decoded
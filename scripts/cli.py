@@ -0,0 +1,215 @@
+"""
+Single entry point for working with the icons and tokenlists:
+
+    python -m scripts scan                                   # images/ against a tokenlist, offline
+    python -m scripts validate curve_tokenlist.json          # tokenlist files against the schema
+    python -m scripts generate mantle -o curve_tokenlist.json
+    python -m scripts publish --fan-out                      # upkeep.py, same options
+    python -m scripts check-pr --paths-from changed_files.txt
+
+Each command imports what it needs when it runs: web3, eth_abi and PyGithub take seconds to import,
+and pydantic a fraction of one, so offline commands stay fast enough for pre-commit hooks. The budget
+is checked by benchmarks/import_time.py.
+"""
+
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+# Networks left out unless asked for explicitly, as in upkeep.py
+IGNORED_NETWORKS = ["assets-harmony"]
+
+
+def scan(args: argparse.Namespace) -> int:
+    from scripts.formats import find_format_mismatches
+    from scripts.images import build_image_index
+    from scripts.scan import console, display_summary, scan_images_folder
+    from scripts.stream import load_tokenlist
+
+    console.quiet = args.quiet
+    tokenlist = load_tokenlist(args.tokenlist) if args.tokenlist else {}
+    image_index = build_image_index(args.images_dir)
+    networks, tokens_in_folder, tokens_to_add = scan_images_folder(tokenlist, image_index)
+    display_summary(networks, tokens_in_folder, tokens_to_add)
+
+    mismatches = find_format_mismatches(image_index)
+    for mismatch in mismatches:
+        console.print(f"[warning]{mismatch}[/warning]")
+    if mismatches:
+        console.print(
+            f"[warning]{len(mismatches)} icons are not PNG files, run `python optimize_images.py --fix`[/warning]"
+        )
+    return 1 if args.check and mismatches else 0
+
+
+def validate(args: argparse.Namespace) -> int:
+    from rich.console import Console
+
+    from scripts.models import check_tokenlist
+
+    console = Console()
+    failed = 0
+    for path in args.tokenlists:
+        with open(path, "r", encoding="utf-8") as f:
+            report = check_tokenlist(json.load(f))
+        if report.ok:
+            console.print(f"[green]{path}: {report.validated} tokens valid[/green]")
+            continue
+        failed += 1
+        console.print(f"[red]{path}: validation failed[/red]")
+        for message in report.messages(args.limit):
+            console.print(f"[red]  {message}[/red]")
+    return 1 if failed else 0
+
+
+def generate(args: argparse.Namespace) -> int:
+    import os
+
+    from scripts.batching import BatchSizeStore
+    from scripts.cache import DEFAULT_CACHE_PATH, TokenCache
+    from scripts.constants import NETWORKS
+    from scripts.generate import generate_tokenlist
+    from scripts.output import OUTPUT_PROFILES, render_files
+    from scripts.stream import load_tokenlist
+
+    for network in args.networks:
+        if network not in NETWORKS:
+            raise SystemExit(f"Network '{network}' not found in NETWORKS.")
+
+    existing_tokenlist = load_tokenlist(args.output) if os.path.exists(args.output) else {}
+    token_cache = None if args.no_cache else TokenCache(DEFAULT_CACHE_PATH)
+    batch_sizes = None if args.no_cache else BatchSizeStore()
+    try:
+        tokenlist = generate_tokenlist(
+            existing_tokenlist,
+            networks_to_include=args.networks or None,
+            networks_to_ignore=IGNORED_NETWORKS,
+            max_workers=args.workers,
+            token_cache=token_cache,
+            batch_sizes=batch_sizes,
+        )
+    finally:
+        if token_cache:
+            token_cache.close()
+
+    for path, data in render_files(tokenlist, args.output, OUTPUT_PROFILES[args.profile]).items():
+        with open(path, "wb") as f:
+            f.write(data)
+    if batch_sizes:
+        batch_sizes.save()
+    return 0
+
+
+def check_pr(args: argparse.Namespace) -> int:
+    import os
+
+    from scripts.batching import BatchSizeStore
+    from scripts.cache import DEFAULT_CACHE_PATH, TokenCache
+    from scripts.pr_checks import check_changed_files, display_report
+
+    paths = list(args.paths)
+    if args.paths_from:
+        with sys.stdin if args.paths_from == "-" else open(args.paths_from, "r") as f:
+            paths.extend(f.read().split())
+    if not args.verbose and not args.offline:
+        from scripts import process, utils
+
+        # One aggregated report instead of the pipeline's progress for every network
+        process.console.quiet = utils.console.quiet = True
+
+    token_cache = None if args.no_cache else TokenCache(DEFAULT_CACHE_PATH)
+    batch_sizes = None if args.no_cache else BatchSizeStore()
+    try:
+        report = check_changed_files(
+            paths,
+            root=args.root,
+            check_onchain=not args.offline,
+            token_cache=token_cache,
+            batch_sizes=batch_sizes,
+            workers=args.workers or os.cpu_count() or 1,
+        )
+    finally:
+        if token_cache:
+            token_cache.close()
+    if batch_sizes:
+        batch_sizes.save()
+
+    display_report(report)
+    if args.markdown:
+        with open(args.markdown, "w") as f:
+            f.write(report.markdown())
+    if args.github_annotations:
+        sys.stdout.write(report.annotations())
+    return 0 if report.ok else 1
+
+
+def publish(args: argparse.Namespace) -> int:
+    import upkeep
+
+    upkeep.cli(args.upkeep_args, prog="python -m scripts publish")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = commands.add_parser("scan", help="Compare images/ with a tokenlist and check icon formats, offline")
+    scan_parser.add_argument("--tokenlist", help="Tokenlist to compare against (default: none, every icon is new)")
+    scan_parser.add_argument("--images-dir", default="images", help="Images folder (default: images)")
+    scan_parser.add_argument("--check", action="store_true", help="Exit with an error if icons are not PNG files")
+    scan_parser.add_argument("--quiet", action="store_true", help="Only report through the exit code")
+    scan_parser.set_defaults(handler=scan)
+
+    validate_parser = commands.add_parser("validate", help="Validate tokenlist files against the schema")
+    validate_parser.add_argument("tokenlists", nargs="+", metavar="TOKENLIST")
+    validate_parser.add_argument("--limit", type=int, default=10, help="Errors shown per kind and file (default: 10)")
+    validate_parser.set_defaults(handler=validate)
+
+    # Imported here rather than at the top: the choices are all this needs from scripts.output
+    from scripts.output import OUTPUT_PROFILES
+
+    generate_parser = commands.add_parser("generate", help="Generate a tokenlist from images/ into a local file")
+    generate_parser.add_argument("networks", nargs="*", help="Networks to include (default: all but harmony)")
+    generate_parser.add_argument("-o", "--output", default="curve_tokenlist.json", help="File to update and write")
+    generate_parser.add_argument("--workers", type=int, default=1, help="Networks processed concurrently")
+    generate_parser.add_argument("--no-cache", action="store_true", help="Always fetch token metadata over RPC")
+    generate_parser.add_argument("--profile", choices=sorted(OUTPUT_PROFILES), default="default")
+    generate_parser.set_defaults(handler=generate)
+
+    check_pr_parser = commands.add_parser("check-pr", help="Check the files changed by a pull request")
+    check_pr_parser.add_argument("paths", nargs="*", help="Changed paths, relative to --root")
+    check_pr_parser.add_argument("--paths-from", help="File listing changed paths, whitespace separated (- for stdin)")
+    check_pr_parser.add_argument("--root", default=".", help="Checkout of the pull request (default: .)")
+    check_pr_parser.add_argument("--offline", action="store_true", help="Don't check token contracts over RPC")
+    check_pr_parser.add_argument("--no-cache", action="store_true", help="Always fetch token metadata over RPC")
+    check_pr_parser.add_argument("--workers", type=int, default=0, help="Processes decoding icons (default: CPUs)")
+    check_pr_parser.add_argument("--markdown", help="Write the problems to this file as a markdown list")
+    check_pr_parser.add_argument("--github-annotations", action="store_true", help="Print ::error annotations")
+    check_pr_parser.add_argument("--verbose", action="store_true", help="Show the progress of every network")
+    check_pr_parser.set_defaults(handler=check_pr)
+
+    publish_parser = commands.add_parser(
+        "publish", help="Generate and publish to GitHub Pages (upkeep.py)", add_help=False
+    )
+    publish_parser.set_defaults(handler=publish)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    # argparse.REMAINDER does not capture leading options such as --help, so everything publish does not
+    # know is left for upkeep.py to parse
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "publish":
+        args.upkeep_args = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Iterator, List, Optional, Tuple
 
 NATIVE_TOKEN_ADDRESS = "0xEeeeeEeeeEeEeeEeEeEeeEEEeeeeEeeeeeeeEEeE"
 
@@ -30,6 +30,12 @@ class Network:
     folder_name: str = ""
     native_token_name: str = ""
     native_token_symbol: str = ""
+    # Multicall3 `aggregate3` reports per-call success; without it reverting calls are isolated by bisection
+    supports_aggregate3: bool = True
+    # More endpoints for the same chain, pooled with rpc_url and the dRPC load balancer
+    rpc_urls: Tuple[str, ...] = ()
+    # Whether the dRPC load balancer serves this chain; networks it doesn't only use their own endpoints
+    drpc: bool = True
 
 
 MULTICALL_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
@@ -86,7 +92,12 @@ NETWORKS: Dict[str, Network] = {
         5000, MULTICALL_ADDRESS, folder_name="assets-mantle", native_token_name="Mantle", native_token_symbol="MNT"
     ),
     "aurora": Network(
-        1313161554, MULTICALL_ADDRESS, folder_name="assets-aurora", native_token_name="Ether", native_token_symbol="ETH"
+        1313161554,
+        MULTICALL_ADDRESS,
+        folder_name="assets-aurora",
+        native_token_name="Ether",
+        native_token_symbol="ETH",
+        rpc_urls=("https://mainnet.aurora.dev",),
     ),
     "x-layer": Network(
         196,
@@ -95,32 +106,84 @@ NETWORKS: Dict[str, Network] = {
         folder_name="assets-x-layer",
         native_token_name="OKB",
         native_token_symbol="OKB",
+        rpc_urls=("https://rpc.xlayer.tech",),
+        drpc=False,
     ),
 }
 
-# Multicall ABI
-MULTICALL_ABI = [
-    {
-        "inputs": [
-            {
-                "components": [
-                    {"internalType": "address", "name": "target", "type": "address"},
-                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
-                ],
-                "internalType": "struct Multicall2.Call[]",
-                "name": "calls",
-                "type": "tuple[]",
-            }
-        ],
-        "name": "aggregate",
-        "outputs": [
-            {"internalType": "uint256", "name": "blockNumber", "type": "uint256"},
-            {"internalType": "bytes[]", "name": "returnData", "type": "bytes[]"},
-        ],
-        "stateMutability": "nonpayable",
-        "type": "function",
-    }
-]
+
+class NetworkRegistry:
+    """
+    Constant-time lookups of networks by name, chain id and images folder name.
+
+    Indexes are built once from NETWORKS, which is checked for duplicate chain ids and folder names
+    so that every lookup is unambiguous.
+    """
+
+    def __init__(self, networks: Dict[str, Network]):
+        self._by_name: Dict[str, Network] = dict(networks)
+        self._name_by_chain_id: Dict[int, str] = {}
+        self._name_by_folder: Dict[str, str] = {}
+
+        for name, network in self._by_name.items():
+            if network.chain_id in self._name_by_chain_id:
+                raise ValueError(
+                    f"Duplicate chain id {network.chain_id} for {self._name_by_chain_id[network.chain_id]} and {name}"
+                )
+            self._name_by_chain_id[network.chain_id] = name
+
+            if not network.folder_name:
+                continue
+            if network.folder_name in self._name_by_folder:
+                raise ValueError(
+                    f"Duplicate folder name {network.folder_name} for {self._name_by_folder[network.folder_name]} "
+                    f"and {name}"
+                )
+            self._name_by_folder[network.folder_name] = name
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._by_name)
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def get(self, name: str) -> Optional[Network]:
+        return self._by_name.get(name)
+
+    def name_for_chain_id(self, chain_id: int) -> Optional[str]:
+        return self._name_by_chain_id.get(chain_id)
+
+    def name_for_folder(self, folder_name: str) -> Optional[str]:
+        return self._name_by_folder.get(folder_name)
+
+    def by_chain_id(self, chain_id: int) -> Optional[Network]:
+        name = self._name_by_chain_id.get(chain_id)
+        return self._by_name[name] if name else None
+
+
+NETWORK_REGISTRY = NetworkRegistry(NETWORKS)
+
+
+def get_network_name(folder_name: str) -> str:
+    network = NETWORK_REGISTRY.name_for_folder(folder_name)
+    if network is None:
+        raise ValueError(f"No network found for folder name: {folder_name}")
+    return network
+
+
+def get_rpc_urls(network_name: str, network: Network) -> List[str]:
+    """
+    Every endpoint of a network: its own urls first, then the dRPC load balancer when it serves the
+    network and DRPC_KEY is set. Empty for a network without urls of its own when there is no key.
+    """
+    urls = [url for url in (network.rpc_url, *network.rpc_urls) if url]
+    if network.drpc and DRPC_KEY:
+        urls.append(DRPC_URL % (network_name, DRPC_KEY))
+    return list(dict.fromkeys(urls))
+
 
 # Constants for logo URIs
 JSDELIVR_BASE_URL = "https://cdn.jsdelivr.net/gh/curvefi/curve-assets"
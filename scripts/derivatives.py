@@ -0,0 +1,216 @@
+import hashlib
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from scripts.images import ImageFile, ImageIndex
+from scripts.manifest import scan_manifest
+from scripts.optimize import load_image, parallel_map, require_pillow
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, see scripts.optimize
+    Image = None
+
+DEFAULT_DERIVATIVES_DIR = os.path.join("build", "derivatives")
+DERIVATIVES_MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+DEFAULT_SIZES = (32, 64, 128)
+# Blank pixels between sprite cells, so bilinear scaling never bleeds a neighbour into an icon
+SPRITE_PADDING = 2
+
+
+def resize_icon(image: "Image.Image", size: int) -> "Image.Image":
+    """Scale an icon to fit a transparent size x size square, keeping its aspect ratio."""
+    icon = image.convert("RGBA")
+    icon.thumbnail((size, size), Image.LANCZOS)
+    if icon.size == (size, size):
+        return icon
+    canvas = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    canvas.paste(icon, ((size - icon.width) // 2, (size - icon.height) // 2))
+    return canvas
+
+
+def derivative_file(folder: str, address: str, size: int) -> str:
+    return f"{size}/{folder}/{address}.png"
+
+
+def render_derivatives(image: ImageFile, folder: str, sizes: Sequence[int], output_dir: str) -> Dict[str, str]:
+    """Write every fixed-size derivative of one icon and return the files by size."""
+    decoded = load_image(image.path)
+    files = {}
+    for size in sizes:
+        file_name = derivative_file(folder, image.address.lower(), size)
+        path = os.path.join(output_dir, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        resize_icon(decoded, size).save(path, "PNG", optimize=True)
+        files[str(size)] = file_name
+    return files
+
+
+def _render_or_error(image: ImageFile, folder: str, sizes: Sequence[int], output_dir: str) -> Dict:
+    """render_derivatives as a manifest entry update, with the error instead of the files for a broken icon."""
+    try:
+        return {"files": render_derivatives(image, folder, sizes, output_dir)}
+    except Exception as e:  # Any decoder failure means the icon is broken, the other icons still get rendered
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+def sprite_layout(count: int, size: int, padding: int = SPRITE_PADDING) -> Tuple[int, int, int]:
+    """Return (columns, width, height) of a roughly square grid of `count` cells."""
+    columns = max(1, math.ceil(math.sqrt(count)))
+    rows = max(1, math.ceil(count / columns))
+    cell = size + padding
+    return columns, columns * cell - padding, rows * cell - padding
+
+
+def render_sprite(folder: str, size: int, icons: List[Tuple[str, str]], output_dir: str, digest: str) -> Dict:
+    """
+    Paste the `size` derivatives of one folder, given as (address, derivative file), into a single
+    atlas and write it next to a JSON map of each address to its [x, y, width, height] in the atlas.
+    """
+    columns, width, height = sprite_layout(len(icons), size)
+    sprite = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    coordinates = {}
+    for position, (address, file_name) in enumerate(icons):
+        x = (position % columns) * (size + SPRITE_PADDING)
+        y = (position // columns) * (size + SPRITE_PADDING)
+        with Image.open(os.path.join(output_dir, file_name)) as icon:
+            sprite.paste(icon, (x, y))
+        coordinates[address] = [x, y, size, size]
+
+    base_name = f"sprites/{folder}-{size}"
+    os.makedirs(os.path.join(output_dir, "sprites"), exist_ok=True)
+    sprite.save(os.path.join(output_dir, f"{base_name}.png"), "PNG", optimize=True)
+    sprite_map = {
+        "image": f"{folder}-{size}.png",
+        "size": size,
+        "width": width,
+        "height": height,
+        "hash": digest,
+        "icons": coordinates,
+    }
+    with open(os.path.join(output_dir, f"{base_name}.json"), "w") as f:
+        json.dump(sprite_map, f, separators=(",", ":"))
+
+    return {"image": f"{base_name}.png", "map": f"{base_name}.json", "count": len(icons), "hash": digest}
+
+
+def _sprite_digest(images: Dict[str, Dict], keys: List[str], size: int) -> str:
+    content = "\n".join(f"{key}:{images[key]['sha256']}" for key in keys)
+    return hashlib.sha256(f"{size}\n{SPRITE_PADDING}\n{content}".encode()).hexdigest()
+
+
+def _files_exist(output_dir: str, files: Iterable[str]) -> bool:
+    return all(os.path.exists(os.path.join(output_dir, file_name)) for file_name in files)
+
+
+def _remove_files(output_dir: str, files: Iterable[str]) -> None:
+    for file_name in files:
+        path = os.path.join(output_dir, file_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _is_current(entry: Dict, sha256: str, sizes: Sequence[int], output_dir: str) -> bool:
+    if entry.get("sha256") != sha256:
+        return False
+    if "error" in entry:
+        # A broken icon is only tried again once its content changes
+        return True
+    files = entry.get("files", {})
+    return all(str(size) in files for size in sizes) and _files_exist(output_dir, files.values())
+
+
+def build_derivatives(
+    image_index: ImageIndex,
+    output_dir: str = DEFAULT_DERIVATIVES_DIR,
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    folders: Optional[Iterable[str]] = None,
+    previous: Optional[Dict] = None,
+    previous_manifest: Optional[Dict] = None,
+    workers: int = 1,
+) -> Tuple[Dict, Dict]:
+    """
+    Render `sizes` px derivatives of every icon and one sprite atlas per folder and size. Returns the
+    derivatives manifest and the images manifest, so both can be saved for the next run.
+
+    Work is skipped by content hash: icons whose sha256 matches the previous manifest keep their
+    derivatives, and an atlas is only redrawn when the hash over its icons changes. Content hashes are
+    reused from the images manifest for files whose size and mtime are unchanged. Icons and atlases are
+    rendered in `workers` processes; icons that fail to decode are recorded with their error and left
+    out of the atlases.
+    """
+    require_pillow()
+    sizes = sorted(set(sizes))
+    previous_images = (previous or {}).get("images", {})
+    previous_sprites = (previous or {}).get("sprites", {})
+    folders = list(folders) if folders is not None else list(image_index.folders)
+    manifest = scan_manifest(image_index, folders, previous_manifest)
+
+    images = {}
+    jobs = []
+    for folder in folders:
+        folder_index = image_index.folders.get(folder)
+        if folder_index is None:
+            continue
+        files = manifest["folders"][folder]["files"]
+        for address, image in folder_index.files.items():
+            key = f"{folder}/{address}"
+            sha256 = files[image.name]["sha256"]
+            entry = previous_images.get(key, {})
+            if _is_current(entry, sha256, sizes, output_dir):
+                images[key] = entry
+            else:
+                images[key] = {"sha256": sha256}
+                jobs.append((image, folder, sizes, output_dir))
+
+    for (image, folder, _, _), result in zip(jobs, parallel_map(_render_or_error, jobs, workers)):
+        key = f"{folder}/{image.address.lower()}"
+        images[key].update(result)
+        if "error" in result:
+            # Whatever was rendered from the icon's previous content is stale now
+            _remove_files(output_dir, previous_images.get(key, {}).get("files", {}).values())
+
+    sprites = {}
+    sprite_jobs = []
+    for folder in folders:
+        keys = [key for key in images if key.split("/")[0] == folder and "files" in images[key]]
+        if not keys:
+            continue
+        sprites[folder] = {}
+        for size in sizes:
+            digest = _sprite_digest(images, keys, size)
+            entry = previous_sprites.get(folder, {}).get(str(size), {})
+            if entry.get("hash") == digest and _files_exist(output_dir, (entry["image"], entry["map"])):
+                sprites[folder][str(size)] = entry
+            else:
+                icons = [(key.split("/")[1], images[key]["files"][str(size)]) for key in keys]
+                sprite_jobs.append((folder, size, icons, output_dir, digest))
+
+    for (folder, size, _, _, _), entry in zip(sprite_jobs, parallel_map(render_sprite, sprite_jobs, workers)):
+        sprites[folder][str(size)] = entry
+
+    # Remove the output of icons and folders that disappeared, keep folders that were not part of this run
+    for key, entry in previous_images.items():
+        if key.split("/")[0] not in folders:
+            images[key] = entry
+        elif key not in images:
+            _remove_files(output_dir, entry.get("files", {}).values())
+    for folder, entry in previous_sprites.items():
+        if folder not in folders:
+            sprites[folder] = entry
+        elif folder not in sprites:
+            _remove_files(
+                output_dir, [file_name for sprite in entry.values() for file_name in (sprite["image"], sprite["map"])]
+            )
+
+    derivatives = {
+        "version": MANIFEST_VERSION,
+        "sizes": sizes,
+        "images": dict(sorted(images.items())),
+        "sprites": dict(sorted(sprites.items())),
+    }
+    return derivatives, manifest
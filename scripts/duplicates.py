@@ -0,0 +1,204 @@
+import os
+import shutil
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from scripts.images import ImageIndex
+from scripts.manifest import scan_manifest
+from scripts.optimize import parallel_map, require_pillow
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only perceptual hashing needs it
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, see scripts.optimize
+    Image = None
+
+# dHash compares each pixel of a 17x16 grayscale thumbnail with its right neighbour: 256 bits per icon.
+# The usual 9x8 hash mostly encodes the outline, which the many round icons here all share.
+HASH_WIDTH = 17
+HASH_HEIGHT = 16
+HASH_WORDS = (HASH_WIDTH - 1) * HASH_HEIGHT // 64
+# Icons whose hashes differ in at most this many of the 256 bits are reported as near-duplicates
+DEFAULT_THRESHOLD = 20
+# The pairwise distance matrix is computed in BLOCK x BLOCK tiles. The XOR of a tile takes
+# BLOCK * BLOCK * HASH_WORDS * 8 bytes (8 MiB), 8 times that where numpy lacks bitwise_count and the bits
+# are unpacked instead, whatever the number of icons
+BLOCK = 512
+
+DEFAULT_STORE_DIR = os.path.join("build", "store")
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("numpy is required for perceptual hashing, install it with `poetry install --with images`")
+
+
+@dataclass
+class DuplicateReport:
+    # sha256 -> "<folder>/<file name>" of every icon with that exact content, only for shared content
+    exact: Dict[str, List[str]] = field(default_factory=dict)
+    # Groups of icons that look alike, each as (files, largest Hamming distance inside the group)
+    near: List[Tuple[List[str], int]] = field(default_factory=list)
+    # Bytes saved by storing every exact duplicate once
+    exact_savings: int = 0
+
+
+def thumbnail_pixels(path: str) -> bytes:
+    """Decode an icon to the grayscale thumbnail dHash works on, flattened onto white."""
+    require_pillow()
+    with Image.open(path) as image:
+        image = image.convert("RGBA")
+    background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+    background.alpha_composite(image)
+    return background.convert("L").resize((HASH_WIDTH, HASH_HEIGHT), Image.LANCZOS).tobytes()
+
+
+def dhash(pixels: "np.ndarray") -> "np.ndarray":
+    """Vectorized dHash of N stacked thumbnails, as an (N, HASH_WORDS) uint64 array."""
+    bits = (pixels[:, :, 1:] > pixels[:, :, :-1]).reshape(len(pixels), -1)
+    return np.packbits(bits, axis=1).view(">u8").astype(np.uint64)
+
+
+def hamming(a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+    """Bits that differ between hashes, broadcasting over everything but the last (word) axis."""
+    xor = a ^ b
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).sum(axis=-1, dtype=np.int32)
+    return np.unpackbits(xor.view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int32)
+
+
+def near_pairs(hashes: "np.ndarray", threshold: int = DEFAULT_THRESHOLD) -> List[Tuple[int, int, int]]:
+    """
+    Every pair (i, j, distance) with i < j whose hashes are within `threshold` bits, in tiles of the upper
+    triangle of the distance matrix.
+    """
+    pairs = []
+    for row_start in range(0, len(hashes), BLOCK):
+        rows_block = hashes[row_start : row_start + BLOCK]  # noqa: E203
+        for column_start in range(row_start, len(hashes), BLOCK):
+            columns_block = hashes[column_start : column_start + BLOCK]  # noqa: E203
+            distances = hamming(rows_block[:, None], columns_block[None, :])
+            rows, columns = np.nonzero(distances <= threshold)
+            for row, column in zip(rows.tolist(), columns.tolist()):
+                if row_start + row < column_start + column:
+                    pairs.append((row_start + row, column_start + column, int(distances[row, column])))
+    pairs.sort()
+    return pairs
+
+
+def _clusters(count: int, pairs: Iterable[Tuple[int, int, int]]) -> List[List[int]]:
+    """
+    Greedy centre clustering: the icon with the most close neighbours left claims all of them, so every
+    member is within the threshold of its centre. Plain connected components would chain dissimilar icons
+    through long runs of slightly different ones.
+    """
+    neighbours: Dict[int, set] = {}
+    for i, j, _ in pairs:
+        neighbours.setdefault(i, set()).add(j)
+        neighbours.setdefault(j, set()).add(i)
+
+    clusters = []
+    assigned = set()
+    for centre in sorted(neighbours, key=lambda i: (-len(neighbours[i]), i)):
+        if centre in assigned:
+            continue
+        members = [centre, *sorted(neighbours[centre] - assigned)]
+        if len(members) > 1:
+            clusters.append(members)
+            assigned.update(members)
+    return clusters
+
+
+def find_duplicates(
+    image_index: ImageIndex,
+    folders: Optional[Iterable[str]] = None,
+    previous_manifest: Optional[Dict] = None,
+    hash_cache: Optional[Dict[str, str]] = None,
+    threshold: Optional[int] = DEFAULT_THRESHOLD,
+    workers: int = 1,
+) -> Tuple[DuplicateReport, Dict, Dict[str, str]]:
+    """
+    Group icons with identical content (by sha256) and, unless threshold is None, icons that look alike
+    (by dHash). Returns the report, the images manifest used for the content hashes and the perceptual
+    hash cache, keyed by sha256, so both can be saved and reused by the next scan.
+
+    Each distinct content is decoded once, and contents found in `hash_cache` are not decoded at all.
+    """
+    manifest = scan_manifest(image_index, folders, previous_manifest)
+    files_by_sha: Dict[str, List[str]] = {}
+    sizes: Dict[str, int] = {}
+    paths: Dict[str, str] = {}
+    for folder, folder_manifest in manifest["folders"].items():
+        for name, entry in folder_manifest["files"].items():
+            files_by_sha.setdefault(entry["sha256"], []).append(f"{folder}/{name}")
+            sizes[entry["sha256"]] = entry["size"]
+            paths.setdefault(entry["sha256"], os.path.join(image_index.folders[folder].path, name))
+
+    report = DuplicateReport()
+    for sha256, files in sorted(files_by_sha.items(), key=lambda item: -len(item[1])):
+        if len(files) > 1:
+            report.exact[sha256] = sorted(files)
+            report.exact_savings += sizes[sha256] * (len(files) - 1)
+
+    hash_cache = dict(hash_cache or {})
+    if threshold is None:
+        return report, manifest, hash_cache
+
+    require_numpy()
+    digests = sorted(files_by_sha)
+    missing = [sha256 for sha256 in digests if sha256 not in hash_cache]
+    if missing:
+        thumbnails = parallel_map(thumbnail_pixels, [(paths[sha256],) for sha256 in missing], workers)
+        pixels = np.frombuffer(b"".join(thumbnails), dtype=np.uint8).reshape(-1, HASH_HEIGHT, HASH_WIDTH)
+        for sha256, value in zip(missing, dhash(pixels).tolist()):
+            hash_cache[sha256] = "".join(f"{word:016x}" for word in value)
+
+    packed = b"".join(bytes.fromhex(hash_cache[sha256]) for sha256 in digests)
+    hashes = np.frombuffer(packed, dtype=">u8").astype(np.uint64).reshape(len(digests), HASH_WORDS)
+    for members in _clusters(len(digests), near_pairs(hashes, threshold)):
+        files = sorted(file for i in members for file in files_by_sha[digests[i]])
+        # Members are close to the centre, not necessarily to each other
+        cluster_hashes = hashes[members]
+        largest = int(hamming(cluster_hashes[:, None], cluster_hashes[None, :]).max())
+        report.near.append((files, largest))
+    report.near.sort(key=lambda cluster: (-len(cluster[0]), cluster[0]))
+
+    # Only keep hashes of content that still exists
+    hash_cache = {sha256: hash_cache[sha256] for sha256 in digests}
+    return report, manifest, hash_cache
+
+
+def build_store(
+    image_index: ImageIndex, manifest: Dict, store_dir: str = DEFAULT_STORE_DIR, symlinks: bool = False
+) -> Dict[str, str]:
+    """
+    Write every distinct icon once as `objects/<sha256[:2]>/<sha256>.png` and return the store manifest,
+    mapping "<folder>/<file name>" to its object. With symlinks, `<folder>/<file name>` links to the object
+    as well, so the store can be served in place of `images/`.
+    """
+    entries = {}
+    for folder, folder_manifest in manifest["folders"].items():
+        for name, entry in folder_manifest["files"].items():
+            sha256 = entry["sha256"]
+            obj = f"objects/{sha256[:2]}/{sha256}.png"
+            obj_path = os.path.join(store_dir, obj)
+            if not os.path.exists(obj_path):
+                os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+                shutil.copyfile(os.path.join(image_index.folders[folder].path, name), obj_path)
+            entries[f"{folder}/{name}"] = obj
+
+            if symlinks:
+                link_path = os.path.join(store_dir, folder, name)
+                os.makedirs(os.path.dirname(link_path), exist_ok=True)
+                target = os.path.relpath(obj_path, os.path.dirname(link_path))
+                if os.path.islink(link_path) and os.readlink(link_path) == target:
+                    continue
+                if os.path.lexists(link_path):
+                    os.remove(link_path)
+                os.symlink(target, link_path)
+
+    return dict(sorted(entries.items()))
@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from scripts.images import ImageFile, ImageIndex
+
+PNG = "png"
+WEBP = "webp"
+JPEG = "jpeg"
+GIF = "gif"
+AVIF = "avif"
+SVG = "svg"
+
+# Enough bytes to tell every format below apart
+SNIFF_SIZE = 32
+
+EXTENSIONS = {PNG: "png", WEBP: "webp", JPEG: "jpg", GIF: "gif", AVIF: "avif", SVG: "svg"}
+MIME_TYPES = {
+    PNG: "image/png",
+    WEBP: "image/webp",
+    JPEG: "image/jpeg",
+    GIF: "image/gif",
+    AVIF: "image/avif",
+    SVG: "image/svg+xml",
+}
+
+
+def sniff_format(header: bytes) -> Optional[str]:
+    """Identify an image format from its leading bytes, regardless of the file name."""
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return PNG
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return WEBP
+    if header.startswith(b"\xff\xd8\xff"):
+        return JPEG
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return GIF
+    # ISO base media file: size, "ftyp", then the major brand
+    if header[4:8] == b"ftyp" and header[8:12] in (b"avif", b"avis"):
+        return AVIF
+    text = header.lstrip()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in header):
+        return SVG
+    return None
+
+
+def sniff_file(path: str) -> Optional[str]:
+    with open(path, "rb") as f:
+        return sniff_format(f.read(SNIFF_SIZE))
+
+
+@dataclass(frozen=True)
+class FormatMismatch:
+    folder: str
+    image: ImageFile
+    # None when the content is not a recognised image format at all
+    actual: Optional[str]
+
+    @property
+    def expected(self) -> str:
+        return PNG
+
+    def __str__(self) -> str:
+        actual = self.actual.upper() if self.actual else "unrecognised data"
+        return f"{self.folder}/{self.image.name} is {actual}, not PNG"
+
+
+def find_format_mismatches(image_index: ImageIndex, folders: Optional[Iterable[str]] = None) -> List[FormatMismatch]:
+    """Read the header of every indexed `.png` and return the ones whose content is not actually PNG."""
+    mismatches = []
+    for folder in folders if folders is not None else image_index.folders:
+        folder_index = image_index.folders.get(folder)
+        if folder_index is None:
+            continue
+        for image in folder_index.files.values():
+            actual = sniff_file(image.path)
+            if actual != PNG:
+                mismatches.append(FormatMismatch(folder, image, actual))
+    return mismatches
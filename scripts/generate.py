@@ -1,13 +1,19 @@
-import os
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
 from rich.console import Console
 from rich.theme import Theme
 
-from scripts.constants import NATIVE_TOKEN_ADDRESS, NETWORKS, get_native_token_info
+from scripts.batching import BatchSizeStore
+from scripts.cache import TokenCache, ValidationCache
+from scripts.constants import NATIVE_TOKEN_ADDRESS, NETWORKS, get_native_token_info, get_network_name
+from scripts.images import ImageIndex, build_image_index
+from scripts.manifest import ImageChanges
 from scripts.process import process_network, update_tokenlist
 from scripts.scan import display_summary, scan_images_folder
-from scripts.utils import save_json
+from scripts.telemetry import span, traced
+from scripts.utils import TokenIndex, build_token_index, save_json
 
 # Create a custom theme for our logs
 custom_theme = Theme(
@@ -22,8 +28,11 @@ custom_theme = Theme(
 # Initialize Rich console with our custom theme
 console = Console(theme=custom_theme)
 
+# Name of the tokenlist covering every network
+ALL_NETWORKS = "all_networks"
 
-def ensure_native_token_in_list(tokenlist, network_name):
+
+def ensure_native_token_in_list(tokenlist, network_name, image_index: Optional[ImageIndex] = None):
     """
     Ensure the native token is present and up-to-date in the tokenlist for the given network,
     but only if its image file exists and 0xeee is in the network folder.
@@ -31,9 +40,11 @@ def ensure_native_token_in_list(tokenlist, network_name):
     network = NETWORKS[network_name]
     native_token_info = get_native_token_info(network)
 
+    if image_index is None:
+        image_index = build_image_index()
+
     # Check if the native token image exists and 0xeee is in the folder
-    image_path = f"images/{network.folder_name}/{NATIVE_TOKEN_ADDRESS.lower()}.png"
-    if not os.path.exists(image_path):
+    if not image_index.has_image(network_name, NATIVE_TOKEN_ADDRESS):
         return  # Skip if conditions are not met
 
     # Remove any existing entry for the native token
@@ -47,15 +58,135 @@ def ensure_native_token_in_list(tokenlist, network_name):
     tokenlist.append(native_token_info)
 
 
-def generate_tokenlist(
+def apply_image_changes(
+    networks: List[str], existing_tokenlist: Dict, image_changes: ImageChanges
+) -> Tuple[List[str], Dict[str, List[str]], Dict]:
+    """
+    Restrict a run to the networks in `image_changes`. Returns those networks, the addresses to
+    (re)process on each of them and the existing tokenlist without the tokens whose image was removed.
+    """
+    changed_networks = {}
+    removed_tokens = set()
+    for folder in image_changes.folders:
+        try:
+            network_name = get_network_name(folder)
+        except ValueError:
+            continue
+        if network_name not in networks:
+            continue
+        changed_networks[network_name] = image_changes.to_process(folder)
+        chain_id = NETWORKS[network_name].chain_id
+        removed_tokens.update((chain_id, address) for address in image_changes.removed.get(folder, []))
+
+    console.print(
+        f"[info]Incremental run: {len(changed_networks)} networks changed, "
+        f"{sum(map(len, changed_networks.values()))} images to process, {len(removed_tokens)} removed[/info]"
+    )
+
+    patched_tokenlist = {
+        **existing_tokenlist,
+        "tokens": [
+            token
+            for token in existing_tokenlist.get("tokens", [])
+            if (token["chainId"], token["address"].lower()) not in removed_tokens
+        ],
+    }
+    networks = [network for network in networks if network in changed_networks]
+    return networks, changed_networks, patched_tokenlist
+
+
+def process_single_network(
+    network_name: str,
     existing_tokenlist: Dict,
+    token_index: TokenIndex,
+    token_cache: Optional[TokenCache] = None,
+    addresses_by_network: Optional[Dict[str, List[str]]] = None,
+    image_index: Optional[ImageIndex] = None,
+    include_skipped: bool = False,
+    batch_sizes: Optional[BatchSizeStore] = None,
+) -> Tuple[List[Dict], Dict[str, List[str]]]:
+    """
+    Process one network and return its tokens along with the tokens that failed on it.
+    Failures are collected per network so that concurrent workers never share mutable state.
+    With include_skipped, existing tokens that needed no RPC call are returned as well.
+    """
+    failed_tokens = {}
+    addresses = addresses_by_network.get(network_name, []) if addresses_by_network is not None else None
+    # Everything recorded while processing the network is labelled with it
+    with span("process_network", network=network_name):
+        network_tokens, skipped_tokens = process_network(
+            network_name,
+            existing_tokenlist,
+            failed_tokens,
+            token_index,
+            token_cache,
+            addresses,
+            image_index,
+            batch_sizes,
+        )
+    if include_skipped:
+        network_tokens = skipped_tokens + network_tokens
+    ensure_native_token_in_list(network_tokens, network_name, image_index)
+    return network_tokens, failed_tokens
+
+
+def process_networks(
+    networks: List[str],
+    existing_tokenlist: Dict,
+    max_workers: int = 1,
+    token_cache: Optional[TokenCache] = None,
+    addresses_by_network: Optional[Dict[str, List[str]]] = None,
+    image_index: Optional[ImageIndex] = None,
+    include_skipped: bool = False,
+    batch_sizes: Optional[BatchSizeStore] = None,
+) -> Tuple[List[Dict], Dict[str, List[str]]]:
+    """
+    Process all networks, concurrently when max_workers > 1.
+
+    Each network is submitted to the pool exactly once, so at most one worker talks to a given chain
+    at a time while different chains wait on their RPCs in parallel. Results are merged in the order
+    of `networks`, so the output is identical to a sequential run. The existing tokens are indexed
+    once and the (read-only) index is shared by all workers. With addresses_by_network, only those
+    addresses are processed instead of every image of the network.
+    """
+    token_index = build_token_index(existing_tokenlist.get("tokens", []))
+    process = partial(
+        process_single_network,
+        existing_tokenlist=existing_tokenlist,
+        token_index=token_index,
+        token_cache=token_cache,
+        addresses_by_network=addresses_by_network,
+        image_index=image_index,
+        include_skipped=include_skipped,
+        batch_sizes=batch_sizes,
+    )
+
+    if max_workers > 1 and len(networks) > 1:
+        console.print(f"[info]Processing {len(networks)} networks with {max_workers} workers...[/info]")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(networks))) as executor:
+            results = list(executor.map(process, networks))
+    else:
+        results = [process(network) for network in networks]
+
+    processed_tokens = []
+    all_failed_tokens = {}
+    for network_tokens, failed_tokens in results:
+        processed_tokens.extend(network_tokens)
+        all_failed_tokens.update(failed_tokens)
+
+    return processed_tokens, all_failed_tokens
+
+
+@traced("scan")
+def select_networks(
+    existing_tokenlist: Dict,
+    image_index: ImageIndex,
     networks_to_include: Optional[List[str]] = None,
     networks_to_ignore: Optional[List[str]] = None,
-) -> Dict:
-    console.print("[info]Starting token list generation...[/info]")
-
+) -> List[str]:
+    """Scan the images folder against the existing tokens, print the summary and return the networks to process."""
     # Use the input tokenlist for scanning
-    networks, tokens_in_folder, tokens_to_add = scan_images_folder(existing_tokenlist)
+    networks, tokens_in_folder, tokens_to_add = scan_images_folder(existing_tokenlist, image_index)
 
     if networks_to_include:
         networks = [net for net in networks if net in networks_to_include]
@@ -63,20 +194,10 @@ def generate_tokenlist(
         networks = [net for net in networks if net not in networks_to_ignore]
 
     display_summary(networks, tokens_in_folder, tokens_to_add)
+    return networks
 
-    all_failed_tokens = {}
-    processed_tokens = []
-
-    for network in networks:
-        processed_tokens, _ = process_network(network, existing_tokenlist, all_failed_tokens)
-        ensure_native_token_in_list(processed_tokens, network)
-
-        processed_tokens.extend(processed_tokens)
 
-    # Update the tokenlist after processing all networks
-    updated_tokenlist = update_tokenlist(processed_tokens, existing_tokenlist)
-
-    # Check if there are any failed tokens
+def report_failed_tokens(all_failed_tokens: Dict[str, List[str]]) -> None:
     if all_failed_tokens:
         console.print(
             "[yellow]Some tokens failed to return data or validate. "
@@ -86,6 +207,155 @@ def generate_tokenlist(
     else:
         console.print("[green]All tokens processed successfully![/green]")
 
+
+def generate_tokenlist(
+    existing_tokenlist: Dict,
+    networks_to_include: Optional[List[str]] = None,
+    networks_to_ignore: Optional[List[str]] = None,
+    max_workers: int = 1,
+    token_cache: Optional[TokenCache] = None,
+    image_changes: Optional[ImageChanges] = None,
+    image_index: Optional[ImageIndex] = None,
+    validation_cache: Optional[ValidationCache] = None,
+    batch_sizes: Optional[BatchSizeStore] = None,
+    failed_tokens: Optional[Dict[str, List[str]]] = None,
+) -> Dict:
+    """
+    Generate the tokenlist from the images folder. With image_changes, only networks with added,
+    removed or changed images are touched and the existing tokenlist is patched in place. The tokens
+    that failed are added to `failed_tokens`, per network, when it is given.
+    """
+    console.print("[info]Starting token list generation...[/info]")
+
+    # Walk the images folder once and share the index with every stage
+    if image_index is None:
+        image_index = build_image_index()
+
+    networks = select_networks(existing_tokenlist, image_index, networks_to_include, networks_to_ignore)
+
+    addresses_by_network = None
+    if image_changes is not None:
+        networks, addresses_by_network, existing_tokenlist = apply_image_changes(
+            networks, existing_tokenlist, image_changes
+        )
+
+    processed_tokens, all_failed_tokens = process_networks(
+        networks,
+        existing_tokenlist,
+        max_workers,
+        token_cache,
+        addresses_by_network,
+        image_index,
+        batch_sizes=batch_sizes,
+    )
+
+    # Update the tokenlist after processing all networks
+    updated_tokenlist = update_tokenlist(processed_tokens, existing_tokenlist, validation_cache)
+
+    # Check if there are any failed tokens
+    report_failed_tokens(all_failed_tokens)
+    if failed_tokens is not None:
+        failed_tokens.update(all_failed_tokens)
+
     console.print("[green]Token list generation completed![/green]")
 
     return updated_tokenlist
+
+
+def generate_tokenlists(
+    existing_tokenlists: Dict[str, Dict],
+    networks_to_include: Optional[List[str]] = None,
+    networks_to_ignore: Optional[List[str]] = None,
+    max_workers: int = 1,
+    token_cache: Optional[TokenCache] = None,
+    image_changes: Optional[ImageChanges] = None,
+    image_index: Optional[ImageIndex] = None,
+    validation_caches: Optional[Dict[str, ValidationCache]] = None,
+    batch_sizes: Optional[BatchSizeStore] = None,
+    failed_tokens: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, Dict]:
+    """
+    Generate every per-network tokenlist and the ALL_NETWORKS aggregate in one pass, keyed like
+    `existing_tokenlists` (network name or ALL_NETWORKS).
+
+    The images folder is scanned once and each network is fetched once, against an index of the tokens
+    of all existing lists. The processed tokens, including existing ones that needed no RPC call, are
+    then merged into each per-network list and into the aggregate, so every output matches what a
+    separate run for it would produce. With image_changes, only changed networks are processed and
+    tokens whose image was removed are dropped from every list. Failed tokens are reported in
+    `failed_tokens` as in generate_tokenlist.
+    """
+    console.print("[info]Starting generation of all tokenlists...[/info]")
+    validation_caches = validation_caches or {}
+
+    if image_index is None:
+        image_index = build_image_index()
+
+    # Per-network lists come last, so their entries win over the aggregate's
+    combined_tokenlist = {
+        "tokens": [
+            token
+            for name in sorted(existing_tokenlists, key=lambda name: name != ALL_NETWORKS)
+            for token in existing_tokenlists[name].get("tokens", [])
+        ]
+    }
+    networks = select_networks(combined_tokenlist, image_index, networks_to_include, networks_to_ignore)
+    output_networks = list(networks)
+
+    addresses_by_network = None
+    if image_changes is not None:
+        networks, addresses_by_network, patched_tokenlist = apply_image_changes(
+            networks, combined_tokenlist, image_changes
+        )
+        removed = (
+            build_token_index(combined_tokenlist["tokens"]).keys()
+            - build_token_index(patched_tokenlist["tokens"]).keys()
+        )
+        existing_tokenlists = {
+            name: {
+                **tokenlist,
+                "tokens": [
+                    token
+                    for token in tokenlist.get("tokens", [])
+                    if (token["chainId"], token["address"].lower()) not in removed
+                ],
+            }
+            for name, tokenlist in existing_tokenlists.items()
+        }
+        combined_tokenlist = patched_tokenlist
+
+    processed_tokens, all_failed_tokens = process_networks(
+        networks,
+        combined_tokenlist,
+        max_workers,
+        token_cache,
+        addresses_by_network,
+        image_index,
+        include_skipped=True,
+        batch_sizes=batch_sizes,
+    )
+
+    tokens_by_chain: Dict[int, List[Dict]] = {}
+    for token in processed_tokens:
+        tokens_by_chain.setdefault(token["chainId"], []).append(token)
+
+    tokenlists = {}
+    for network in output_networks:
+        console.print(f"[info]Updating the {network} tokenlist...[/info]")
+        tokenlists[network] = update_tokenlist(
+            tokens_by_chain.get(NETWORKS[network].chain_id, []),
+            existing_tokenlists.get(network, {}),
+            validation_caches.get(network),
+        )
+    console.print("[info]Updating the aggregate tokenlist...[/info]")
+    tokenlists[ALL_NETWORKS] = update_tokenlist(
+        processed_tokens, existing_tokenlists.get(ALL_NETWORKS, {}), validation_caches.get(ALL_NETWORKS)
+    )
+
+    report_failed_tokens(all_failed_tokens)
+    if failed_tokens is not None:
+        failed_tokens.update(all_failed_tokens)
+
+    console.print(f"[green]Generated {len(tokenlists)} tokenlists![/green]")
+
+    return tokenlists
@@ -0,0 +1,98 @@
+import os
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+from typing import FrozenSet, Mapping, Optional
+
+from scripts.constants import NETWORK_REGISTRY
+
+IMAGES_DIR = "images"
+
+
+@dataclass(frozen=True)
+class ImageFile:
+    name: str
+    address: str
+    path: str
+
+    @cached_property
+    def stat(self) -> os.stat_result:
+        # Only the manifest needs size and mtime, so a file is stat'ed the first time they are read
+        return os.stat(self.path)
+
+    @property
+    def size(self) -> int:
+        return self.stat.st_size
+
+    @property
+    def mtime(self) -> int:
+        return self.stat.st_mtime_ns
+
+
+@dataclass(frozen=True)
+class FolderIndex:
+    folder: str
+    path: str
+    network: Optional[str]
+    mtime: int
+    # Keyed by lowercase address
+    files: Mapping[str, ImageFile]
+
+    @property
+    def addresses(self) -> FrozenSet[str]:
+        return frozenset(self.files)
+
+    def has_image(self, address: str) -> bool:
+        return address.lower() in self.files
+
+
+@dataclass(frozen=True)
+class ImageIndex:
+    """
+    Immutable snapshot of the PNG token icons under `images/`, built with a single directory walk.
+
+    Folders are keyed by folder name and, when they belong to a known network, by network name,
+    so scanning, processing and generation can share one walk. Individual files are only stat'ed
+    when their size or mtime is read, which only the manifest does.
+    """
+
+    images_dir: str
+    folders: Mapping[str, FolderIndex]
+    networks: Mapping[str, FolderIndex]
+
+    def for_network(self, network_name: str) -> Optional[FolderIndex]:
+        return self.networks.get(network_name)
+
+    def has_image(self, network_name: str, address: str) -> bool:
+        folder_index = self.networks.get(network_name)
+        return folder_index is not None and folder_index.has_image(address)
+
+
+def scan_folder(folder: str, path: str) -> FolderIndex:
+    files = {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".png") or not entry.is_file():
+                continue
+            address = entry.name[:-4]
+            files[address.lower()] = ImageFile(entry.name, address, entry.path)
+
+    return FolderIndex(
+        folder=folder,
+        path=path,
+        network=NETWORK_REGISTRY.name_for_folder(folder),
+        mtime=os.stat(path).st_mtime_ns,
+        files=MappingProxyType(dict(sorted(files.items()))),
+    )
+
+
+def build_image_index(images_dir: str = IMAGES_DIR) -> ImageIndex:
+    folders = {}
+    if os.path.isdir(images_dir):
+        with os.scandir(images_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir():
+                    folders[entry.name] = scan_folder(entry.name, entry.path)
+
+    networks = {folder_index.network: folder_index for folder_index in folders.values() if folder_index.network}
+    return ImageIndex(images_dir, MappingProxyType(folders), MappingProxyType(networks))
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from scripts.images import ImageIndex
+
+DEFAULT_MANIFEST_DIR = ".cache"
+
+
+def get_manifest_path(output_name: str) -> str:
+    """Each published file gets its own manifest, so runs for different files don't hide each other's changes."""
+    return os.path.join(DEFAULT_MANIFEST_DIR, f"images_manifest-{output_name}.json")
+
+
+@dataclass
+class ImageChanges:
+    """Token images added, removed or changed since the last run, as folder -> lowercase addresses."""
+
+    added: Dict[str, List[str]] = field(default_factory=dict)
+    removed: Dict[str, List[str]] = field(default_factory=dict)
+    changed: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def folders(self) -> List[str]:
+        return sorted(set(self.added) | set(self.removed) | set(self.changed))
+
+    def to_process(self, folder: str) -> List[str]:
+        return self.added.get(folder, []) + self.changed.get(folder, [])
+
+    def rebuild(self, folder: str, addresses: Iterable[str]) -> None:
+        """Process every image of a folder, as if all of them had been added."""
+        self.changed.pop(folder, None)
+        self.added[folder] = sorted(addresses)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def scan_manifest(image_index: ImageIndex, folders: Optional[Iterable[str]] = None, previous: Dict = None) -> Dict:
+    """
+    Record the mtime of every image folder and the size, mtime and content hash of every PNG in it.
+
+    Sizes and mtimes come from the image index; files whose size and mtime match the previous
+    manifest reuse its hash, so only new or touched files are read. On a fresh checkout every file
+    is hashed once, but unchanged content still compares equal to the previous manifest.
+    """
+    previous_folders = (previous or {}).get("folders", {})
+    manifest = {"folders": {}}
+
+    for folder in folders if folders is not None else image_index.folders:
+        folder_index = image_index.folders.get(folder)
+        if folder_index is None:
+            continue
+
+        previous_files = previous_folders.get(folder, {}).get("files", {})
+        files = {}
+        for image in folder_index.files.values():
+            entry_info = {"size": image.size, "mtime": image.mtime}
+            previous_file = previous_files.get(image.name, {})
+            if all(previous_file.get(key) == value for key, value in entry_info.items()):
+                entry_info["sha256"] = previous_file["sha256"]
+            else:
+                entry_info["sha256"] = hash_file(image.path)
+            files[image.name] = entry_info
+
+        manifest["folders"][folder] = {"mtime": folder_index.mtime, "files": files}
+
+    return manifest
+
+
+def diff_manifests(previous: Dict, current: Dict) -> ImageChanges:
+    changes = ImageChanges()
+    previous_folders = previous.get("folders", {})
+
+    for folder, current_folder in current.get("folders", {}).items():
+        previous_files = previous_folders.get(folder, {}).get("files", {})
+        current_files = current_folder["files"]
+
+        added = [name[:-4].lower() for name in current_files if name not in previous_files]
+        removed = [name[:-4].lower() for name in previous_files if name not in current_files]
+        changed = [
+            name[:-4].lower()
+            for name, entry in current_files.items()
+            if name in previous_files and previous_files[name]["sha256"] != entry["sha256"]
+        ]
+
+        if added:
+            changes.added[folder] = sorted(added)
+        if removed:
+            changes.removed[folder] = sorted(removed)
+        if changed:
+            changes.changed[folder] = sorted(changed)
+
+    # Folders that disappeared entirely
+    for folder, previous_folder in previous_folders.items():
+        if folder not in current.get("folders", {}) and previous_folder["files"]:
+            changes.removed[folder] = sorted(name[:-4].lower() for name in previous_folder["files"])
+
+    return changes
+
+
+def without_images(manifest: Dict, addresses_by_folder: Dict[str, Iterable[str]]) -> Dict:
+    """
+    `manifest` without the images of the given addresses, so the next incremental run sees them as
+    added and processes them again.
+    """
+    folders = {}
+    for folder, folder_manifest in manifest.get("folders", {}).items():
+        addresses = {address.lower() for address in addresses_by_folder.get(folder, [])}
+        files = {name: entry for name, entry in folder_manifest["files"].items() if name[:-4].lower() not in addresses}
+        folders[folder] = {**folder_manifest, "files": files}
+    return {**manifest, "folders": folders}
+
+
+def load_manifest(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict, path: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write atomically so an interrupted run never leaves a truncated manifest behind
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,210 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from scripts.formats import AVIF, EXTENSIONS, PNG, WEBP, FormatMismatch, sniff_file
+from scripts.images import ImageFile, ImageIndex
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, only transcoding and variants need it
+    Image = None
+
+DEFAULT_VARIANTS_DIR = os.path.join("build", "icons")
+VARIANTS_MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+
+VARIANT_FORMATS = (PNG, WEBP, AVIF)
+# PNG and WebP variants are lossless; AVIF is lossy, as lossless AVIF is larger than the PNG for icons.
+# Lossless WebP "quality" is encoder effort: higher settings take seconds per icon for a few bytes.
+WEBP_EFFORT = 50
+WEBP_METHOD = 4
+AVIF_QUALITY = 80
+AVIF_SPEED = 6
+
+
+def require_pillow() -> None:
+    if Image is None:
+        raise RuntimeError("Pillow is required to transcode icons, install it with `poetry install --with images`")
+
+
+def parallel_map(fn: Callable, jobs: List[Tuple], workers: int = 1) -> List:
+    """Call fn(*job) for every job, in worker processes when workers > 1. Results keep the order of `jobs`."""
+    if workers > 1 and len(jobs) > 1:
+        workers = min(workers, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fn, *zip(*jobs), chunksize=max(1, len(jobs) // (workers * 4))))
+    return [fn(*job) for job in jobs]
+
+
+def load_image(path: str) -> "Image.Image":
+    require_pillow()
+    with Image.open(path) as image:
+        image.load()
+    # Palette and other exotic modes don't survive every encoder
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+    return image
+
+
+def encode_image(image: "Image.Image", image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == PNG:
+        image.save(buffer, "PNG", optimize=True)
+    elif image_format == WEBP:
+        image.save(buffer, "WEBP", lossless=True, quality=WEBP_EFFORT, method=WEBP_METHOD)
+    elif image_format == AVIF:
+        image.save(buffer, "AVIF", quality=AVIF_QUALITY, speed=AVIF_SPEED)
+    else:
+        raise ValueError(f"Unsupported variant format: {image_format}")
+    return buffer.getvalue()
+
+
+def transcode_to_png(mismatch: FormatMismatch) -> int:
+    """Rewrite a mislabeled icon in place as a real (lossless) PNG and return its new size."""
+    data = encode_image(load_image(mismatch.image.path), PNG)
+    tmp_path = f"{mismatch.image.path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, mismatch.image.path)
+    return len(data)
+
+
+def _write_if_changed(path: str, data: bytes) -> None:
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def optimize_image(image: ImageFile, folder: str, output_dir: str, formats: Sequence[str]) -> Dict:
+    """Encode one icon in every requested format and return its manifest entry."""
+    with open(image.path, "rb") as f:
+        original = f.read()
+    source_format = sniff_file(image.path)
+    decoded = load_image(image.path)
+
+    os.makedirs(os.path.join(output_dir, folder), exist_ok=True)
+    variants = {}
+    for image_format in formats:
+        data = encode_image(decoded, image_format)
+        # Recompression must never grow an icon that already was a PNG
+        if image_format == PNG and source_format == PNG and len(original) <= len(data):
+            data = original
+        file_name = f"{folder}/{image.address.lower()}.{EXTENSIONS[image_format]}"
+        _write_if_changed(os.path.join(output_dir, file_name), data)
+        variants[image_format] = {
+            "file": file_name,
+            "size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+
+    return {
+        "source": {
+            "name": image.name,
+            "format": source_format,
+            "size": image.size,
+            "mtime": image.mtime,
+            "sha256": hashlib.sha256(original).hexdigest(),
+            "width": decoded.width,
+            "height": decoded.height,
+        },
+        "variants": variants,
+    }
+
+
+def _optimize_or_error(image: ImageFile, folder: str, output_dir: str, formats: Sequence[str]) -> Dict:
+    """optimize_image, or for a broken icon an entry with the error and no variants."""
+    try:
+        return optimize_image(image, folder, output_dir, formats)
+    except Exception as e:  # Any decoder failure means the icon is broken, the other icons still get encoded
+        return {
+            "source": {"name": image.name, "size": image.size, "mtime": image.mtime},
+            "variants": {},
+            "error": f"{type(e).__name__}: {e}",
+        }
+
+
+def _is_current(entry: Optional[Dict], image: ImageFile, output_dir: str, formats: Sequence[str]) -> bool:
+    if not entry:
+        return False
+    source = entry.get("source", {})
+    if source.get("size") != image.size or source.get("mtime") != image.mtime:
+        return False
+    if "error" in entry:
+        # A broken icon is only tried again once it changes
+        return True
+    variants = entry.get("variants", {})
+    return all(fmt in variants and os.path.exists(os.path.join(output_dir, variants[fmt]["file"])) for fmt in formats)
+
+
+def _remove_variants(output_dir: str, entry: Dict) -> None:
+    for variant in entry.get("variants", {}).values():
+        path = os.path.join(output_dir, variant["file"])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def optimize_images(
+    image_index: ImageIndex,
+    output_dir: str = DEFAULT_VARIANTS_DIR,
+    formats: Sequence[str] = VARIANT_FORMATS,
+    folders: Optional[Iterable[str]] = None,
+    previous: Optional[Dict] = None,
+    workers: int = 1,
+) -> Dict:
+    """
+    Build size-optimized variants of every icon under `output_dir/<folder>/<address>.<ext>` and return
+    the variants manifest, keyed by "<folder>/<lowercase address>".
+
+    Icons whose size and mtime match the previous manifest are not encoded again, and variants of icons
+    that no longer exist are deleted. Icons that fail to decode are recorded with their error instead of
+    variants. With workers > 1 icons are encoded in that many processes.
+    """
+    require_pillow()
+    previous_images = (previous or {}).get("images", {})
+    folders = list(folders) if folders is not None else list(image_index.folders)
+    images = {}
+    jobs = []
+
+    for folder in folders:
+        folder_index = image_index.folders.get(folder)
+        if folder_index is None:
+            continue
+        for address, image in folder_index.files.items():
+            key = f"{folder}/{address}"
+            entry = previous_images.get(key)
+            if _is_current(entry, image, output_dir, formats):
+                images[key] = entry
+            else:
+                jobs.append((image, folder, output_dir, formats))
+
+    for (image, folder, _, _), entry in zip(jobs, parallel_map(_optimize_or_error, jobs, workers)):
+        key = f"{folder}/{image.address.lower()}"
+        images[key] = entry
+        if "error" in entry and key in previous_images:
+            # Variants of the icon's previous content are stale now
+            _remove_variants(output_dir, previous_images[key])
+
+    # Drop variants of removed icons, only within the folders that were processed
+    for key, entry in previous_images.items():
+        if key.split("/")[0] in folders and key not in images:
+            _remove_variants(output_dir, entry)
+        elif key not in images:
+            images[key] = entry
+
+    return {"version": MANIFEST_VERSION, "formats": list(formats), "images": dict(sorted(images.items()))}
+
+
+def variant_sizes(manifest: Dict) -> Dict[str, int]:
+    """Total bytes per format across the manifest, with "source" for the original icons."""
+    totals = {"source": 0}
+    for entry in manifest.get("images", {}).values():
+        totals["source"] += entry["source"]["size"]
+        for image_format, variant in entry["variants"].items():
+            totals[image_format] = totals.get(image_format, 0) + variant["size"]
+    return totals
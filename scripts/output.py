@@ -0,0 +1,78 @@
+import gzip
+import io
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from scripts.stream import TOKEN_MAP_FULL, TOKEN_MAP_INDEX, write_tokenlist
+
+try:
+    import brotli
+except ImportError:  # brotli is optional (poetry install --with images), only profiles publishing .br need it
+    brotli = None
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    indent: Optional[int]
+    token_map: str
+    # Precompressed siblings to publish next to the JSON file, by extension
+    compressions: Tuple[str, ...] = ()
+
+
+OUTPUT_PROFILES: Dict[str, OutputProfile] = {
+    "default": OutputProfile(indent=2, token_map=TOKEN_MAP_FULL),
+    "compact": OutputProfile(indent=None, token_map=TOKEN_MAP_INDEX, compressions=("gz", "br")),
+}
+
+
+def render_tokenlist(tokenlist: Dict, profile: OutputProfile) -> bytes:
+    buffer = io.StringIO()
+    write_tokenlist(buffer, tokenlist, tokenlist.get("tokens", []), token_map=profile.token_map, indent=profile.indent)
+    return buffer.getvalue().encode("utf-8")
+
+
+def compress(data: bytes, extension: str) -> Optional[bytes]:
+    if extension == "gz":
+        # mtime=0 keeps the output byte-identical for identical input
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if extension == "br":
+        return brotli.compress(data, quality=11) if brotli else None
+    raise ValueError(f"Unknown compression: {extension}")
+
+
+def render_files(tokenlist: Dict, file_path: str, profile: OutputProfile) -> Dict[str, bytes]:
+    """Render a tokenlist with a profile into {path: content}, including any precompressed siblings."""
+    data = render_tokenlist(tokenlist, profile)
+    files = {file_path: data}
+    for extension in profile.compressions:
+        compressed = compress(data, extension)
+        if compressed is None:
+            raise RuntimeError(f".{extension} output requires brotli, install it with `poetry install --with images`")
+        files[f"{file_path}.{extension}"] = compressed
+    return files
+
+
+def measure_parse_time(data: bytes, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        json.loads(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def size_report(tokenlist: Dict) -> Dict[str, Dict[str, Optional[float]]]:
+    """Bytes on the wire (raw, gzip, brotli) and JSON parse time of a tokenlist for every output profile."""
+    report = {}
+    for name, profile in OUTPUT_PROFILES.items():
+        data = render_tokenlist(tokenlist, profile)
+        brotli_data = compress(data, "br")
+        report[name] = {
+            "bytes": len(data),
+            "gzip_bytes": len(compress(data, "gz")),
+            "brotli_bytes": len(brotli_data) if brotli_data is not None else None,
+            "parse_seconds": measure_parse_time(data),
+        }
+    return report
@@ -1,49 +1,264 @@
+import base64
+import hashlib
 import json
 import os
-from typing import Dict
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 import requests
-from github import Github, InputGitTreeElement
+from github import Auth, Github, GithubException, InputGitTreeElement
+from github.Consts import DEFAULT_BASE_URL
+from github.Repository import Repository
+from requests.adapters import HTTPAdapter
+from rich.console import Console
+from urllib3.util.retry import Retry
 
+from scripts.output import OUTPUT_PROFILES, OutputProfile, render_files
+from scripts.stream import CHUNK_SIZE, iter_tokenlist, read_tokenlist
 
-def load_gh_pages_tokenlist(repo_name: str, file_path: str) -> Dict:
-    gh_pages_url = f"https://{repo_name.split('/')[0]}.github.io/{repo_name.split('/')[1]}/{file_path}"
+console = Console()
+
+GH_PAGES_BRANCH = "gh-pages"
+MIRROR_DIR = os.path.join(".cache", "gh-pages")
+# (connect, read) seconds
+REQUEST_TIMEOUT = (5, 60)
+RETRY = Retry(
+    total=4,
+    backoff_factor=1,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=("GET", "HEAD"),
+    respect_retry_after_header=True,
+)
+
+_session: Optional[requests.Session] = None
+
+
+def get_session() -> requests.Session:
+    """Shared session, so every fetch in a run reuses pooled connections and the same retry policy."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=RETRY)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def get_gh_pages_url(repo_name: str, file_path: str) -> str:
+    return f"https://{repo_name.split('/')[0]}.github.io/{repo_name.split('/')[1]}/{file_path}"
+
+
+def get_mirror_path(file_path: str, mirror_dir: str = MIRROR_DIR) -> str:
+    return os.path.join(mirror_dir, file_path)
+
+
+def load_mirror_meta(mirror_path: str) -> Dict:
     try:
-        response = requests.get(gh_pages_url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException:
+        with open(f"{mirror_path}.meta.json", "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return {}
 
 
-def upload_to_github_pages(content: Dict, repo_name: str, file_path: str):
+def save_mirror_meta(mirror_path: str, meta: Dict) -> None:
+    with open(f"{mirror_path}.meta.json", "w") as f:
+        json.dump(meta, f)
+
+
+def fetch_published_tokenlist(
+    url: str, mirror_path: str, session: Optional[requests.Session] = None
+) -> Tuple[Optional[Dict], str]:
+    """
+    Revalidate the local mirror of a published tokenlist and return (tokenlist, status), where status is
+    "not-modified", "downloaded", "mirror" (request failed, mirror used) or "missing".
+
+    The mirror is sent as If-None-Match/If-Modified-Since, so an unchanged list costs a 304 and no body.
+    A new body is streamed to a temporary file, parsed, and only then moved over the mirror, so a
+    truncated or invalid download never replaces a good copy.
+    """
+    session = session or get_session()
+    meta = load_mirror_meta(mirror_path) if os.path.exists(mirror_path) else {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            if response.status_code == 304 and meta:
+                meta["checked_at"] = time.time()
+                save_mirror_meta(mirror_path, meta)
+                return read_mirror(mirror_path), "not-modified"
+            response.raise_for_status()
+
+            if os.path.dirname(mirror_path):
+                os.makedirs(os.path.dirname(mirror_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(mirror_path) or ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    # iter_content undoes any Content-Encoding
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                tokenlist = read_mirror(tmp_path)
+                os.replace(tmp_path, mirror_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            now = time.time()
+            save_mirror_meta(
+                mirror_path,
+                {
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched_at": now,
+                    "checked_at": now,
+                },
+            )
+            return tokenlist, "downloaded"
+    except (requests.exceptions.RequestException, ValueError, OSError) as e:
+        console.print(f"[yellow]Could not fetch {url}: {e}[/yellow]")
+
+    if os.path.exists(mirror_path):
+        try:
+            return read_mirror(mirror_path), "mirror"
+        except (ValueError, OSError) as e:
+            console.print(f"[red]Local mirror {mirror_path} is unreadable: {e}[/red]")
+    return None, "missing"
+
+
+def read_mirror(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return read_tokenlist(f)
+
+
+def load_gh_pages_tokenlist(repo_name: str, file_path: str, mirror_dir: str = MIRROR_DIR) -> Dict:
+    url = get_gh_pages_url(repo_name, file_path)
+    tokenlist, status = fetch_published_tokenlist(url, get_mirror_path(file_path, mirror_dir))
+    if status == "mirror":
+        console.print(
+            f"[yellow]Using the local mirror of {file_path}, the published list could not be fetched[/yellow]"
+        )
+    elif tokenlist is None:
+        console.print(f"[yellow]No published or mirrored {file_path} found, starting from an empty list[/yellow]")
+    return tokenlist or {}
+
+
+def git_blob_sha(data: bytes) -> str:
+    """The object id git assigns to a file's content, as listed in tree entries."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def get_github_repo(repo_name: str) -> Repository:
     github_token = os.environ.get("GITHUB_TOKEN")
     if not github_token:
         raise ValueError("GITHUB_TOKEN is not set in environment variables")
+    # GITHUB_API_URL is set by GitHub Actions and lets the publisher run against a local fake
+    g = Github(auth=Auth.Token(github_token), base_url=os.environ.get("GITHUB_API_URL", DEFAULT_BASE_URL))
+    return g.get_repo(repo_name, lazy=True)
+
+
+def read_published_timestamp(file_path: str, mirror_dir: str = MIRROR_DIR) -> Optional[str]:
+    """The timestamp of the last fetched copy of a published list, read from the mirror's header only."""
+    mirror_path = get_mirror_path(file_path, mirror_dir)
+    if not os.path.exists(mirror_path):
+        return None
+    try:
+        with open(mirror_path, "r", encoding="utf-8") as f:
+            for kind, value in iter_tokenlist(f):
+                if kind == "header" and "timestamp" in value:
+                    return value["timestamp"]
+                if kind == "token":
+                    return None
+    except (OSError, ValueError):
+        return None
+    return None
+
 
-    g = Github(github_token)
-    repo = g.get_repo(repo_name)
+@dataclass
+class PublishResult:
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    commit_sha: Optional[str] = None
+
+
+def publish_to_github_pages(
+    tokenlists: Dict[str, Dict],
+    repo_name: str,
+    profile: OutputProfile = OUTPUT_PROFILES["default"],
+    published_timestamps: Optional[Dict[str, Optional[str]]] = None,
+    repo: Optional[Repository] = None,
+) -> PublishResult:
+    """
+    Publish several tokenlists, keyed by file path, to gh-pages in a single commit.
+
+    Each list is first rendered with the timestamp of its published copy (from `published_timestamps`, or
+    else the local mirror) and compared by git blob id against the current gh-pages tree. Lists that only
+    differ by their timestamp are skipped, and nothing is committed when no list changed. Changed JSON
+    files are sent inline with the tree, so a publish costs the same few API calls however many lists
+    change, plus one blob per precompressed sibling, which the tree API only accepts as blobs.
+    """
+    repo = repo or get_github_repo(repo_name)
+    published_timestamps = published_timestamps or {}
 
-    # Get the gh-pages branch
     try:
-        branch = repo.get_branch("gh-pages")
-    except:  # noqa: E722
+        branch = repo.get_branch(GH_PAGES_BRANCH)
+    except GithubException as e:
+        if e.status != 404:
+            raise
         # If gh-pages branch doesn't exist, create it
-        sb = repo.get_branch(repo.default_branch)
-        repo.create_git_ref(ref="refs/heads/gh-pages", sha=sb.commit.sha)
-        branch = repo.get_branch("gh-pages")
+        default_branch = repo.get_branch(repo.default_branch)
+        repo.create_git_ref(ref=f"refs/heads/{GH_PAGES_BRANCH}", sha=default_branch.commit.sha)
+        branch = repo.get_branch(GH_PAGES_BRANCH)
+
+    head_sha = branch.commit.sha
+    base_tree = repo.get_git_tree(sha=head_sha, recursive=True)
+    published = {} if base_tree.raw_data.get("truncated") else {entry.path: entry.sha for entry in base_tree.tree}
 
-    # Create blob
-    blob = repo.create_git_blob(json.dumps(content, indent=2), "utf-8")
-    element = InputGitTreeElement(path=file_path, mode="100644", type="blob", sha=blob.sha)
+    result = PublishResult()
+    elements = []
+    for file_path, tokenlist in tokenlists.items():
+        timestamp = published_timestamps.get(file_path) or read_published_timestamp(file_path)
+        if timestamp is not None:
+            files = render_files({**tokenlist, "timestamp": timestamp}, file_path, profile)
+            if all(published.get(path) == git_blob_sha(data) for path, data in files.items()):
+                result.unchanged.append(file_path)
+                continue
+
+        result.changed.append(file_path)
+        for path, data in render_files(tokenlist, file_path, profile).items():
+            if path == file_path:
+                elements.append(
+                    InputGitTreeElement(path=path, mode="100644", type="blob", content=data.decode("utf-8"))
+                )
+            else:
+                blob = repo.create_git_blob(base64.b64encode(data).decode("ascii"), "base64")
+                elements.append(InputGitTreeElement(path=path, mode="100644", type="blob", sha=blob.sha))
+
+    if not elements:
+        return result
 
     # Create tree and commit
-    head_sha = branch.commit.sha
-    base_tree = repo.get_git_tree(sha=head_sha)
-    tree = repo.create_git_tree([element], base_tree)
-    parent = repo.get_git_commit(sha=head_sha)
-    commit = repo.create_git_commit("Update tokenlist", tree, [parent])
-    branch_ref = repo.get_git_ref("heads/gh-pages")
-    branch_ref.edit(sha=commit.sha)
-
-    return f"https://{repo.owner.login}.github.io/{repo.name}/{file_path}"
+    tree = repo.create_git_tree(elements, base_tree)
+    message = (
+        f"Update {', '.join(result.changed)}"
+        if len(result.changed) <= 3
+        else f"Update {len(result.changed)} tokenlists"
+    )
+    commit = repo.create_git_commit(message, tree, [branch.commit.commit])
+    repo.get_git_ref(f"heads/{GH_PAGES_BRANCH}").edit(sha=commit.sha)
+    result.commit_sha = commit.sha
+    return result
+
+
+def upload_to_github_pages(
+    content: Dict, repo_name: str, file_path: str, profile: OutputProfile = OUTPUT_PROFILES["default"]
+):
+    result = publish_to_github_pages({file_path: content}, repo_name, profile)
+    if result.unchanged:
+        console.print(f"[green]{file_path} is unchanged apart from its timestamp, nothing to publish[/green]")
+    return get_gh_pages_url(repo_name, file_path)
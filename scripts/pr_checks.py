@@ -0,0 +1,203 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from scripts.audit import AuditBudgets, AuditFinding, audit_image, check_budgets
+from scripts.batching import BatchSizeStore
+from scripts.cache import TokenCache
+from scripts.constants import NETWORK_REGISTRY, get_rpc_urls
+from scripts.formats import sniff_file
+from scripts.images import build_image_index
+from scripts.optimize import Image, parallel_map
+
+console = Console()
+
+# Pull requests may only touch these folders; workflow files (.yml) are reviewed by hand
+ALLOWED_PREFIXES = ("images/", "platforms/", "chains/")
+ICON_PATTERN = re.compile(r"^images/assets(-[a-z]+)*/[a-z0-9]+\.png$")
+ADDRESS_PATTERN = re.compile(r"^0x[0-9a-f]{40}$")
+
+
+@dataclass
+class PRCheckReport:
+    checked: int = 0
+    # Icons whose contract was looked up, per network
+    icons_by_network: Dict[str, int] = field(default_factory=dict)
+    # Networks whose contracts could not be looked up, as there is no RPC endpoint for them
+    unchecked_networks: List[str] = field(default_factory=list)
+    findings: List[AuditFinding] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.findings
+
+    def markdown(self) -> str:
+        """One line per finding, the format of the comment left on the pull request."""
+        return "".join(f"- Error with `{finding.file}`: {finding.problem}\n" for finding in self.findings)
+
+    def annotations(self) -> str:
+        return "".join(f"::error file={finding.file}::{finding.problem}\n" for finding in self.findings)
+
+
+def check_path(path: str) -> Optional[str]:
+    """The problem with a changed path itself, before looking at its content."""
+    if not path.startswith(ALLOWED_PREFIXES):
+        return (
+            "Only additions of token icons (in the /images folder) or platform logos (in the /platforms folder) "
+            "are permitted"
+        )
+    # Platform logos and chain icons have nothing automated
+    if not path.startswith("images/assets"):
+        return None
+    if not path.endswith(".png"):
+        return "The new icon must be a PNG file"
+    if not ICON_PATTERN.match(path):
+        return "The new icon's filename must be entirely lowercase"
+    folder, name = path.split("/")[1:]
+    if not ADDRESS_PATTERN.match(name[: -len(".png")]):
+        return "The new icon's filename must be the token's address (0x followed by 40 hexadecimal characters)"
+    if NETWORK_REGISTRY.name_for_folder(folder) is None:
+        return f"No network uses the `{folder}` folder, add it to NETWORKS in scripts/constants.py first"
+    return None
+
+
+def inspect_icon(path: str) -> Dict:
+    """Decoded properties of an icon, or only its format and size when Pillow is not installed."""
+    if Image is None:
+        return {"bytes": os.path.getsize(path), "format": sniff_file(path)}
+    return audit_image(path)
+
+
+def check_content(path: str, record: Dict, budgets: AuditBudgets) -> List[str]:
+    if "width" in record or "error" in record:
+        return [f"The icon {finding.problem}" for finding in check_budgets(path, record, budgets)]
+    # Without Pillow, dimensions are unknown
+    problems = []
+    if record["format"] not in budgets.formats:
+        problems.append(f"The icon is {record['format'] or 'an unknown format'}, not {' or '.join(budgets.formats)}")
+    if record["bytes"] > budgets.max_bytes:
+        problems.append(f"The icon is {record['bytes']} bytes, over the {budgets.max_bytes} byte budget")
+    return problems
+
+
+def check_contracts(
+    root: str,
+    addresses_by_network: Dict[str, List[str]],
+    token_cache: Optional[TokenCache] = None,
+    batch_sizes: Optional[BatchSizeStore] = None,
+    rpc_urls: Optional[Dict[str, List[str]]] = None,
+    max_workers: int = 4,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Read the metadata of every token through the generation pipeline (cache, batched multicall and
+    schema validation), all networks at once. Returns the problem of each failing address, per network.
+    """
+    if not addresses_by_network:
+        return {}
+    # web3 takes seconds to import, offline checks don't need it
+    from scripts.process import process_network
+
+    image_index = build_image_index(os.path.join(root, "images"))
+
+    def check(network: str) -> Dict[str, str]:
+        failed_tokens = {}
+        try:
+            process_network(
+                network,
+                {},
+                failed_tokens,
+                token_cache=token_cache,
+                addresses=addresses_by_network[network],
+                image_index=image_index,
+                batch_sizes=batch_sizes,
+                rpc_urls=(rpc_urls or {}).get(network),
+            )
+        except Exception as e:  # The whole network could not be checked
+            problem = f"Could not check the token contract on {network} ({type(e).__name__}: {e}), retry later"
+            return {address: problem for address in addresses_by_network[network]}
+        problem = f"No ERC-20 token on {network} at this address: name, symbol or decimals could not be read"
+        return {address.lower(): problem for address in failed_tokens.get(network, [])}
+
+    networks = list(addresses_by_network)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(networks)))) as executor:
+        return dict(zip(networks, executor.map(check, networks)))
+
+
+def check_changed_files(
+    paths: Iterable[str],
+    root: str = ".",
+    budgets: AuditBudgets = AuditBudgets(),
+    check_onchain: bool = True,
+    token_cache: Optional[TokenCache] = None,
+    batch_sizes: Optional[BatchSizeStore] = None,
+    rpc_urls: Optional[Dict[str, List[str]]] = None,
+    workers: int = 1,
+) -> PRCheckReport:
+    """
+    Check the files changed by a pull request: where they are and how they are named, then for every
+    new or modified icon its content (decoded in `workers` processes) and, unless check_onchain is
+    False, that its address is a token on the folder's network. Contract lookups run in threads while
+    icons are decoded.
+    """
+    paths = sorted({path.strip() for path in paths if path.strip() and not path.strip().endswith(".yml")})
+    report = PRCheckReport(checked=len(paths))
+    problems: Dict[str, List[str]] = {}
+
+    icons = []
+    for path in paths:
+        problem = check_path(path)
+        if problem:
+            problems[path] = [problem]
+        elif path.startswith("images/assets") and os.path.isfile(os.path.join(root, path)):
+            icons.append(path)
+
+    addresses_by_network: Dict[str, List[str]] = {}
+    for path in icons if check_onchain else []:
+        folder, name = path.split("/")[1:]
+        addresses_by_network.setdefault(NETWORK_REGISTRY.name_for_folder(folder), []).append(name[: -len(".png")])
+    # Without DRPC_KEY (a fork without the secret, a local run) only networks with their own urls can be checked
+    for network in list(addresses_by_network):
+        if not (rpc_urls or {}).get(network) and not get_rpc_urls(network, NETWORK_REGISTRY.get(network)):
+            del addresses_by_network[network]
+            report.unchecked_networks.append(network)
+    report.icons_by_network = {network: len(addresses) for network, addresses in addresses_by_network.items()}
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        contracts = executor.submit(check_contracts, root, addresses_by_network, token_cache, batch_sizes, rpc_urls)
+        records = parallel_map(inspect_icon, [(os.path.join(root, path),) for path in icons], workers)
+        failed_contracts = contracts.result()
+
+    for path, record in zip(icons, records):
+        problems.setdefault(path, []).extend(check_content(path, record, budgets))
+        folder, name = path.split("/")[1:]
+        problem = failed_contracts.get(NETWORK_REGISTRY.name_for_folder(folder), {}).get(name[: -len(".png")])
+        if problem:
+            problems[path].append(problem)
+
+    report.findings = [AuditFinding(path, problem) for path in paths for problem in problems.get(path, [])]
+    return report
+
+
+def display_report(report: PRCheckReport, limit: int = 50) -> None:
+    table = Table(title="Pull request checks")
+    table.add_column("Changed files", style="cyan")
+    table.add_column("Icons checked on chain", style="green")
+    table.add_column("Problems", style="red" if report.findings else "green")
+    on_chain = ", ".join(f"{network}: {count}" for network, count in sorted(report.icons_by_network.items()))
+    table.add_row(str(report.checked), on_chain or "-", str(len(report.findings)))
+    console.print(table)
+
+    if report.unchecked_networks:
+        console.print(
+            f"[yellow]Token contracts on {', '.join(report.unchecked_networks)} were not checked: "
+            "no RPC endpoint, set DRPC_KEY[/yellow]"
+        )
+    for finding in report.findings[:limit]:
+        console.print(f"[red]{finding.file}: {finding.problem}[/red]")
+    if len(report.findings) > limit:
+        console.print(f"[yellow]... and {len(report.findings) - limit} more problems[/yellow]")
@@ -6,21 +6,25 @@ from typing import Dict, List, Optional, Tuple
 from rich.console import Console
 from web3 import Web3
 
-from scripts.constants import DRPC_KEY, DRPC_URL, NATIVE_TOKEN_ADDRESS, NETWORKS, TOKENLIST_LOGO_URI
-from scripts.models import validate_token, validate_tokenlist
-from scripts.utils import get_logo_uri, get_token_info_batch
+from scripts.batching import BatchSizeStore
+from scripts.cache import TokenCache, ValidationCache
+from scripts.constants import NATIVE_TOKEN_ADDRESS, NETWORK_REGISTRY, TOKENLIST_LOGO_URI, get_rpc_urls
+from scripts.images import ImageIndex, build_image_index
+from scripts.models import check_tokenlist, validate_tokens
+from scripts.rpc import EndpointPool
+from scripts.telemetry import traced
+from scripts.utils import TokenIndex, build_token_index, get_logo_uri, get_token_info_batch
 
 console = Console()
 
 PINATA_TOKEN = os.environ.get("PINATA_TOKEN")
 
+# Seconds before a synchronous web3 request gives up
+RPC_TIMEOUT = 30
 
-def process_token(
-    info: Dict, chain_id: int, network: str, existing_tokens: List[Dict], all_failed_tokens: Dict[str, List[str]]
-) -> Optional[Dict]:
-    existing_token = next(
-        (t for t in existing_tokens if t["address"] == info["address"] and t["chainId"] == chain_id), {}
-    )
+
+def process_token(info: Dict, chain_id: int, network: str, token_index: TokenIndex) -> Dict:
+    existing_token = token_index.get((chain_id, info["address"].lower()), {})
 
     logo_uri = get_logo_uri(network, info["address"])
 
@@ -33,62 +37,94 @@ def process_token(
         "logoURI": logo_uri,
     }
 
-    if not validate_token(token):
-        all_failed_tokens.setdefault(network, []).append(info["address"])
-        return None
-
     return token
 
 
 def process_network(
-    network_name: str, existing_tokenlist: Dict, all_failed_tokens: Dict[str, List[str]]
+    network_name: str,
+    existing_tokenlist: Dict,
+    all_failed_tokens: Dict[str, List[str]],
+    token_index: Optional[TokenIndex] = None,
+    token_cache: Optional[TokenCache] = None,
+    addresses: Optional[List[str]] = None,
+    image_index: Optional[ImageIndex] = None,
+    batch_sizes: Optional[BatchSizeStore] = None,
+    rpc_urls: Optional[List[str]] = None,
 ) -> Tuple[List[Dict], List[Dict]]:
-    
-    existing_tokens = existing_tokenlist.get("tokens", [])
-    network_info = NETWORKS.get(network_name)
+    if token_index is None:
+        token_index = build_token_index(existing_tokenlist.get("tokens", []))
+
+    network_info = NETWORK_REGISTRY.get(network_name)
     if not network_info:
         console.print(f"[red]Network information not found for {network_name}[/red]")
         return [], []
 
-    network_path = os.path.join("images", network_info.folder_name)
-    if not os.path.isdir(network_path):
+    if image_index is None:
+        image_index = build_image_index()
+
+    folder_index = image_index.for_network(network_name)
+    if folder_index is None:
+        network_path = os.path.join(image_index.images_dir, network_info.folder_name)
         console.print(f"[yellow]Network directory not found: {network_path}[/yellow]")
         return [], []
 
     console.print(f"[blue]Processing network: {network_name}[/blue]")
 
-    if network_info.rpc_url:
-        rpc_url = network_info.rpc_url
-    else:
-        rpc_url = DRPC_URL % (network_name, DRPC_KEY)
+    # One pool per chain and run, so every request learns from the latencies and errors seen before it
+    rpc_urls = rpc_urls or get_rpc_urls(network_name, network_info)
+    if not rpc_urls:
+        raise RuntimeError(f"No RPC endpoint for {network_name}, set DRPC_KEY")
+    endpoint_pool = EndpointPool(rpc_urls)
+    w3 = Web3(Web3.HTTPProvider(endpoint_pool.endpoints[0].url, request_kwargs={"timeout": RPC_TIMEOUT}))
 
-    w3 = Web3(Web3.HTTPProvider(rpc_url))
-
-    addresses = [
-        image[:-4]
-        for image in os.listdir(network_path)
-        if image.endswith(".png") and image[:-4].lower() != NATIVE_TOKEN_ADDRESS.lower()
-    ]
-    token_info_batch, failed_tokens, skipped_tokens = get_token_info_batch(w3, addresses, existing_tokens)
+    if addresses is None:
+        addresses = [image.address for image in folder_index.files.values()]
+    addresses = [address for address in addresses if address.lower() != NATIVE_TOKEN_ADDRESS.lower()]
+    chain_id = network_info.chain_id
+    token_info_batch, failed_tokens, skipped_tokens = get_token_info_batch(
+        w3,
+        addresses,
+        token_index,
+        network_info,
+        token_cache,
+        endpoint_pool,
+        batch_sizes.sizer(chain_id) if batch_sizes else None,
+    )
+    if len(endpoint_pool) > 1:
+        for line in endpoint_pool.summary():
+            console.print(f"[cyan]{network_name} RPC {line}[/cyan]")
 
     if failed_tokens:
         all_failed_tokens[network_name] = failed_tokens
         console.print(f"[yellow]Failed to fetch data for {len(failed_tokens)} tokens on {network_name}[/yellow]")
 
-    chain_id = network_info.chain_id
     process_token_partial = partial(
         process_token,
         chain_id=chain_id,
         network=network_name,
-        existing_tokens=existing_tokens,
-        all_failed_tokens=all_failed_tokens,
+        token_index=token_index,
     )
 
-    processed_tokens = list(filter(None, map(process_token_partial, token_info_batch)))
+    processed_tokens = list(map(process_token_partial, token_info_batch))
+
+    # Validate the whole network in one pass and drop the tokens that failed
+    validation_errors, _ = validate_tokens(processed_tokens)
+    if validation_errors:
+        invalid = {error.index for error in validation_errors}
+        all_failed_tokens.setdefault(network_name, []).extend(
+            processed_tokens[error.index]["address"] for error in validation_errors
+        )
+        for error in validation_errors[:10]:
+            console.print(f"[yellow]Token validation failed: {error}[/yellow]")
+        processed_tokens = [token for index, token in enumerate(processed_tokens) if index not in invalid]
+
     return processed_tokens, skipped_tokens
 
 
-def update_tokenlist(new_tokens: List[Dict], existing_tokenlist: Dict) -> Dict:
+@traced("update_tokenlist")
+def update_tokenlist(
+    new_tokens: List[Dict], existing_tokenlist: Dict, validation_cache: Optional[ValidationCache] = None
+) -> Dict:
     current_timestamp = datetime.now(timezone.utc).isoformat()
 
     # Merge new tokens with existing tokens
@@ -113,7 +149,10 @@ def update_tokenlist(new_tokens: List[Dict], existing_tokenlist: Dict) -> Dict:
         "version": existing_tokenlist.get("version", {"major": 1, "minor": 0, "patch": 0}),
     }
 
-    if not validate_tokenlist(updated_tokenlist):
+    report = check_tokenlist(updated_tokenlist, validation_cache)
+    if not report.ok:
         console.print("[red]Token list validation failed[/red]")
+        for message in report.messages():
+            console.print(f"[red]{message}[/red]")
 
     return updated_tokenlist
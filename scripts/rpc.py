@@ -0,0 +1,447 @@
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
+
+import aiohttp
+
+from scripts.telemetry import count
+
+BlockIdentifier = Union[int, str]
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# HTTP statuses worth retrying on another endpoint, anything else is a problem with the request itself
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+# How nodes word hitting their eth_call gas or response size caps
+CAPACITY_ERRORS = (
+    "out of gas",
+    "gas required exceeds",
+    "exceeds block gas limit",
+    "response size",
+    "response too large",
+    "payload too large",
+    "request entity too large",
+)
+# Blocks between the pinned block and the lowest head of the endpoints, for nodes behind a load
+# balancer that trail the one that answered
+PINNED_BLOCK_DEPTH = 3
+# Endpoints further behind the highest head are not waited for when pinning a block
+MAX_HEAD_LAG = 64
+
+
+class RPCError(Exception):
+    def __init__(self, message: str, code: Optional[int] = None, data: Any = None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+class ExecutionReverted(RPCError):
+    """Raised when an eth_call reverts, the async counterpart of web3's ContractLogicError."""
+
+
+class EndpointError(RPCError):
+    """
+    An error the node answered instead of a result that another node may not give: rate limits
+    (-32005), a block it has not seen yet ("header not found") or state it pruned ("missing trie node").
+    """
+
+
+def to_block_param(block_identifier: BlockIdentifier) -> str:
+    if isinstance(block_identifier, int):
+        return hex(block_identifier)
+    return block_identifier
+
+
+def encode_hex(data: bytes) -> str:
+    return "0x" + bytes(data).hex()
+
+
+def decode_hex(data: str) -> bytes:
+    return bytes.fromhex(data[2:] if data.startswith("0x") else data)
+
+
+def is_capacity_error(error: BaseException) -> bool:
+    """Whether a request failed because it was too large for the node, so a smaller one may succeed."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status == 413
+    if isinstance(error, RPCError) and not isinstance(error, ExecutionReverted):
+        message = str(error).lower()
+        return any(pattern in message for pattern in CAPACITY_ERRORS)
+    return False
+
+
+def parse_rpc_error(error: Dict) -> RPCError:
+    message = error.get("message", "")
+    code = error.get("code")
+    data = error.get("data")
+    # Nodes disagree on how they report reverts: geth uses code 3, others -32000/-32015 with a message
+    if code == 3 or "revert" in message.lower():
+        return ExecutionReverted(message, code, data)
+    return RPCError(message, code, data)
+
+
+def find_endpoint_error(response: Any) -> Optional[EndpointError]:
+    """
+    The first error in a JSON-RPC response, single or batch, that is neither a revert nor a capacity
+    error. Nodes report those in an HTTP 200, so they are the endpoint's failure rather than the call's.
+    """
+    for reply in response if isinstance(response, list) else [response]:
+        if not isinstance(reply, dict) or "error" not in reply:
+            continue
+        error = parse_rpc_error(reply["error"])
+        if not isinstance(error, ExecutionReverted) and not is_capacity_error(error):
+            return EndpointError(str(error), error.code, error.data)
+    return None
+
+
+class EndpointHealth:
+    """Latency and error history of one endpoint, and the state of its circuit breaker."""
+
+    def __init__(self, url: str, samples: int = 100):
+        self.url = url
+        self.latencies: Deque[float] = deque(maxlen=samples)
+        self.latency: Optional[float] = None  # EWMA, in seconds
+        self.error_rate = 0.0  # EWMA of failed requests
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+
+    @property
+    def name(self) -> str:
+        """The endpoint's host, safe to print: dRPC urls carry the API key in their query string."""
+        return urlparse(self.url).netloc or self.url
+
+
+class EndpointPool:
+    """
+    The RPC endpoints of one chain, ranked by latency and error rate.
+
+    Requests go to the endpoint with the lowest score, its latency EWMA inflated by its error rate;
+    endpoints with no history score zero, so each is tried early. After `failure_threshold` consecutive
+    failures an endpoint's circuit opens and it is skipped for `cooldown` seconds, doubling on every
+    trip up to `max_cooldown`. Once the cooldown expires one request probes it again. When every
+    circuit is open the endpoint that reopens first is used anyway, so requests never stall.
+
+    Pools only hold plain numbers, so one pool can outlive the event loops and clients using it.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        failure_threshold: int = 3,
+        cooldown: float = 15,
+        max_cooldown: float = 300,
+        hedge_percentile: float = 0.9,
+        hedge_delay: float = 5.0,
+        min_hedge_delay: float = 0.05,
+        min_samples: int = 10,
+        alpha: float = 0.3,
+    ):
+        self.endpoints = [EndpointHealth(url) for url in dict.fromkeys(urls)]
+        if not self.endpoints:
+            raise ValueError("An endpoint pool needs at least one url")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.alpha = alpha
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def score(self, endpoint: EndpointHealth) -> float:
+        return (endpoint.latency or 0.0) * (1 + 10 * endpoint.error_rate)
+
+    def choose(self, exclude: Iterable[EndpointHealth] = (), open_circuits: bool = True) -> Optional[EndpointHealth]:
+        """
+        The best endpoint not in `exclude` whose circuit is closed (or due for a probe). With open_circuits,
+        the endpoint that reopens first is returned when there is no such endpoint.
+        """
+        now = time.monotonic()
+        excluded = set(exclude)
+        candidates = [endpoint for endpoint in self.endpoints if endpoint not in excluded]
+        available = [endpoint for endpoint in candidates if endpoint.open_until <= now]
+        if available:
+            # min keeps the configured order between equal scores
+            return min(available, key=self.score)
+        if not open_circuits:
+            return None
+        return min(candidates, key=lambda endpoint: endpoint.open_until, default=None)
+
+    def hedge_delay(self, endpoint: EndpointHealth) -> float:
+        """How long to wait on `endpoint` before sending a duplicate request elsewhere."""
+        if len(endpoint.latencies) < self.min_samples:
+            return self.default_hedge_delay
+        latencies = sorted(endpoint.latencies)
+        index = min(len(latencies) - 1, int(self.hedge_percentile * len(latencies)))
+        return max(self.min_hedge_delay, latencies[index])
+
+    def record_latency(self, endpoint: EndpointHealth, latency: float) -> None:
+        endpoint.latencies.append(latency)
+        if endpoint.latency is None:
+            endpoint.latency = latency
+        else:
+            endpoint.latency += self.alpha * (latency - endpoint.latency)
+
+    def record_cancelled(self, endpoint: EndpointHealth, elapsed: float) -> None:
+        """
+        A request given up on after `elapsed` seconds, when a hedge won the race. It would have taken at
+        least that long, so this can only raise the latency EWMA and is kept out of the hedge percentiles.
+        """
+        if endpoint.latency is not None and elapsed > endpoint.latency:
+            endpoint.latency += self.alpha * (elapsed - endpoint.latency)
+
+    def record_success(self, endpoint: EndpointHealth, latency: float) -> None:
+        self.record_latency(endpoint, latency)
+        endpoint.requests += 1
+        endpoint.error_rate *= 1 - self.alpha
+        endpoint.consecutive_failures = 0
+        endpoint.trips = 0
+        endpoint.open_until = 0.0
+
+    def record_failure(self, endpoint: EndpointHealth) -> None:
+        endpoint.requests += 1
+        endpoint.failures += 1
+        endpoint.error_rate += self.alpha * (1 - endpoint.error_rate)
+        endpoint.consecutive_failures += 1
+        # A failed probe reopens the circuit straight away
+        if endpoint.consecutive_failures >= self.failure_threshold or endpoint.trips:
+            endpoint.trips += 1
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** (endpoint.trips - 1))
+            endpoint.open_until = time.monotonic() + cooldown
+
+    def summary(self) -> List[str]:
+        now = time.monotonic()
+        lines = []
+        for endpoint in self.endpoints:
+            latency = f"{endpoint.latency * 1000:.0f} ms" if endpoint.latency is not None else "unused"
+            state = " (circuit open)" if endpoint.open_until > now else ""
+            lines.append(f"{endpoint.name}: {endpoint.requests} requests, {endpoint.failures} failed, {latency}{state}")
+        return lines
+
+
+class AsyncRPCClient:
+    """
+    Minimal JSON-RPC client that keeps one pooled aiohttp session for all endpoints of a chain.
+
+    At most `max_in_flight` requests are outstanding at once, which is the concurrency limit applied
+    to a single chain. Several calls can also be packed into one POST with `batch_request`.
+
+    `rpc_url` is one url, several, or an EndpointPool shared with other clients of the same chain.
+    Each request goes to the pool's best endpoint; when it has not answered within the endpoint's
+    hedge delay (a latency percentile), a duplicate is sent to the next best healthy one (or again to
+    the same one) and the first answer wins. Transport errors, retryable HTTP statuses and JSON-RPC
+    errors that are the endpoint's (EndpointError) are retried `retries` times on other endpoints,
+    after a random backoff of up to `backoff * 2 ** attempt` seconds. Requests are reads, so sending
+    one twice is harmless.
+    """
+
+    def __init__(
+        self,
+        rpc_url: Union[str, Sequence[str], EndpointPool],
+        max_in_flight: int = 4,
+        timeout: float = 30,
+        retries: int = 3,
+        backoff: float = 0.5,
+        hedge: bool = True,
+    ):
+        if isinstance(rpc_url, EndpointPool):
+            self.pool = rpc_url
+        else:
+            self.pool = EndpointPool([rpc_url] if isinstance(rpc_url, str) else rpc_url)
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self._ids = itertools.count(1)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def rpc_url(self) -> str:
+        return self.pool.endpoints[0].url
+
+    async def __aenter__(self) -> "AsyncRPCClient":
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        # Hedged duplicates go over the semaphore, hence the per-host rather than total connection limit
+        self._session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=0, limit_per_host=self.max_in_flight),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._session.close()
+        self._session = None
+
+    async def _send(self, endpoint: EndpointHealth, payload: Union[Dict, List[Dict]]) -> Any:
+        body = json.dumps(payload).encode()
+        count("rpc_requests")
+        count("rpc_request_bytes", len(body))
+        start = time.monotonic()
+        try:
+            async with self._session.post(endpoint.url, data=body, headers=JSON_HEADERS) as response:
+                response.raise_for_status()
+                content = await response.read()
+            count("rpc_response_bytes", len(content))
+            result = json.loads(content)
+        except asyncio.CancelledError:
+            # Lost a hedge race: the elapsed time is only a lower bound on how slow this endpoint is
+            self.pool.record_cancelled(endpoint, time.monotonic() - start)
+            raise
+        except aiohttp.ClientResponseError as e:
+            count("rpc_errors")
+            if e.status in RETRY_STATUSES:
+                self.pool.record_failure(endpoint)
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            count("rpc_errors")
+            self.pool.record_failure(endpoint)
+            raise
+        error = find_endpoint_error(result)
+        if error is not None:
+            count("rpc_errors")
+            self.pool.record_failure(endpoint)
+            raise error
+        self.pool.record_success(endpoint, time.monotonic() - start)
+        return result
+
+    async def _hedged_send(self, payload: Union[Dict, List[Dict]], exclude: List[EndpointHealth]) -> Any:
+        """Send to the best endpoint, duplicating to the next best if it is slower than its hedge delay."""
+        primary = self.pool.choose(exclude) or self.pool.choose()
+        tasks = {asyncio.ensure_future(self._send(primary, payload)): primary}
+        delay = self.pool.hedge_delay(primary) if self.hedge else None
+        error: Optional[BaseException] = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    delay = None
+                    # Without another healthy endpoint, duplicate to the same one: it is usually a load
+                    # balancer and the duplicate likely lands on another node
+                    backup = self.pool.choose([*exclude, *tasks.values()], open_circuits=False) or primary
+                    count("rpc_hedges")
+                    tasks[asyncio.ensure_future(self._send(backup, payload))] = backup
+                    continue
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    exclude.append(endpoint)
+                    error = task.exception()
+                # The only request failed before the hedge was due, leave the next try to the retry loop
+                if delay is not None:
+                    break
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _post(self, payload: Union[Dict, List[Dict]]) -> Any:
+        async with self._semaphore:
+            failed: List[EndpointHealth] = []
+            for attempt in range(self.retries + 1):
+                try:
+                    return await self._hedged_send(payload, failed)
+                except aiohttp.ClientResponseError as e:
+                    if e.status not in RETRY_STATUSES or attempt == self.retries:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, EndpointError):
+                    if attempt == self.retries:
+                        raise
+                count("rpc_retries")
+                # Every endpoint failed this request once, give them all another chance
+                if len(failed) >= len(self.pool):
+                    failed.clear()
+                await asyncio.sleep(random.uniform(0, self.backoff * 2**attempt))
+
+    def _payload(self, method: str, params: Sequence) -> Dict:
+        return {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": list(params)}
+
+    async def request(self, method: str, params: Sequence) -> Any:
+        response = await self._post(self._payload(method, params))
+        if "error" in response:
+            raise parse_rpc_error(response["error"])
+        return response["result"]
+
+    async def batch_request(self, requests: Sequence[Tuple[str, Sequence]]) -> List[Union[Any, RPCError]]:
+        """
+        Send several requests in a single POST. Results are returned in request order;
+        failed entries are returned as RPCError instances instead of being raised.
+        """
+        payload = [self._payload(method, params) for method, params in requests]
+        response = await self._post(payload)
+        if isinstance(response, dict):
+            # Some endpoints answer a whole batch with a single error object
+            error = parse_rpc_error(response.get("error", {"message": "Invalid batch response"}))
+            return [error] * len(payload)
+
+        by_id = {item.get("id"): item for item in response}
+        results = []
+        for item in payload:
+            reply = by_id.get(item["id"])
+            if reply is None:
+                results.append(RPCError(f"Missing response for request {item['id']}"))
+            elif "error" in reply:
+                results.append(parse_rpc_error(reply["error"]))
+            else:
+                results.append(reply["result"])
+        return results
+
+    async def eth_call(self, to: str, data: bytes, block_identifier: BlockIdentifier = "latest") -> bytes:
+        count("eth_calls")
+        result = await self.request(
+            "eth_call", [{"to": to, "data": encode_hex(data)}, to_block_param(block_identifier)]
+        )
+        return decode_hex(result)
+
+    async def eth_call_batch(
+        self, calls: Sequence[Tuple[str, bytes]], block_identifier: BlockIdentifier = "latest"
+    ) -> List[Union[bytes, RPCError]]:
+        block = to_block_param(block_identifier)
+        count("eth_calls", len(calls))
+        results = await self.batch_request(
+            [("eth_call", [{"to": to, "data": encode_hex(data)}, block]) for to, data in calls]
+        )
+        return [result if isinstance(result, RPCError) else decode_hex(result) for result in results]
+
+
+async def get_block_number(rpc_url: Union[str, Sequence[str], EndpointPool], depth: int = PINNED_BLOCK_DEPTH) -> int:
+    """
+    A recent block every endpoint has, to pin a run's calls to: the lowest head among the endpoints
+    within MAX_HEAD_LAG blocks of the highest one, `depth` blocks back. Endpoints with an open circuit
+    are not asked, and those that fail or lag further answer for the block with an error that moves
+    the request to another endpoint.
+    """
+    async with AsyncRPCClient(rpc_url, hedge=False) as client:
+        now = time.monotonic()
+        endpoints = [endpoint for endpoint in client.pool.endpoints if endpoint.open_until <= now]
+        payload = client._payload("eth_blockNumber", [])
+        responses = await asyncio.gather(
+            *(client._send(endpoint, payload) for endpoint in endpoints), return_exceptions=True
+        )
+        heads = []
+        for response in responses:
+            if isinstance(response, BaseException):
+                continue
+            if "error" in response:
+                # Not the endpoint's fault (those raise in _send), so no other endpoint will do better
+                raise parse_rpc_error(response["error"])
+            heads.append(int(response["result"], 16))
+        if not heads:
+            # Every endpoint failed once, go through the usual retries
+            heads = [int(await client.request("eth_blockNumber", []), 16)]
+    in_sync = [head for head in heads if head >= max(heads) - MAX_HEAD_LAG]
+    return max(0, min(in_sync) - depth)
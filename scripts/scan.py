@@ -1,12 +1,13 @@
 import os
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from rich.console import Console
 from rich.table import Table
 from rich.theme import Theme
 
-from scripts.constants import NETWORKS
-from scripts.utils import get_network_name
+from scripts.constants import NETWORK_REGISTRY, NETWORKS
+from scripts.images import FolderIndex, ImageIndex, build_image_index
+from scripts.stream import token_key
 
 # Create a custom theme for our logs
 custom_theme = Theme(
@@ -23,78 +24,85 @@ console = Console(theme=custom_theme)
 
 
 def get_network_from_chain_id(chain_id: int) -> str:
-    for network, info in NETWORKS.items():
-        if info.chain_id == chain_id:
-            return network
-    return f"unknown_{chain_id}"
+    return NETWORK_REGISTRY.name_for_chain_id(chain_id) or f"unknown_{chain_id}"
 
 
-def scan_tokenlist_and_images(input_tokenlist: Dict) -> Tuple[List[str], Dict[str, List[str]], Dict[str, List[str]]]:
-    token_map = input_tokenlist.get("tokenMap", {})
+def scan_tokenlist_and_images(
+    input_tokenlist: Dict, image_index: Optional[ImageIndex] = None
+) -> Tuple[List[str], Dict[str, List[str]], Dict[str, List[str]]]:
+    if image_index is None:
+        image_index = build_image_index()
+
+    token_map = get_existing_tokens(input_tokenlist)
     networks = set()
     tokens_in_list = {}
     missing_tokens = {}
+    unknown_chains = {}
 
     # Process the input tokenlist
     for key, token in token_map.items():
         chain_id, address = key.split("_")
-        network = get_network_from_chain_id(int(chain_id))
-        network = get_network_name(NETWORKS[network].folder_name)
+        network = NETWORK_REGISTRY.name_for_chain_id(int(chain_id))
+        if network is None:
+            # No images folder to compare with
+            unknown_chains[chain_id] = unknown_chains.get(chain_id, 0) + 1
+            continue
         networks.add(network)
         tokens_in_list.setdefault(network, []).append(address.lower())
 
+    for chain_id, token_count in unknown_chains.items():
+        console.print(f"[yellow]Skipping {token_count} tokens of unknown chain ID {chain_id}[/yellow]")
+
     # Check for missing tokens
     for network in networks:
         missing_tokens[network] = []
-        network_info = NETWORKS[network]
-        network_path = os.path.join("images", network_info.folder_name)
+        folder_index = image_index.for_network(network)
 
-        if os.path.exists(network_path):
+        if folder_index is not None:
             # Check for tokens in list but missing images
             for token_address in tokens_in_list[network]:
-                image_path = os.path.join(network_path, f"{token_address}.png")
-                if not os.path.exists(image_path):
+                if not folder_index.has_image(token_address):
                     missing_tokens[network].append(token_address)
 
             # Check for images not in tokenlist
-            for file in os.listdir(network_path):
-                if file.endswith(".png"):
-                    token_address = os.path.splitext(file)[0].lower()
-                    if token_address not in tokens_in_list[network]:
-                        missing_tokens[network].append(f"{token_address}")
+            listed = set(tokens_in_list[network])
+            for token_address in folder_index.files:
+                if token_address not in listed:
+                    missing_tokens[network].append(f"{token_address}")
         else:
+            network_path = os.path.join(image_index.images_dir, NETWORKS[network].folder_name)
             console.print(f"[yellow]Network directory not found: {network_path}[/yellow]")
 
     return list(networks), tokens_in_list, missing_tokens
 
 
-def scan_images_folder(input_tokenlist: Dict) -> Tuple[List[str], Dict[str, List[str]], Dict[str, List[str]]]:
+def scan_images_folder(
+    input_tokenlist: Dict, image_index: Optional[ImageIndex] = None
+) -> Tuple[List[str], Dict[str, List[str]], Dict[str, List[str]]]:
     networks = []
     tokens_in_folder = {}
     tokens_to_add = {}
 
-    images_dir = "images"
-    if not os.path.exists(images_dir):
-        console.print(f"[error]Images directory not found: {images_dir}[/error]")
+    if image_index is None:
+        image_index = build_image_index()
+
+    if not os.path.exists(image_index.images_dir):
+        console.print(f"[error]Images directory not found: {image_index.images_dir}[/error]")
         return networks, tokens_in_folder, tokens_to_add
 
     existing_tokens = get_existing_tokens(input_tokenlist)
 
-    for item in os.listdir(images_dir):
-        item_path = os.path.join(images_dir, item)
-        if os.path.isdir(item_path):
-            try:
-                network, network_tokens, network_tokens_to_add = process_network_folder(
-                    item, item_path, existing_tokens
-                )
-                networks.append(network)
-                tokens_in_folder[network] = network_tokens
-                tokens_to_add[network] = network_tokens_to_add
+    for item, folder_index in image_index.folders.items():
+        try:
+            network, network_tokens, network_tokens_to_add = process_network_folder(folder_index, existing_tokens)
+            networks.append(network)
+            tokens_in_folder[network] = network_tokens
+            tokens_to_add[network] = network_tokens_to_add
 
-                print_network_summary(network, network_tokens, network_tokens_to_add)
+            print_network_summary(network, network_tokens, network_tokens_to_add)
 
-            except ValueError as e:
-                console.print(f"[yellow]Skipping unknown network folder: {item}. Error: {str(e)}[/yellow]")
+        except ValueError as e:
+            console.print(f"[yellow]Skipping unknown network folder: {item}. Error: {str(e)}[/yellow]")
 
     return networks, tokens_in_folder, tokens_to_add
 
@@ -118,25 +126,22 @@ def display_summary(networks: List[str], tokens_in_folder: Dict[str, List[str]],
 
 
 def get_existing_tokens(tokenlist: Dict) -> Dict:
-    return tokenlist.get("tokenMap", {})
-
+    if "tokenMap" in tokenlist:
+        return tokenlist["tokenMap"]
+    # Lists read with scripts.stream.load_tokenlist come without a tokenMap
+    return {token_key(token): token for token in tokenlist.get("tokens", [])}
 
-def process_network_folder(item: str, item_path: str, existing_tokens: Dict) -> Tuple[str, List[str], List[str]]:
-    network = get_network_name(item)
-    tokens_in_folder = []
-    tokens_to_add = []
 
-    network_info = NETWORKS[network]
-    chain_id = network_info.chain_id
+def process_network_folder(folder_index: FolderIndex, existing_tokens: Dict) -> Tuple[str, List[str], List[str]]:
+    if folder_index.network is None:
+        raise ValueError(f"No network found for folder name: {folder_index.folder}")
 
-    for file in os.listdir(item_path):
-        if file.endswith(".png"):
-            token_address = file[:-4].lower()  # Remove .png and convert to lowercase
-            tokens_in_folder.append(token_address)
+    network = folder_index.network
+    chain_id = NETWORKS[network].chain_id
+    tokens_in_folder = list(folder_index.files)
 
-            # Check if token is not in the existing tokenlist
-            if f"{chain_id}_{token_address}" not in existing_tokens:
-                tokens_to_add.append(token_address)
+    # Tokens not in the existing tokenlist
+    tokens_to_add = [address for address in tokens_in_folder if f"{chain_id}_{address}" not in existing_tokens]
 
     return network, tokens_in_folder, tokens_to_add
 
@@ -0,0 +1,250 @@
+import json
+import tempfile
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 1 << 16
+
+# tokenMap layouts: a full copy of each token, the token's position in `tokens`, or no tokenMap at all
+TOKEN_MAP_FULL = "full"
+TOKEN_MAP_INDEX = "index"
+TOKEN_MAP_NONE = "none"
+
+
+def token_key(token: Dict) -> str:
+    return f"{token['chainId']}_{token['address'].lower()}"
+
+
+def merge_tokens(existing_tokens: Iterable[Dict], new_tokens: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Lazily merge tokens like update_tokenlist: `new_tokens` override `existing_tokens` in place and tokens
+    that are new are appended. Duplicates within `existing_tokens` keep their first occurrence. Only the
+    keys are held in memory besides `new_tokens`.
+    """
+    new_by_key = {token_key(token): token for token in new_tokens}
+    seen = set()
+    for token in existing_tokens:
+        key = token_key(token)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield new_by_key.pop(key, token)
+    for key, token in new_by_key.items():
+        if key not in seen:
+            yield token
+
+
+def _indent(text: str, prefix: str) -> str:
+    return text.replace("\n", "\n" + prefix)
+
+
+def write_tokenlist(
+    file: IO[str], header: Dict, tokens: Iterable[Dict], token_map: str = TOKEN_MAP_FULL, indent: Optional[int] = 2
+) -> int:
+    """
+    Write a tokenlist one token at a time. `tokens` can be a generator and must not contain duplicates.
+
+    The tokenMap entries are spooled to a temporary file while the tokens are written and copied over
+    afterwards, which keeps memory flat regardless of list size. Keys keep the order of `header`, with
+    the tokens (followed by the tokenMap) where `header` has its "tokens", or last, so the output is
+    laid out as json.dump would lay out the whole list. As with json.dump, indent=None is minified and
+    indent=0 puts every value on its own line without indentation. Returns the number of tokens written.
+    """
+    if token_map not in (TOKEN_MAP_FULL, TOKEN_MAP_INDEX, TOKEN_MAP_NONE):
+        raise ValueError(f"Unknown tokenMap layout: {token_map}")
+    if indent is not None and indent < 0:
+        raise ValueError(f"indent must be None or a non-negative number of spaces, not {indent}")
+
+    pretty = indent is not None
+    pad = " " * indent if pretty else ""
+    newline = "\n" if pretty else ""
+    colon = ": " if pretty else ":"
+    dump_kwargs = {"indent": indent} if pretty else {"separators": (",", ":")}
+
+    def dumps(value: Any, depth: int) -> str:
+        return _indent(json.dumps(value, **dump_kwargs), pad * depth)
+
+    keys = [key for key in header if key != "tokenMap"]
+    if "tokens" not in keys:
+        keys.append("tokens")
+    position = keys.index("tokens")
+
+    def write_header(header_keys: List[str], first: bool) -> None:
+        for key in header_keys:
+            file.write(f"{'' if first else ','}{newline}{pad}{json.dumps(key)}{colon}{dumps(header[key], 1)}")
+            first = False
+
+    file.write("{")
+    write_header(keys[:position], first=True)
+
+    count = 0
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        file.write(f"{',' if position else ''}{newline}{pad}\"tokens\"{colon}[")
+        for token in tokens:
+            separator = "," if count else ""
+            token_json = dumps(token, 2)
+            file.write(f"{separator}{newline}{pad * 2}{token_json}")
+            if token_map != TOKEN_MAP_NONE:
+                value = token_json if token_map == TOKEN_MAP_FULL else count
+                spool.write(f"{separator}{newline}{pad * 2}{json.dumps(token_key(token))}{colon}{value}")
+            count += 1
+        file.write(f"{newline}{pad}]" if count else "]")
+
+        if token_map != TOKEN_MAP_NONE:
+            file.write(f',{newline}{pad}"tokenMap"{colon}{{')
+            spool.seek(0)
+            while chunk := spool.read(CHUNK_SIZE):
+                file.write(chunk)
+            file.write(f"{newline}{pad}}}" if count else "}")
+
+    write_header(keys[position + 1 :], first=False)  # noqa: E203
+    file.write(f"{newline}}}{newline}")
+    return count
+
+
+def save_tokenlist(tokenlist: Dict, file_path: str, tokens: Optional[Iterable[Dict]] = None, **kwargs) -> int:
+    with open(file_path, "w", encoding="utf-8") as f:
+        return write_tokenlist(f, tokenlist, tokenlist.get("tokens", []) if tokens is None else tokens, **kwargs)
+
+
+class JSONStream:
+    """Pull parser over a text stream that decodes one JSON value at a time from a bounded buffer."""
+
+    def __init__(self, file: IO[str], chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk  # noqa: E203
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r}")
+        self.pos += 1
+
+    def decode(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def iter_array(self) -> Iterator[None]:
+        """Yield once per element, positioned at it; the caller must consume the element."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield each key, positioned at its value; the caller must consume the value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.decode()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def skip(self) -> None:
+        char = self.peek()
+        if char == "{":
+            for _ in self.iter_object():
+                self.skip()
+        elif char == "[":
+            for _ in self.iter_array():
+                self.skip()
+        else:
+            self.decode()
+
+
+def iter_tokenlist(file: IO[str]) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally read a tokenlist. Yields ("header", {...}) once the top-level fields preceding the tokens
+    are known, then ("token", {...}) for every token. The tokenMap is skipped without being materialized,
+    and header fields after the tokens are yielded at the end as a second ("header", {...}).
+    """
+    stream = JSONStream(file)
+    header = {}
+    for key in stream.iter_object():
+        if key == "tokens":
+            yield "header", header
+            header = {}
+            for _ in stream.iter_array():
+                yield "token", stream.decode()
+        elif key == "tokenMap" and stream.peek() == "{":
+            # Decode and drop one entry at a time
+            for _ in stream.iter_object():
+                stream.decode()
+        else:
+            header[key] = stream.decode()
+    if header:
+        yield "header", header
+
+
+def iter_tokens(file_path: str) -> Iterator[Dict]:
+    with open(file_path, "r", encoding="utf-8") as f:
+        for kind, value in iter_tokenlist(f):
+            if kind == "token":
+                yield value
+
+
+def read_tokenlist(file: IO[str]) -> Dict:
+    """Read a tokenlist without its tokenMap, which can always be rebuilt from the tokens."""
+    tokenlist: Dict = {}
+    tokens: List[Dict] = []
+    for kind, value in iter_tokenlist(file):
+        if kind == "header":
+            tokenlist.update(value)
+            # Keys after the tokens come in a second header, this keeps them in the file's order
+            tokenlist.setdefault("tokens", tokens)
+        else:
+            tokens.append(value)
+    tokenlist.setdefault("tokens", tokens)
+    return tokenlist
+
+
+def load_tokenlist(file_path: str) -> Dict:
+    with open(file_path, "r", encoding="utf-8") as f:
+        return read_tokenlist(f)
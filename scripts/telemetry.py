@@ -0,0 +1,325 @@
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+DEFAULT_REPORT_PATH = ".cache/run_report.json"
+DEFAULT_METRICS_PATH = ".cache/curve_assets.prom"
+DEFAULT_PROFILE_DIR = ".cache/profiles"
+
+PROFILERS = ("cprofile", "sample")
+# Seconds between two stack samples of the sampling profiler
+SAMPLE_INTERVAL = 0.005
+METRIC_PREFIX = "curve_assets"
+
+# Counters recorded by the pipeline, with their Prometheus help text
+COUNTERS = {
+    "rpc_requests": "JSON-RPC HTTP requests sent, hedged duplicates included",
+    "rpc_request_bytes": "Bytes of JSON-RPC request bodies",
+    "rpc_response_bytes": "Bytes of JSON-RPC response bodies",
+    "rpc_errors": "JSON-RPC HTTP requests that failed",
+    "rpc_retries": "JSON-RPC requests retried after a failure",
+    "rpc_hedges": "Duplicate requests sent because the first one was slow",
+    "eth_calls": "eth_call requests, one per multicall batch",
+    "multicall_splits": "Multicall batches split in half to isolate reverting calls",
+    "multicall_capacity_errors": "Multicall batches that hit a node gas or response size cap",
+    "multicall_failed_calls": "Calls that reverted or could not be decoded",
+    "tokens_skipped": "Tokens already complete in the existing tokenlist",
+    "tokens_cached": "Tokens answered from the metadata cache",
+    "tokens_fetched": "Tokens fetched over RPC",
+    "tokens_failed": "Tokens without complete metadata",
+    "tokens_validated": "Tokens validated against the schema",
+    "validation_cache_hits": "Tokens whose validation was skipped through the validation cache",
+    "run_failures": "Runs that ended with an error",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Labels of the innermost span, inherited by nested spans and counters (and by asyncio tasks)
+_labels: ContextVar[Labels] = ContextVar("telemetry_labels", default=())
+
+
+def _merge(labels: Labels, extra: Dict[str, object]) -> Labels:
+    if not extra:
+        return labels
+    merged = dict(labels)
+    merged.update((key, str(value)) for key, value in extra.items())
+    return tuple(sorted(merged.items()))
+
+
+@dataclass
+class SpanStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread: a background thread records its stack every `interval` seconds.
+    Stacks are written in the folded format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+
+
+class Telemetry:
+    """
+    Spans and counters of one run.
+
+    Spans time a stage (per label set, e.g. per network) and label everything recorded inside them,
+    including RPC counters incremented by the asyncio tasks they start. Spans named in
+    `profile_stages` are also profiled, with cProfile (one .prof file per span) or the sampling
+    profiler (folded stacks), into `profile_dir`. Only one span is profiled at a time per process.
+    Recording is thread-safe, so networks processed concurrently report separately.
+    """
+
+    def __init__(
+        self,
+        profile_stages: Iterable[str] = (),
+        profiler: str = "cprofile",
+        profile_dir: str = DEFAULT_PROFILE_DIR,
+    ):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profiler!r}, expected one of {', '.join(PROFILERS)}")
+        self.profile_stages = set(profile_stages)
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now(timezone.utc)
+        self.spans: Dict[Tuple[str, Labels], SpanStats] = {}
+        self.counters: Counter = Counter()
+        self.profiles = []
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+
+    def count(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _merge(_labels.get(), labels))
+        with self._lock:
+            self.counters[key] += value
+
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[None]:
+        span_labels = _merge(_labels.get(), labels)
+        token = _labels.set(span_labels)
+        profiler = self._start_profiler(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            _labels.reset(token)
+            if profiler is not None:
+                self._stop_profiler(profiler, name, span_labels)
+            with self._lock:
+                stats = self.spans.setdefault((name, span_labels), SpanStats())
+                stats.count += 1
+                stats.total += elapsed
+                stats.max = max(stats.max, elapsed)
+
+    def _start_profiler(self, name: str):
+        if name not in self.profile_stages or not self._profile_lock.acquire(blocking=False):
+            return None
+        if self.profiler == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident())
+            profiler.start()
+        return profiler
+
+    def _stop_profiler(self, profiler, name: str, labels: Labels) -> None:
+        try:
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+            else:
+                profiler.stop()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            stem = "-".join([name, *(value for _, value in labels)])
+            extension = "prof" if isinstance(profiler, cProfile.Profile) else "folded"
+            path = os.path.join(self.profile_dir, f"{stem}.{extension}")
+            suffix = 2
+            while path in self.profiles:
+                path = os.path.join(self.profile_dir, f"{stem}-{suffix}.{extension}")
+                suffix += 1
+            if isinstance(profiler, cProfile.Profile):
+                profiler.dump_stats(path)
+            else:
+                profiler.dump(path)
+            self.profiles.append(path)
+        finally:
+            self._profile_lock.release()
+
+    # Reports
+
+    def report(self) -> Dict:
+        with self._lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+        return {
+            "started_at": self.started_at.isoformat(),
+            "duration": time.perf_counter() - self._started,
+            "spans": [
+                {"name": name, "labels": dict(labels), "count": stats.count, "total": stats.total, "max": stats.max}
+                for (name, labels), stats in spans
+            ],
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters],
+            "profiles": list(self.profiles),
+        }
+
+    def write_report(self, path: str = DEFAULT_REPORT_PATH) -> None:
+        _write_atomic(path, json.dumps(self.report(), indent=2))
+
+    def prometheus(self) -> str:
+        """The run as Prometheus text exposition, for node_exporter's textfile collector."""
+        report = self.report()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: Iterable[Tuple[Dict, float]]) -> None:
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                rendered = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                selector = f"{{{rendered}}}" if rendered else ""
+                lines.append(f"{METRIC_PREFIX}_{name}{selector} {value}")
+
+        metric("last_run_timestamp_seconds", "gauge", "Start of the last run", [({}, self.started_at.timestamp())])
+        metric("run_duration_seconds", "gauge", "Wall time of the last run", [({}, report["duration"])])
+        spans = [({"stage": span["name"], **span["labels"]}, span) for span in report["spans"]]
+        metric(
+            "stage_duration_seconds",
+            "gauge",
+            "Wall time spent in each stage during the last run",
+            [(labels, span["total"]) for labels, span in spans],
+        )
+        metric(
+            "stage_runs",
+            "gauge",
+            "Times each stage ran during the last run",
+            [(labels, span["count"]) for labels, span in spans],
+        )
+        counters: Dict[str, list] = {}
+        for counter in report["counters"]:
+            counters.setdefault(counter["name"], []).append((counter["labels"], counter["value"]))
+        for name, samples in counters.items():
+            metric(name, "gauge", f"{COUNTERS.get(name, name)} (last run)", samples)
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str = DEFAULT_METRICS_PATH) -> None:
+        # The textfile collector may read at any time, so the file is replaced atomically
+        _write_atomic(path, self.prometheus())
+
+    def display(self, limit: int = 15) -> None:
+        report = self.report()
+        table = Table(title=f"Slowest stages ({report['duration']:.1f}s run)")
+        table.add_column("Stage", style="cyan")
+        table.add_column("Labels", style="cyan")
+        table.add_column("Runs", style="green")
+        table.add_column("Total", style="green")
+        table.add_column("Max", style="yellow")
+        for span in sorted(report["spans"], key=lambda span: -span["total"])[:limit]:
+            labels = ", ".join(f"{key}={value}" for key, value in span["labels"].items())
+            table.add_row(span["name"], labels, str(span["count"]), f"{span['total']:.2f}s", f"{span['max']:.2f}s")
+        console.print(table)
+
+        totals = Counter()
+        for counter in report["counters"]:
+            totals[counter["name"]] += counter["value"]
+        if totals:
+            console.print(
+                "[cyan]" + ", ".join(f"{name}: {value:,}" for name, value in sorted(totals.items())) + "[/cyan]"
+            )
+        for path in report["profiles"]:
+            console.print(f"[cyan]Profile written to {path}[/cyan]")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: str, content: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+# Recording goes to a process-wide instance, so the pipeline does not need to pass it around
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
+
+
+def set_telemetry(telemetry: Optional[Telemetry] = None) -> Telemetry:
+    """Start recording into a new instance (or the given one) and return it."""
+    global _telemetry
+    _telemetry = telemetry or Telemetry()
+    return _telemetry
+
+
+def span(name: str, **labels):
+    return _telemetry.span(name, **labels)
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    _telemetry.count(name, value, **labels)
+
+
+def traced(name: str) -> Callable:
+    """Decorator running every call of a function in a span."""
+
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
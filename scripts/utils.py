@@ -1,22 +1,40 @@
+import asyncio
+import bisect
 import json
-from typing import Any, Dict, List, Tuple
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from eth_abi import decode
+import aiohttp
 from hexbytes import HexBytes
 from rich.console import Console
 from web3 import Web3
-from web3.exceptions import ContractLogicError, InvalidAddress
 
-from scripts.constants import ERC20_ABI, JSDELIVR_BASE_URL, MULTICALL_ABI, NATIVE_TOKEN_ADDRESS, NETWORKS
+from scripts.batching import BatchSizer
+from scripts.cache import TokenCache
+from scripts.calls import (
+    Call,
+    decode_aggregate,
+    decode_aggregate3,
+    decode_results,
+    encode_call_array,
+    erc20_metadata_calls,
+)
+from scripts.constants import JSDELIVR_BASE_URL, NATIVE_TOKEN_ADDRESS, NETWORKS, Network
+from scripts.rpc import (
+    AsyncRPCClient,
+    BlockIdentifier,
+    EndpointPool,
+    ExecutionReverted,
+    RPCError,
+    get_block_number,
+    is_capacity_error,
+)
+from scripts.telemetry import count, traced
 
 console = Console()
 
-
-def get_network_name(folder_name: str) -> str:
-    for network, info in NETWORKS.items():
-        if info.folder_name == folder_name:
-            return network
-    raise ValueError(f"No network found for folder name: {folder_name}")
+# Existing tokens keyed by (chainId, lowercase address)
+TokenIndex = Dict[Tuple[int, str], Dict]
 
 
 def load_json(file_path: str) -> Dict:
@@ -34,80 +52,231 @@ def save_json(data: Dict, file_path: str) -> None:
     console.print(f"[green]Saved data to {file_path}[/green]")
 
 
+# Reported in failed_calls for calls the contract reverted, the only failures worth negative caching
+REVERTED = "execution reverted"
+
+AGGREGATE_SELECTOR = Web3.keccak(text="aggregate((address,bytes)[])")[:4]
+AGGREGATE3_SELECTOR = Web3.keccak(text="aggregate3((address,bool,bytes)[])")[:4]
+
+
+def encode_aggregate(batch_calls: List[Call]) -> bytes:
+    return AGGREGATE_SELECTOR + encode_call_array(batch_calls)
+
+
+def encode_aggregate3(batch_calls: List[Call]) -> bytes:
+    return AGGREGATE3_SELECTOR + encode_call_array(batch_calls, allow_failure=True)
+
+
+async def multicall_async(
+    client: AsyncRPCClient,
+    multicall_address: str,
+    batches: List[List[Call]],
+    block_identifier: BlockIdentifier = "latest",
+    rpc_batch_size: int = 1,
+    use_aggregate3: bool = True,
+) -> Tuple[List[List[Optional[bytes]]], List[Tuple[str, str, str]]]:
+    """
+    Run every batch through Multicall with several batches in flight at once.
+
+    With use_aggregate3, each batch is a single `aggregate3` call with allowFailure set, so reverting
+    calls are reported per call without extra round trips. Otherwise (or if `aggregate3` itself reverts)
+    the batch goes through `aggregate`, which is split in half until the offending calls are isolated.
+    With rpc_batch_size > 1, that many eth_calls are packed into a single JSON-RPC batch POST.
+    Return data is aligned with the input calls, with None for calls that failed.
+    """
+    failed_calls = []
+
+    def unpack_aggregate3(batch_calls: List[Call], data: bytes) -> List[Optional[bytes]]:
+        results = []
+        for call, (success, return_data) in zip(batch_calls, decode_aggregate3(data)):
+            if success:
+                results.append(return_data)
+            else:
+                failed_calls.append((call.address, call.fn_name, REVERTED))
+                results.append(None)
+        return results
+
+    async def split_batch(batch_calls: List[Call], error: Exception) -> List[Optional[bytes]]:
+        if len(batch_calls) == 1:
+            call = batch_calls[0]
+            console.print(f"[red]ContractLogicError for {call.address}.{call.fn_name}: {str(error)}[/red]")
+            failed_calls.append((call.address, call.fn_name, REVERTED))
+            return [None]
+
+        mid = len(batch_calls) // 2
+        count("multicall_splits")
+        console.print(f"[yellow]Splitting batch of size {len(batch_calls)} due to ContractLogicError[/yellow]")
+        left, right = await asyncio.gather(bisect_batch(batch_calls[:mid]), bisect_batch(batch_calls[mid:]))
+        return left + right
+
+    async def bisect_batch(batch_calls: List[Call]) -> List[Optional[bytes]]:
+        try:
+            data = await client.eth_call(multicall_address, encode_aggregate(batch_calls), block_identifier)
+        except ExecutionReverted as e:
+            return await split_batch(batch_calls, e)
+        return decode_aggregate(data)
+
+    async def fallback(batch_calls: List[Call], error: Exception) -> List[Optional[bytes]]:
+        if not use_aggregate3:
+            return await split_batch(batch_calls, error)
+        console.print(f"[yellow]aggregate3 reverted ({str(error)}), falling back to aggregate[/yellow]")
+        return await bisect_batch(batch_calls)
+
+    async def process_batch(batch_calls: List[Call]) -> List[Optional[bytes]]:
+        if not use_aggregate3:
+            return await bisect_batch(batch_calls)
+        try:
+            data = await client.eth_call(multicall_address, encode_aggregate3(batch_calls), block_identifier)
+        except ExecutionReverted as e:
+            return await fallback(batch_calls, e)
+        return unpack_aggregate3(batch_calls, data)
+
+    async def process_batch_group(group: List[List[Call]]) -> List[List[Optional[bytes]]]:
+        encode_batch = encode_aggregate3 if use_aggregate3 else encode_aggregate
+        responses = await client.eth_call_batch(
+            [(multicall_address, encode_batch(batch_calls)) for batch_calls in group], block_identifier
+        )
+        results = []
+        fallbacks = {}
+        for index, (batch_calls, response) in enumerate(zip(group, responses)):
+            if isinstance(response, ExecutionReverted):
+                fallbacks[index] = fallback(batch_calls, response)
+                results.append(None)
+            elif isinstance(response, RPCError):
+                raise response
+            elif use_aggregate3:
+                results.append(unpack_aggregate3(batch_calls, response))
+            else:
+                results.append(decode_aggregate(response))
+
+        for index, result in zip(fallbacks, await asyncio.gather(*fallbacks.values())):
+            results[index] = result
+        return results
+
+    if rpc_batch_size > 1:
+        groups = [batches[i : i + rpc_batch_size] for i in range(0, len(batches), rpc_batch_size)]  # noqa: E203
+        group_results = await asyncio.gather(*(process_batch_group(group) for group in groups))
+        results = [result for group_result in group_results for result in group_result]
+    else:
+        results = list(await asyncio.gather(*(process_batch(batch_calls) for batch_calls in batches)))
+
+    return results, failed_calls
+
+
+async def multicall_adaptive(
+    client: AsyncRPCClient,
+    multicall_address: str,
+    calls: List[Call],
+    sizer: BatchSizer,
+    block_identifier: BlockIdentifier = "latest",
+    use_aggregate3: bool = True,
+) -> Tuple[List[List[Optional[bytes]]], List[Tuple[str, str, str]]]:
+    """
+    Run calls through Multicall in batches sized by `sizer`, as in multicall_async.
+
+    Batches are cut when a request slot frees up, so every batch uses what the sizer learned from the
+    ones that came back before it. A batch that hits a node's gas or response size cap is put back
+    and cut again at the reduced size. Returns a single batch of return data aligned with `calls`.
+    """
+    results: List[Optional[bytes]] = [None] * len(calls)
+    failed_calls = []
+    # (start, end) ranges of calls still to send
+    pending = [(0, len(calls))] if calls else []
+
+    async def worker():
+        while pending:
+            start, end = pending.pop(0)
+            # Ranges put back by failed batches are contiguous with the rest again
+            while pending and pending[0][0] == end:
+                end = pending.pop(0)[1]
+            size = sizer.next_batch(end - start)
+            if end - start > size:
+                bisect.insort(pending, (start + size, end))
+                end = start + size
+
+            batch_calls = calls[start:end]
+            started = time.monotonic()
+            try:
+                batch_results, batch_failed = await multicall_async(
+                    client, multicall_address, [batch_calls], block_identifier, 1, use_aggregate3
+                )
+            except (RPCError, aiohttp.ClientResponseError) as e:
+                if not is_capacity_error(e) or len(batch_calls) == 1:
+                    raise
+                sizer.record_failure(len(batch_calls))
+                count("multicall_capacity_errors")
+                console.print(
+                    f"[yellow]Batch of {len(batch_calls)} calls too large ({str(e)}), "
+                    f"retrying with {sizer.size}[/yellow]"
+                )
+                bisect.insort(pending, (start, end))
+                continue
+
+            response_bytes = sum(len(return_data) for return_data in batch_results[0] if return_data)
+            sizer.record_success(len(batch_calls), time.monotonic() - started, response_bytes)
+            results[start:end] = batch_results[0]
+            failed_calls.extend(batch_failed)
+
+    # Work put back by a failed batch after the other workers finished is picked up by the next round
+    while pending:
+        await asyncio.gather(*(worker() for _ in range(client.max_in_flight)))
+
+    return [results], failed_calls
+
+
+@traced("multicall")
 def multicall(
-    w3: Web3, calls: list, block_identifier: int = "latest", batch_size: int = 1000
+    w3: Web3,
+    calls: List[Call],
+    network: Network,
+    block_identifier: BlockIdentifier = "latest",
+    batch_size: int = 1000,
+    max_in_flight: int = 4,
+    rpc_batch_size: int = 1,
+    use_aggregate3: Optional[bool] = None,
+    endpoint_pool: Optional[EndpointPool] = None,
+    batch_sizer: Optional[BatchSizer] = None,
 ) -> Tuple[List[Any], List[Tuple[str, str, str]]]:
-    network_name = next((name for name, net in NETWORKS.items() if net.chain_id == w3.eth.chain_id), None)
-    if not network_name:
-        console.print(f"[red]Unsupported chain ID: {w3.eth.chain_id}[/red]")
-        raise ValueError(f"Unsupported chain ID: {w3.eth.chain_id}")
-
-    network = NETWORKS[network_name]
+    """
+    Call every Call in `calls` through Multicall and decode the results, a batch at a time.
+    With a batch_sizer, batches are sized adaptively instead of `batch_size` calls each.
+    """
     multicall_address = network.multicall_address
     if not multicall_address:
-        console.print(f"[red]Multicall address not found for network: {network_name}[/red]")
-        raise ValueError(f"Multicall address not found for network: {network_name}")
+        console.print(f"[red]Multicall address not found for chain ID: {network.chain_id}[/red]")
+        raise ValueError(f"Multicall address not found for chain ID: {network.chain_id}")
+
+    if use_aggregate3 is None:
+        use_aggregate3 = network.supports_aggregate3
+
+    if batch_sizer:
+        batches = [calls]
+        console.print(
+            f"[cyan]Processing {len(calls)} calls in adaptive batches of {batch_sizer.size} "
+            f"with up to {max_in_flight} requests in flight[/cyan]"
+        )
+    else:
+        batches = [calls[i : i + batch_size] for i in range(0, len(calls), batch_size)]  # noqa: E203
+        console.print(f"[cyan]Processing {len(batches)} batches with up to {max_in_flight} requests in flight[/cyan]")
+
+    async def run():
+        async with AsyncRPCClient(endpoint_pool or w3.provider.endpoint_uri, max_in_flight=max_in_flight) as client:
+            if batch_sizer:
+                return await multicall_adaptive(
+                    client, multicall_address, calls, batch_sizer, block_identifier, use_aggregate3
+                )
+            return await multicall_async(
+                client, multicall_address, batches, block_identifier, rpc_batch_size, use_aggregate3
+            )
 
-    multicall_contract = w3.eth.contract(address=multicall_address, abi=MULTICALL_ABI)
+    batch_results, failed_calls = asyncio.run(run())
 
     all_decoded_results = []
-    failed_calls = []
-
-    def process_batch(batch_calls):
-        aggregate_calls = [
-            (contract.address, contract.encodeABI(fn_name=fn_name, args=args))
-            for contract, fn_name, args in batch_calls
-        ]
-
-        try:
-            result = multicall_contract.functions.aggregate(aggregate_calls).call(block_identifier=block_identifier)
-            return result, None
-        except ContractLogicError as e:
-            if len(batch_calls) == 1:
-                contract, fn_name, _ = batch_calls[0]
-                console.print(f"[red]ContractLogicError for {contract.address}.{fn_name}: {str(e)}[/red]")
-                return None, batch_calls[0]
-
-            mid = len(batch_calls) // 2
-            console.print(f"[yellow]Splitting batch of size {len(batch_calls)} due to ContractLogicError[/yellow]")
-            left_result, left_failed = process_batch(batch_calls[:mid])
-            right_result, right_failed = process_batch(batch_calls[mid:])
-
-            if left_failed:
-                failed_calls.append(left_failed)
-            if right_failed:
-                failed_calls.append(right_failed)
-
-            combined_result = [None, []]
-            if left_result:
-                combined_result[0] = left_result[0]
-                combined_result[1].extend(left_result[1])
-            if right_result:
-                combined_result[0] = right_result[0]
-                combined_result[1].extend(right_result[1])
-
-            return combined_result, None
-
-    for i in range(0, len(calls), batch_size):
-        batch_calls = calls[i : i + batch_size]  # noqa: E203
-        console.print(f"[cyan]Processing batch {i // batch_size + 1} of {len(calls) // batch_size + 1}[/cyan]")
-        result, _ = process_batch(batch_calls)
-
-        if result:
-            for j, call in enumerate(batch_calls):
-                contract, fn_name, _ = call
-                function = contract.get_function_by_name(fn_name)
-                output_types = [output["type"] for output in function.abi["outputs"]]
-                try:
-                    all_decoded_results.append(decode(output_types, result[1][j]))
-                except Exception as e:
-                    console.print(f"[red]Error decoding result for {contract.address}.{fn_name}: {str(e)}[/red]")
-                    failed_calls.append((contract.address, fn_name, str(e)))
-                    all_decoded_results.append(None)
-        else:
-            all_decoded_results.extend([None] * len(batch_calls))
+    for batch_calls, result in zip(batches, batch_results):
+        all_decoded_results.extend(decode_results(batch_calls, result, failed_calls))
 
     if failed_calls:
+        count("multicall_failed_calls", len(failed_calls))
         console.print(f"[yellow]Total failed calls: {len(failed_calls)}[/yellow]")
         for address, fn_name, error in failed_calls[:10]:  # Show first 10 failed calls
             console.print(f"[red]Failed: {address}.{fn_name} - {error}[/red]")
@@ -124,12 +293,29 @@ def is_valid_address(address: str) -> bool:
         return False
 
 
-def get_token_info_batch(w3, addresses, existing_tokens):
+def build_token_index(tokens: Iterable[Dict]) -> TokenIndex:
+    """Index tokens by (chainId, lowercase address). Later duplicates win, as in update_tokenlist."""
+    return {(token["chainId"], token["address"].lower()): token for token in tokens}
+
+
+@traced("fetch_token_info")
+def get_token_info_batch(
+    w3,
+    addresses,
+    token_index: TokenIndex,
+    network: Network,
+    token_cache: Optional[TokenCache] = None,
+    endpoint_pool: Optional[EndpointPool] = None,
+    batch_sizer: Optional[BatchSizer] = None,
+):
     console.print("[cyan]Fetching token info in batch...[/cyan]")
+    chain_id = network.chain_id
     calls = []
     valid_addresses = []
     skipped_tokens = []
     failed_tokens = []
+    token_info = []
+    cached_tokens = token_cache.get_many(chain_id, addresses) if token_cache else {}
 
     for address in addresses:
         if not is_valid_address(address):
@@ -138,33 +324,43 @@ def get_token_info_batch(w3, addresses, existing_tokens):
             continue
 
         if address.lower() != NATIVE_TOKEN_ADDRESS.lower():
-            existing_token = next(
-                (
-                    t
-                    for t in existing_tokens
-                    if t["address"].lower() == address.lower() and t["chainId"] == w3.eth.chain_id
-                ),
-                None,
-            )
+            existing_token = token_index.get((chain_id, address.lower()))
             if existing_token and all(existing_token.get(key) for key in ["name", "symbol", "decimals"]):
                 skipped_tokens.append(existing_token)
                 continue
 
-            try:
-                contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=ERC20_ABI)
-                calls.extend([(contract, "name", []), (contract, "symbol", []), (contract, "decimals", [])])
-                valid_addresses.append(address)
-            except InvalidAddress:
-                failed_tokens.append(address)
-                console.print(f"[red]Failed to instantiate contract for address: {address}[/red]")
-            except Exception as e:
+            cached_token = cached_tokens.get(address.lower())
+            if cached_token and cached_token.failed:
                 failed_tokens.append(address)
-                console.print(f"[red]Unexpected error instantiating contract for address {address}: {str(e)}[/red]")
+                continue
+            if cached_token:
+                token_info.append({**cached_token.to_info(), "address": address})
+                continue
 
-    console.print(f"[cyan]Preparing to call {len(calls)} functions for {len(valid_addresses)} tokens[/cyan]")
-    results, failed_calls = multicall(w3, calls)
+            # Lowercase addresses encode without a checksum, whatever the case of the file name
+            calls.extend(erc20_metadata_calls(address.lower()))
+            valid_addresses.append(address)
 
-    token_info = []
+    console.print(f"[cyan]Preparing to call {len(calls)} functions for {len(valid_addresses)} tokens[/cyan]")
+    if cached_tokens:
+        console.print(f"[cyan]Found {len(cached_tokens)} tokens in the metadata cache[/cyan]")
+    if not calls:
+        results, failed_calls, block_number = [], [], None
+    else:
+        # Pin all batches to one block so cache entries record where they were read
+        if endpoint_pool:
+            block_number = asyncio.run(get_block_number(endpoint_pool))
+        else:
+            block_number = w3.eth.block_number
+        results, failed_calls = multicall(
+            w3, calls, network, block_identifier=block_number, endpoint_pool=endpoint_pool, batch_sizer=batch_sizer
+        )
+
+    # Only tokens whose calls the contract reverted are negative cached, anything else (return data that
+    # does not decode, a call lost on the way) is retried on the next run
+    reverted_addresses = {address.lower() for address, _, error in failed_calls if error == REVERTED}
+    fetched_tokens = []
+    reverted_tokens = []
     result_index = 0
     for address in valid_addresses:
         name = results[result_index]
@@ -172,9 +368,11 @@ def get_token_info_batch(w3, addresses, existing_tokens):
         decimals = results[result_index + 2]
         if name is None or symbol is None or decimals is None:
             failed_tokens.append(address)
+            if address.lower() in reverted_addresses:
+                reverted_tokens.append(address)
             console.print(f"[red]Failed to fetch complete token info for address: {address}[/red]")
         else:
-            token_info.append(
+            fetched_tokens.append(
                 {
                     "address": address,
                     "name": name[0] if isinstance(name, tuple) else name,
@@ -184,6 +382,16 @@ def get_token_info_batch(w3, addresses, existing_tokens):
             )
         result_index += 3
 
+    if token_cache and block_number is not None:
+        token_cache.put_many(chain_id, fetched_tokens, block_number)
+        token_cache.put_failures(chain_id, reverted_tokens, block_number)
+    token_info.extend(fetched_tokens)
+
+    count("tokens_skipped", len(skipped_tokens))
+    count("tokens_cached", len(token_info) - len(fetched_tokens))
+    count("tokens_fetched", len(fetched_tokens))
+    count("tokens_failed", len(failed_tokens))
+
     console.print(f"[green]Successfully fetched info for {len(token_info)} tokens[/green]")
     console.print(f"[yellow]Skipped {len(skipped_tokens)} existing tokens[/yellow]")
     console.print(f"[red]Failed to fetch info for {len(failed_tokens)} tokens[/red]")
@@ -0,0 +1,205 @@
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+
+def object_sha(kind: str, payload: bytes) -> str:
+    return hashlib.sha1(f"{kind} {len(payload)}\0".encode() + payload).hexdigest()
+
+
+class FakeGitHub:
+    """
+    Local stand-in for the parts of the GitHub REST API used to publish to gh-pages: branches, refs,
+    blobs, trees (with inline content and base trees) and commits of a single repository.
+
+    Blob ids are real git object ids, so content-hash comparisons behave as on GitHub. Every request is
+    counted by method and route. Point PyGithub at it with `GITHUB_API_URL`:
+
+        with FakeGitHub("curvefi/curve-assets") as api:
+            os.environ["GITHUB_API_URL"] = api.url
+    """
+
+    def __init__(self, repo_name: str, default_branch: str = "main"):
+        self.repo_name = repo_name
+        self.default_branch = default_branch
+        self.blobs: Dict[str, bytes] = {}
+        # Trees are stored flat, as path -> blob sha
+        self.trees: Dict[str, Dict[str, str]] = {}
+        self.commits: Dict[str, Dict] = {}
+        self.refs: Dict[str, str] = {}
+        self.requests: Counter = Counter()
+        self.url = ""
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+
+        root_tree = self.store_tree({})
+        self.refs[f"heads/{default_branch}"] = self.store_commit("Initial commit", root_tree, [])
+
+    def reset_counters(self) -> None:
+        self.requests.clear()
+
+    @property
+    def api_calls(self) -> int:
+        return sum(self.requests.values())
+
+    # Object store
+
+    def store_blob(self, data: bytes) -> str:
+        sha = object_sha("blob", data)
+        self.blobs[sha] = data
+        return sha
+
+    def store_tree(self, entries: Dict[str, str]) -> str:
+        sha = object_sha("tree", json.dumps(sorted(entries.items())).encode())
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def store_commit(self, message: str, tree: str, parents: List[str]) -> str:
+        payload = json.dumps({"message": message, "tree": tree, "parents": parents}).encode()
+        sha = object_sha("commit", payload + str(len(self.commits)).encode())
+        self.commits[sha] = {"message": message, "tree": tree, "parents": parents}
+        return sha
+
+    def files(self, branch: str = "gh-pages") -> Dict[str, bytes]:
+        """Contents of every file on a branch."""
+        tree = self.trees[self.commits[self.refs[f"heads/{branch}"]]["tree"]]
+        return {path: self.blobs[sha] for path, sha in tree.items()}
+
+    # JSON representations
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.url}/repos/{self.repo_name}"
+
+    def commit_json(self, sha: str) -> Dict:
+        commit = self.commits[sha]
+        return {
+            "sha": sha,
+            "url": f"{self.api_url}/git/commits/{sha}",
+            "message": commit["message"],
+            "tree": {"sha": commit["tree"], "url": f"{self.api_url}/git/trees/{commit['tree']}"},
+            "parents": [{"sha": parent, "url": f"{self.api_url}/git/commits/{parent}"} for parent in commit["parents"]],
+        }
+
+    def tree_json(self, sha: str) -> Dict:
+        entries = [
+            {"path": path, "mode": "100644", "type": "blob", "sha": blob, "size": len(self.blobs[blob])}
+            for path, blob in sorted(self.trees[sha].items())
+        ]
+        return {"sha": sha, "url": f"{self.api_url}/git/trees/{sha}", "tree": entries, "truncated": False}
+
+    def ref_json(self, ref: str) -> Dict:
+        sha = self.refs[ref]
+        return {
+            "ref": f"refs/{ref}",
+            "url": f"{self.api_url}/git/refs/{ref}",
+            "object": {"sha": sha, "type": "commit", "url": f"{self.api_url}/git/commits/{sha}"},
+        }
+
+    # Handlers
+
+    def route(self, method: str, path: str, body: Dict) -> Tuple[int, Dict]:
+        prefix = f"/repos/{self.repo_name}"
+        if not path.startswith(prefix):
+            return 404, {"message": "Not Found"}
+        path = path[len(prefix) :]  # noqa: E203
+
+        if method == "GET" and path == "":
+            owner, name = self.repo_name.split("/")
+            return 200, {
+                "name": name,
+                "full_name": self.repo_name,
+                "owner": {"login": owner},
+                "default_branch": self.default_branch,
+                "url": self.api_url,
+            }
+        if method == "GET" and path.startswith("/branches/"):
+            name = path[len("/branches/") :]  # noqa: E203
+            if f"heads/{name}" not in self.refs:
+                return 404, {"message": "Branch not found"}
+            sha = self.refs[f"heads/{name}"]
+            return 200, {"name": name, "commit": {"sha": sha, "commit": self.commit_json(sha)}}
+        if method == "POST" and path == "/git/refs":
+            self.refs[body["ref"][len("refs/") :]] = body["sha"]  # noqa: E203
+            return 201, self.ref_json(body["ref"][len("refs/") :])  # noqa: E203
+        # PyGithub uses either prefix depending on its version
+        if method == "PATCH" and path.startswith(("/git/refs/", "/git/ref/")):
+            ref = path.split("/", 3)[3]
+            self.refs[ref] = body["sha"]
+            return 200, self.ref_json(ref)
+        if method == "POST" and path == "/git/blobs":
+            content = body["content"]
+            data = base64.b64decode(content) if body.get("encoding") == "base64" else content.encode("utf-8")
+            sha = self.store_blob(data)
+            return 201, {"sha": sha, "url": f"{self.api_url}/git/blobs/{sha}"}
+        if method == "GET" and path.startswith("/git/trees/"):
+            sha = path[len("/git/trees/") :]  # noqa: E203
+            if sha in self.commits:
+                sha = self.commits[sha]["tree"]
+            if sha not in self.trees:
+                return 404, {"message": "Not Found"}
+            return 200, self.tree_json(sha)
+        if method == "POST" and path == "/git/trees":
+            entries = dict(self.trees[body["base_tree"]]) if body.get("base_tree") else {}
+            for element in body["tree"]:
+                if "content" in element:
+                    entries[element["path"]] = self.store_blob(element["content"].encode("utf-8"))
+                elif element.get("sha") is None:
+                    entries.pop(element["path"], None)
+                else:
+                    entries[element["path"]] = element["sha"]
+            return 201, self.tree_json(self.store_tree(entries))
+        if method == "GET" and path.startswith("/git/commits/"):
+            sha = path[len("/git/commits/") :]  # noqa: E203
+            return (200, self.commit_json(sha)) if sha in self.commits else (404, {"message": "Not Found"})
+        if method == "POST" and path == "/git/commits":
+            sha = self.store_commit(body["message"], body["tree"], body["parents"])
+            return 201, self.commit_json(sha)
+        return 404, {"message": f"{method} {path} is not implemented by the fake"}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        # Count by route shape, not by object id
+        route = "/".join(part if len(part) != 40 else "{sha}" for part in request.path.split("/"))
+        self.requests[f"{request.method} {route}"] += 1
+        status, payload = self.route(request.method, request.path, body)
+        return web.json_response(payload, status=status)
+
+    # Lifecycle
+
+    async def _start(self) -> Tuple[str, int]:
+        app = web.Application(client_max_size=256 * 1024**2)
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        return site._server.sockets[0].getsockname()[:2]
+
+    def start(self) -> str:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        host, port = asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self) -> "FakeGitHub":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,74 @@
+import pytest
+from eth_abi import encode
+from eth_abi.exceptions import DecodingError
+
+from scripts.calls import (
+    ERC20_FUNCTIONS,
+    Call,
+    build_call,
+    decode_aggregate,
+    decode_aggregate3,
+    decode_string,
+    encode_call_array,
+    erc20_metadata_calls,
+)
+
+TARGETS = [f"0x{i:040x}" for i in range(1, 4)]
+CALLS = [
+    *erc20_metadata_calls(TARGETS[0]),
+    build_call(TARGETS[1], ERC20_FUNCTIONS["name"]),
+    # Calldata that is not a multiple of 32 bytes long needs padding
+    Call(TARGETS[2].upper().replace("0X", "0x"), "raw", bytes(range(37)), ("bytes",)),
+    Call(TARGETS[2], "empty", b"", ()),
+]
+
+
+def test_call_arrays_encode_like_eth_abi():
+    targets_and_data = [(call.address, call.call_data) for call in CALLS]
+
+    assert encode_call_array(CALLS) == encode(["(address,bytes)[]"], [targets_and_data])
+    for allow_failure in (True, False):
+        assert encode_call_array(CALLS, allow_failure) == encode(
+            ["(address,bool,bytes)[]"], [[(address, allow_failure, data) for address, data in targets_and_data]]
+        )
+    assert encode_call_array([]) == encode(["(address,bytes)[]"], [[]])
+
+
+def test_invalid_call_targets_are_rejected():
+    with pytest.raises(ValueError, match="Invalid call target"):
+        encode_call_array([Call("0x1234", "name", b"", ())])
+
+
+def test_aggregate_return_data_decodes_like_eth_abi():
+    return_data = [b"", b"\x01" * 31, b"\x02" * 32, b"\x03" * 65]
+
+    assert decode_aggregate(encode(["uint256", "bytes[]"], [123, return_data])) == return_data
+    results = [(index % 2 == 0, data) for index, data in enumerate(return_data)]
+    assert decode_aggregate3(encode(["(bool,bytes)[]"], [results])) == results
+
+
+def test_malformed_aggregate_return_data_raises():
+    data = bytearray(encode(["(bool,bytes)[]"], [[(True, b"\x01")]]))
+    # A success flag that is not a bool
+    data[-96 - 1] = 2
+    with pytest.raises(DecodingError):
+        decode_aggregate3(bytes(data))
+    with pytest.raises(DecodingError):
+        decode_aggregate(encode(["uint256", "bytes[]"], [1, [b"\x01"]])[:-32])
+
+
+@pytest.mark.parametrize("value", ["", "Curve DAO Token", "€uro", "x" * 100])
+def test_strings_decode_like_eth_abi(value):
+    assert decode_string(encode(["string"], [value])) == value
+
+
+def test_bytes32_names_decode():
+    # MKR returns its symbol as bytes32
+    assert decode_string(b"MKR".ljust(32, b"\0")) == "MKR"
+    assert decode_string(b"Maker".ljust(32, b"\0")) == "Maker"
+    assert decode_string(bytes(32)) == ""
+
+
+def test_malformed_strings_raise():
+    with pytest.raises(DecodingError):
+        decode_string(b"\x01" * 40)
@@ -0,0 +1,13 @@
+from scripts import constants
+from scripts.constants import NETWORKS, get_rpc_urls
+
+
+def test_drpc_is_only_pooled_for_networks_it_serves(monkeypatch):
+    monkeypatch.setattr(constants, "DRPC_KEY", "key")
+
+    assert get_rpc_urls("x-layer", NETWORKS["x-layer"]) == ["https://xlayerrpc.okx.com", "https://rpc.xlayer.tech"]
+    assert get_rpc_urls("aurora", NETWORKS["aurora"]) == [
+        "https://mainnet.aurora.dev",
+        constants.DRPC_URL % ("aurora", "key"),
+    ]
+    assert get_rpc_urls("ethereum", NETWORKS["ethereum"]) == [constants.DRPC_URL % ("ethereum", "key")]
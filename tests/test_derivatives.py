@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from scripts import manifest
+from scripts.derivatives import build_derivatives
+from scripts.images import build_image_index
+from scripts.optimize import optimize_images, variant_sizes
+
+Image = pytest.importorskip("PIL.Image")
+
+ADDRESSES = [f"0x{i:040x}" for i in range(1, 4)]
+BROKEN = ADDRESSES[1]
+
+
+@pytest.fixture
+def images_dir(tmp_path):
+    folder = tmp_path / "images" / "assets"
+    folder.mkdir(parents=True)
+    for address in ADDRESSES:
+        if address == BROKEN:
+            (folder / f"{address}.png").write_bytes(b"\x89PNG\r\n\x1a\n not really an image")
+        else:
+            Image.new("RGBA", (64, 64), (255, 0, 0, 255)).save(folder / f"{address}.png")
+    return str(tmp_path / "images")
+
+
+def test_broken_icons_are_recorded_and_left_out_of_the_sprites(images_dir, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "derivatives")
+    derivatives, images_manifest = build_derivatives(build_image_index(images_dir), output_dir, sizes=[32])
+
+    assert "error" in derivatives["images"][f"assets/{BROKEN}"]
+    assert derivatives["sprites"]["assets"]["32"]["count"] == 2
+
+    # Unchanged files reuse the images manifest's hashes, and nothing is rendered again
+    monkeypatch.setattr(manifest, "hash_file", lambda path: pytest.fail(f"{path} was hashed again"))
+    monkeypatch.setattr("scripts.derivatives.render_derivatives", lambda *args: pytest.fail("rendered again"))
+    again, _ = build_derivatives(build_image_index(images_dir), output_dir, [32], None, derivatives, images_manifest)
+    assert again == derivatives
+
+
+def test_broken_icons_get_no_variants(images_dir, tmp_path):
+    result = optimize_images(build_image_index(images_dir), str(tmp_path / "icons"), ["png"])
+
+    assert result["images"][f"assets/{BROKEN}"]["variants"] == {}
+    assert "error" in result["images"][f"assets/{BROKEN}"]
+    assert len(os.listdir(tmp_path / "icons" / "assets")) == 2
+    assert variant_sizes(result)["png"] > 0
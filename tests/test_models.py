@@ -0,0 +1,27 @@
+from benchmarks.validation import synthetic_token, synthetic_tokenlist
+from scripts.models import check_tokenlist
+
+
+def test_inserted_token_only_revalidates_its_own_run():
+    tokenlist = synthetic_tokenlist(2000)
+    cache = set()
+    assert check_tokenlist(tokenlist, cache).validated == 2000
+
+    tokenlist["tokens"].insert(0, synthetic_token(2000))
+    tokenlist["tokenMap"] = None
+    report = check_tokenlist(tokenlist, cache)
+
+    assert report.ok
+    assert 0 < report.validated < 100 and report.validated + report.skipped == 2001
+
+
+def test_invalid_tokens_are_reported_at_their_position_and_never_cached():
+    tokenlist = synthetic_tokenlist(1000)
+    tokenlist["tokenMap"] = None
+    tokenlist["tokens"][700]["decimals"] = 19
+    cache = set()
+
+    for _ in range(2):
+        report = check_tokenlist(tokenlist, cache)
+        assert [error.index for error in report.token_errors] == [700]
+    assert report.validated < 1000
@@ -0,0 +1,150 @@
+import pytest
+from github import Auth, Github
+
+from scripts.output import OUTPUT_PROFILES, render_files
+from scripts.pages import GH_PAGES_BRANCH, git_blob_sha, publish_to_github_pages
+from tests.fake_github import FakeGitHub
+
+REPO_NAME = "curvefi/curve-assets"
+FIRST = "2024-01-01T00:00:00+00:00"
+SECOND = "2024-01-01T01:00:00+00:00"
+
+
+def tokenlists(count: int, timestamp: str = FIRST):
+    return {
+        f"network-{n}.json": {
+            "name": "Curve Token List",
+            "timestamp": timestamp,
+            "version": {"major": 1, "minor": 0, "patch": 0},
+            "tokens": [
+                {
+                    "chainId": n + 1,
+                    "address": f"0x{i:040x}",
+                    "name": f"Token {i}",
+                    "symbol": f"TKN{i}",
+                    "decimals": 18,
+                    "logoURI": f"https://example.com/{n}/{i}.png",
+                }
+                for i in range(5)
+            ],
+        }
+        for n in range(count)
+    }
+
+
+@pytest.fixture(autouse=True)
+def no_mirror(monkeypatch, tmp_path):
+    # Published timestamps are passed explicitly, never read from a local mirror
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def github():
+    with FakeGitHub(REPO_NAME) as fake:
+        yield fake
+
+
+def get_repo(fake: FakeGitHub):
+    # Same client as get_github_repo, without PyGithub's pause between write requests
+    client = Github(
+        auth=Auth.Token("test-token"),
+        base_url=fake.url,
+        seconds_between_requests=0,
+        seconds_between_writes=0,
+        lazy=True,
+    )
+    return client.get_repo(REPO_NAME)
+
+
+def with_gh_pages(fake: FakeGitHub) -> None:
+    fake.refs[f"heads/{GH_PAGES_BRANCH}"] = fake.refs[f"heads/{fake.default_branch}"]
+
+
+def writes(fake: FakeGitHub, kind: str) -> int:
+    return fake.requests[f"POST /repos/{REPO_NAME}/git/{kind}"]
+
+
+def test_changed_lists_are_published_in_one_tree_and_commit(github):
+    with_gh_pages(github)
+    lists = tokenlists(5)
+
+    result = publish_to_github_pages(lists, REPO_NAME, repo=get_repo(github))
+
+    assert sorted(result.changed) == sorted(lists)
+    assert writes(github, "trees") == 1
+    assert writes(github, "commits") == 1
+    assert github.refs[f"heads/{GH_PAGES_BRANCH}"] == result.commit_sha
+    files = github.files()
+    for path, tokenlist in lists.items():
+        assert files[path] == render_files(tokenlist, path, OUTPUT_PROFILES["default"])[path]
+
+
+def test_timestamp_only_changes_are_skipped(github):
+    with_gh_pages(github)
+    repo = get_repo(github)
+    publish_to_github_pages(tokenlists(3), REPO_NAME, repo=repo)
+    head = github.refs[f"heads/{GH_PAGES_BRANCH}"]
+    github.reset_counters()
+
+    republished = tokenlists(3, SECOND)
+    result = publish_to_github_pages(
+        republished, REPO_NAME, published_timestamps={path: FIRST for path in republished}, repo=repo
+    )
+
+    assert sorted(result.unchanged) == sorted(republished)
+    assert result.changed == [] and result.commit_sha is None
+    assert writes(github, "trees") == writes(github, "commits") == 0
+    assert github.refs[f"heads/{GH_PAGES_BRANCH}"] == head
+
+
+def test_compressed_siblings_are_compared_by_blob_sha(github):
+    pytest.importorskip("brotli")
+    profile = OUTPUT_PROFILES["compact"]
+    with_gh_pages(github)
+    repo = get_repo(github)
+    lists = tokenlists(2)
+    publish_to_github_pages(lists, REPO_NAME, profile, repo=repo)
+
+    tree = github.trees[github.commits[github.refs[f"heads/{GH_PAGES_BRANCH}"]]["tree"]]
+    for path, tokenlist in lists.items():
+        for file_path, data in render_files(tokenlist, path, profile).items():
+            assert file_path.endswith((".json", ".gz", ".br"))
+            assert tree[file_path] == git_blob_sha(data)
+
+    # Identical .gz and .br content is recognised from the tree alone, nothing is uploaded again
+    github.reset_counters()
+    published = {path: FIRST for path in lists}
+    result = publish_to_github_pages(tokenlists(2, SECOND), REPO_NAME, profile, published, repo)
+    assert len(result.unchanged) == 2
+    assert writes(github, "blobs") == 0
+
+    # A changed list is republished with fresh blobs for its siblings only
+    changed = tokenlists(2, SECOND)
+    changed["network-0.json"]["tokens"].pop()
+    result = publish_to_github_pages(changed, REPO_NAME, profile, published, repo)
+    assert result.changed == ["network-0.json"]
+    assert writes(github, "blobs") == len(profile.compressions)
+
+
+def test_gh_pages_is_created_when_missing(github):
+    assert f"heads/{GH_PAGES_BRANCH}" not in github.refs
+    main_head = github.refs[f"heads/{github.default_branch}"]
+
+    result = publish_to_github_pages(tokenlists(1), REPO_NAME, repo=get_repo(github))
+
+    assert github.requests[f"POST /repos/{REPO_NAME}/git/refs"] == 1
+    assert github.commits[result.commit_sha]["parents"] == [main_head]
+    assert github.refs[f"heads/{GH_PAGES_BRANCH}"] == result.commit_sha
+    assert github.refs[f"heads/{github.default_branch}"] == main_head
+
+
+def test_api_calls_do_not_depend_on_the_number_of_files():
+    calls = []
+    for count in (1, 25):
+        with FakeGitHub(REPO_NAME) as fake:
+            with_gh_pages(fake)
+            result = publish_to_github_pages(tokenlists(count), REPO_NAME, repo=get_repo(fake))
+            assert len(result.changed) == count
+            calls.append(fake.api_calls)
+
+    assert calls[0] == calls[1]
@@ -0,0 +1,29 @@
+import pytest
+
+from scripts import constants, process
+from scripts.pr_checks import check_changed_files
+
+Image = pytest.importorskip("PIL.Image")
+
+ETHEREUM_ICON = f"images/assets/0x{1:040x}.png"
+X_LAYER_ICON = f"images/assets-x-layer/0x{2:040x}.png"
+
+
+def test_contracts_without_an_endpoint_are_skipped_without_a_drpc_key(monkeypatch, tmp_path):
+    for path in (ETHEREUM_ICON, X_LAYER_ICON):
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGBA", (200, 200), (255, 0, 0, 255)).save(tmp_path / path)
+    monkeypatch.setattr(constants, "DRPC_KEY", None)
+    looked_up = []
+    monkeypatch.setattr(process, "process_network", lambda network, *args, **kwargs: looked_up.append(network))
+
+    report = check_changed_files([ETHEREUM_ICON, X_LAYER_ICON], root=str(tmp_path))
+
+    assert report.ok, report.findings
+    assert report.unchecked_networks == ["ethereum"]
+    assert looked_up == ["x-layer"] and report.icons_by_network == {"x-layer": 1}
+    assert all(
+        "None" not in url
+        for name in constants.NETWORKS
+        for url in constants.get_rpc_urls(name, constants.NETWORKS[name])
+    )
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_node import MockNode, synthetic_tokens
+from scripts.calls import erc20_metadata_calls
+from scripts.constants import MULTICALL_ADDRESS
+from scripts.rpc import (
+    PINNED_BLOCK_DEPTH,
+    AsyncRPCClient,
+    EndpointError,
+    EndpointPool,
+    ExecutionReverted,
+    RPCError,
+    get_block_number,
+)
+from scripts.utils import multicall_async
+
+TOKENS = synthetic_tokens(4, reverting=1)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def block_number(pool: EndpointPool, retries: int = 3) -> str:
+    async with AsyncRPCClient(pool, hedge=False, retries=retries, backoff=0) as client:
+        return await client.request("eth_blockNumber", [])
+
+
+def test_rate_limit_errors_are_retried_on_another_endpoint():
+    with MockNode(1, TOKENS, rate_limited_requests=100) as limited, MockNode(1, TOKENS) as node:
+        pool = EndpointPool([limited.url, node.url])
+
+        assert run(block_number(pool)) == hex(node.block_number)
+
+        limited_health, node_health = pool.endpoints
+        assert (limited_health.failures, node_health.failures) == (1, 0)
+        assert limited_health.latency is None and node_health.latency is not None
+
+
+def test_rate_limit_errors_in_batches_reach_multicall_as_retries():
+    calls = [call for token in TOKENS for call in erc20_metadata_calls(token.address.lower())]
+
+    async def fetch(pool: EndpointPool):
+        async with AsyncRPCClient(pool, hedge=False, backoff=0) as client:
+            return await multicall_async(client, MULTICALL_ADDRESS, [calls[:6], calls[6:]], rpc_batch_size=2)
+
+    with MockNode(1, TOKENS, rate_limited_requests=2) as limited, MockNode(1, TOKENS) as node:
+        results, failed_calls = run(fetch(EndpointPool([limited.url, node.url])))
+
+    assert sum(return_data is not None for batch in results for return_data in batch) == 9
+    assert len(failed_calls) == 3
+    assert node.rpc_calls["eth_call"] == 2
+
+
+def test_endpoint_errors_are_raised_once_retries_run_out():
+    with MockNode(1, TOKENS, rate_limited_requests=100) as limited:
+        pool = EndpointPool([limited.url])
+
+        with pytest.raises(EndpointError, match="rate limit"):
+            run(block_number(pool, retries=2))
+
+        assert limited.http_requests == 3
+        assert pool.endpoints[0].failures == 3
+
+
+def test_reverts_are_not_endpoint_failures():
+    reverting = next(token for token in TOKENS if token.reverts)
+    (call, *_) = erc20_metadata_calls(reverting.address.lower())
+
+    async def call_token(pool: EndpointPool):
+        async with AsyncRPCClient(pool, hedge=False, backoff=0) as client:
+            return await client.eth_call(call.address, call.call_data)
+
+    with MockNode(1, TOKENS) as node, MockNode(1, TOKENS) as other:
+        pool = EndpointPool([node.url, other.url])
+
+        with pytest.raises(ExecutionReverted):
+            run(call_token(pool))
+
+        assert node.http_requests == 1 and other.http_requests == 0
+        assert pool.endpoints[0].failures == 0
+
+
+def test_pinned_block_is_behind_the_lowest_head_in_sync():
+    with (
+        MockNode(1, TOKENS, block_number=1000) as ahead,
+        MockNode(1, TOKENS, block_number=990) as behind,
+        MockNode(1, TOKENS, block_number=500) as stale,
+    ):
+        assert run(get_block_number([ahead.url, behind.url, stale.url])) == 990 - PINNED_BLOCK_DEPTH
+        assert run(get_block_number([ahead.url, "http://127.0.0.1:1/"])) == 1000 - PINNED_BLOCK_DEPTH
+
+
+def test_cancelled_requests_only_raise_the_latency():
+    pool = EndpointPool(["http://node"])
+    endpoint = pool.endpoints[0]
+
+    # Without an answer there is nothing to bound
+    pool.record_cancelled(endpoint, 0.01)
+    assert endpoint.latency is None
+
+    pool.record_success(endpoint, 0.1)
+    pool.record_cancelled(endpoint, 0.01)
+    assert endpoint.latency == 0.1
+
+    pool.record_cancelled(endpoint, 1.1)
+    assert endpoint.latency == pytest.approx(0.1 + pool.alpha * 1.0)
+    assert list(endpoint.latencies) == [0.1]
+
+
+class ErroringNode(MockNode):
+    """Answers eth_blockNumber with an error that is the request's rather than the endpoint's."""
+
+    def dispatch(self, request):
+        if request.get("method") != "eth_blockNumber":
+            return super().dispatch(request)
+        return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32000, "message": "response too large"}}
+
+
+def test_block_number_error_replies_raise_rpc_errors():
+    with ErroringNode(1, TOKENS) as node:
+        with pytest.raises(RPCError, match="response too large"):
+            run(get_block_number([node.url]))
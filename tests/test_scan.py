@@ -0,0 +1,25 @@
+import os
+
+from scripts.constants import NETWORKS
+from scripts.images import build_image_index
+from scripts.scan import scan_tokenlist_and_images
+
+LISTED = f"0x{1:040x}"
+UNLISTED = f"0x{2:040x}"
+
+
+def test_tokens_of_unknown_chains_are_skipped(tmp_path):
+    os.makedirs(tmp_path / "assets")
+    (tmp_path / "assets" / f"{UNLISTED}.png").write_bytes(b"")
+    tokenlist = {
+        "tokenMap": {
+            f"{NETWORKS['ethereum'].chain_id}_{LISTED}": {},
+            f"999999999_{LISTED}": {},
+        }
+    }
+
+    networks, tokens_in_list, missing_tokens = scan_tokenlist_and_images(tokenlist, build_image_index(str(tmp_path)))
+
+    assert networks == ["ethereum"]
+    assert tokens_in_list == {"ethereum": [LISTED]}
+    assert sorted(missing_tokens["ethereum"]) == [LISTED, UNLISTED]
@@ -0,0 +1,58 @@
+import io
+import json
+
+import pytest
+
+from scripts.stream import TOKEN_MAP_FULL, read_tokenlist, token_key, write_tokenlist
+
+TOKENS = [
+    {"chainId": 1, "address": f"0x{i:040x}", "name": f"Token {i}", "symbol": f"TKN{i}", "decimals": 18}
+    for i in range(3)
+]
+# The layout update_tokenlist builds, and the baseline published: version comes after the tokenMap
+TOKENLIST = {
+    "name": "Curve Token List",
+    "logoURI": "https://example.com/logo.png",
+    "keywords": ["curve", "defi"],
+    "tags": {},
+    "timestamp": "2024-01-01T00:00:00+00:00",
+    "tokens": TOKENS,
+    "tokenMap": {token_key(token): token for token in TOKENS},
+    "version": {"major": 1, "minor": 0, "patch": 0},
+}
+
+
+def write(tokenlist: dict, **kwargs) -> str:
+    buffer = io.StringIO()
+    write_tokenlist(buffer, tokenlist, tokenlist["tokens"], **kwargs)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("indent", [None, 0, 2])
+def test_output_matches_json_dump(indent):
+    dump_kwargs = {"indent": indent} if indent is not None else {"separators": (",", ":")}
+    expected = json.dumps(TOKENLIST, **dump_kwargs) + ("\n" if indent is not None else "")
+
+    assert write(TOKENLIST, token_map=TOKEN_MAP_FULL, indent=indent) == expected
+
+
+def test_tokens_are_written_last_when_the_header_has_none():
+    header = {key: value for key, value in TOKENLIST.items() if key not in ("tokens", "tokenMap")}
+    written = write({**header, "tokens": TOKENS})
+    assert list(json.loads(written)) == [*header, "tokens", "tokenMap"]
+
+    buffer = io.StringIO()
+    write_tokenlist(buffer, header, TOKENS)
+    assert list(json.loads(buffer.getvalue())) == [*header, "tokens", "tokenMap"]
+
+
+def test_read_keeps_the_key_order():
+    tokenlist = read_tokenlist(io.StringIO(json.dumps(TOKENLIST)))
+
+    assert list(tokenlist) == [key for key in TOKENLIST if key != "tokenMap"]
+    assert tokenlist["tokens"] == TOKENS
+
+
+def test_negative_indent_is_rejected():
+    with pytest.raises(ValueError):
+        write(TOKENLIST, indent=-1)
@@ -0,0 +1,30 @@
+from benchmarks.mock_node import MockNode, synthetic_tokens
+from scripts.cache import TokenCache
+from scripts.constants import NETWORKS
+from scripts.rpc import EndpointPool
+from scripts.utils import get_token_info_batch
+
+NETWORK = NETWORKS["ethereum"]
+TOKENS = synthetic_tokens(4, reverting=1)
+# No contract at this address: the calls succeed with empty return data, which does not decode
+NO_CODE = f"0x{1:040x}"
+
+
+def test_only_reverted_tokens_are_negative_cached(tmp_path):
+    reverting = next(token.address.lower() for token in TOKENS if token.reverts)
+    addresses = [token.address.lower() for token in TOKENS] + [NO_CODE]
+    token_cache = TokenCache(str(tmp_path / "tokens.sqlite"))
+
+    with MockNode(NETWORK.chain_id, TOKENS) as node:
+        token_info, failed_tokens, _ = get_token_info_batch(
+            None, addresses, {}, NETWORK, token_cache, EndpointPool([node.url])
+        )
+
+    assert len(token_info) == 3
+    assert sorted(failed_tokens) == sorted([reverting, NO_CODE])
+    cached = token_cache.get_many(NETWORK.chain_id, addresses)
+    assert cached[reverting].failed
+    # Left out of the cache, so the next run asks again
+    assert NO_CODE not in cached
+    assert not any(entry.failed for address, entry in cached.items() if address != reverting)
+    token_cache.close()
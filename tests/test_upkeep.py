@@ -0,0 +1,89 @@
+import os
+from typing import Optional
+
+import pytest
+
+import upkeep
+from scripts import generate, pages
+from scripts.generate import ALL_NETWORKS
+from scripts.pages import PublishResult
+
+NETWORK_FOLDERS = {"ethereum": "assets", "polygon": "assets-polygon"}
+ADDRESSES = [f"0x{i:040x}" for i in range(1, 4)]
+NEW_ADDRESS = f"0x{4:040x}"
+
+
+def add_image(folder: str, address: str) -> None:
+    os.makedirs(os.path.join("images", folder), exist_ok=True)
+    with open(os.path.join("images", folder, f"{address}.png"), "wb") as f:
+        f.write(address.encode())
+
+
+def published() -> dict:
+    return {"timestamp": "2024-01-01T00:00:00+00:00", "tokens": [{"chainId": 1, "address": ADDRESSES[0]}]}
+
+
+@pytest.fixture
+def fan_out(monkeypatch, tmp_path):
+    """Run upkeep.fan_out against images in tmp_path, returning the image changes it generated with."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(upkeep, "NETWORKS_TO_IGNORE", [net for net in upkeep.NETWORKS if net not in NETWORK_FOLDERS])
+    for folder in NETWORK_FOLDERS.values():
+        for address in ADDRESSES:
+            add_image(folder, address)
+
+    # The first incremental run has no manifest to compare with and records one
+    monkeypatch.setattr(pages, "load_gh_pages_tokenlist", lambda repo_name, file_path: {})
+    monkeypatch.setattr(pages, "publish_to_github_pages", lambda *args, **kwargs: PublishResult())
+    monkeypatch.setattr(generate, "generate_tokenlists", lambda **kwargs: {})
+    upkeep.fan_out(cache_path=None, incremental=True)
+
+    def run(existing_tokenlists: dict, failed_tokens: Optional[dict] = None):
+        calls = []
+
+        def generate_tokenlists(**kwargs):
+            calls.append(kwargs)
+            kwargs["failed_tokens"].update(failed_tokens or {})
+            return {}
+
+        monkeypatch.setattr(
+            pages, "load_gh_pages_tokenlist", lambda repo_name, file_path: existing_tokenlists.get(file_path, {})
+        )
+        monkeypatch.setattr(generate, "generate_tokenlists", generate_tokenlists)
+        upkeep.fan_out(cache_path=None, incremental=True)
+        return calls[0]["image_changes"] if calls else "skipped"
+
+    return run
+
+
+def test_missing_network_list_is_regenerated_alone(fan_out):
+    add_image("assets", NEW_ADDRESS)
+
+    image_changes = fan_out({f"{name}.json": published() for name in ["ethereum", ALL_NETWORKS]})
+
+    assert image_changes.added == {"assets": [NEW_ADDRESS], "assets-polygon": ADDRESSES}
+    assert image_changes.changed == {} and image_changes.removed == {}
+
+
+def test_missing_network_list_is_regenerated_without_image_changes(fan_out):
+    image_changes = fan_out({f"{name}.json": published() for name in ["ethereum", ALL_NETWORKS]})
+
+    assert image_changes.added == {"assets-polygon": ADDRESSES}
+
+
+def test_nothing_is_generated_when_every_list_is_published_and_no_image_changed(fan_out):
+    assert fan_out({f"{name}.json": published() for name in [*NETWORK_FOLDERS, ALL_NETWORKS]}) == "skipped"
+
+
+def test_missing_aggregate_runs_a_full_generation(fan_out):
+    assert fan_out({f"{name}.json": published() for name in NETWORK_FOLDERS}) is None
+
+
+def test_failed_tokens_are_retried_by_the_next_incremental_run(fan_out):
+    tokenlists = {f"{name}.json": published() for name in [*NETWORK_FOLDERS, ALL_NETWORKS]}
+    add_image("assets", NEW_ADDRESS)
+
+    assert fan_out(tokenlists, failed_tokens={"ethereum": [NEW_ADDRESS]}).added == {"assets": [NEW_ADDRESS]}
+    # Still new to the manifest, so it is fetched again
+    assert fan_out(tokenlists).added == {"assets": [NEW_ADDRESS]}
+    assert fan_out(tokenlists) == "skipped"
@@ -1,11 +1,35 @@
 import argparse
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
 
 from rich.console import Console
 from rich.theme import Theme
 
+from scripts.batching import BatchSizeStore
+from scripts.cache import DEFAULT_CACHE_PATH, TokenCache, ValidationCache, get_validation_cache_path
 from scripts.constants import NETWORKS
-from scripts.generate import generate_tokenlist
-from scripts.pages import load_gh_pages_tokenlist, upload_to_github_pages
+from scripts.images import ImageIndex, build_image_index
+from scripts.manifest import (
+    ImageChanges,
+    diff_manifests,
+    get_manifest_path,
+    load_manifest,
+    save_manifest,
+    scan_manifest,
+    without_images,
+)
+from scripts.output import OUTPUT_PROFILES
+from scripts.telemetry import (
+    DEFAULT_METRICS_PATH,
+    DEFAULT_PROFILE_DIR,
+    DEFAULT_REPORT_PATH,
+    PROFILERS,
+    Telemetry,
+    count,
+    set_telemetry,
+    span,
+)
 
 # Create a custom theme for our logs
 custom_theme = Theme(
@@ -20,47 +44,305 @@ custom_theme = Theme(
 # Initialize Rich console with our custom theme
 console = Console(theme=custom_theme)
 
+REPO_NAME = "curvefi/curve-assets"
+NETWORKS_TO_IGNORE = ["assets-harmony"]
+
+
+@dataclass
+class ImageScan:
+    """The images folder of a run and, for incremental runs, the manifests its changes come from."""
+
+    index: ImageIndex
+    manifest_path: Optional[str] = None
+    previous_manifest: Dict = field(default_factory=dict)
+    current_manifest: Optional[Dict] = None
+
+    def changes(self) -> ImageChanges:
+        return diff_manifests(self.previous_manifest, self.current_manifest)
+
+
+@dataclass
+class RunCaches:
+    token_cache: Optional[TokenCache] = None
+    batch_sizes: Optional[BatchSizeStore] = None
+    # Keyed by output name, as the published files
+    validation_caches: Dict[str, ValidationCache] = field(default_factory=dict)
+
+
+def scan_images(output_name: str, networks: List[str], incremental: bool) -> ImageScan:
+    """Walk the images folder once for the whole run and, when incremental, compare it with the last manifest."""
+    with span("index_images"):
+        scan = ImageScan(build_image_index())
+    if incremental:
+        scan.manifest_path = get_manifest_path(output_name)
+        scan.previous_manifest = load_manifest(scan.manifest_path)
+        folders = [NETWORKS[net].folder_name for net in networks]
+        with span("manifest"):
+            scan.current_manifest = scan_manifest(scan.index, folders, scan.previous_manifest)
+    return scan
+
 
-def main(network: str):
+@contextmanager
+def open_caches(cache_path: Optional[str], output_names: List[str]) -> Iterator[RunCaches]:
+    """The caches used while generating, none with --no-cache. The token cache is closed on exit."""
+    if not cache_path:
+        yield RunCaches()
+        return
+    caches = RunCaches(
+        TokenCache(cache_path),
+        BatchSizeStore(),
+        {name: ValidationCache(get_validation_cache_path(name)) for name in output_names},
+    )
+    try:
+        yield caches
+    finally:
+        caches.token_cache.close()
+
+
+def finish_run(scan: ImageScan, caches: RunCaches, failed_tokens: Dict[str, List[str]]) -> None:
+    """
+    Save what the next run starts from, only once everything was published. Images of failed tokens
+    are left out of the manifest, so the next incremental run tries them again.
+    """
+    if scan.current_manifest is not None:
+        failed_images = {NETWORKS[network].folder_name: addresses for network, addresses in failed_tokens.items()}
+        save_manifest(without_images(scan.current_manifest, failed_images), scan.manifest_path)
+    for validation_cache in caches.validation_caches.values():
+        validation_cache.save()
+    if caches.batch_sizes:
+        caches.batch_sizes.save()
+    console.print("[green]Tokenlist generation and upload completed![/green]")
+
+
+def main(
+    network: str,
+    max_workers: int = 1,
+    cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+    incremental: bool = False,
+    profile: str = "default",
+):
+    # web3 and PyGithub take seconds to import, only pay for them when running
+    from scripts.generate import generate_tokenlist
+    from scripts.pages import load_gh_pages_tokenlist, upload_to_github_pages
 
     console.print("[info]Starting tokenlist generation and upload process...[/info]")
 
-    repo_name = "curvefi/curve-assets"
     file_path = f"{network}.json"
-    networks_to_ignore = ["assets-harmony"]
 
     # Determine file path based on networks
     if network == "all_networks":
-        networks_to_include = [net for net in NETWORKS.keys() if net != "assets-harmony"]
+        networks_to_include = [net for net in NETWORKS.keys() if net not in NETWORKS_TO_IGNORE]
     else:
         assert network in NETWORKS, f"Network '{network}' not found in NETWORKS."
         networks_to_include = [network]
 
     # Load existing tokenlist from GitHub Pages
     console.print("[info]Loading existing tokenlist from GitHub Pages...[/info]")
-    existing_tokenlist = load_gh_pages_tokenlist(repo_name, file_path)
+    with span("load_existing"):
+        existing_tokenlist = load_gh_pages_tokenlist(REPO_NAME, file_path)
+
+    # Compare the images against the manifest of the last run for this file
+    scan = scan_images(network, networks_to_include, incremental)
+    image_changes = None
+    if incremental:
+        if not scan.previous_manifest or not existing_tokenlist.get("tokens"):
+            console.print("[warning]No previous manifest or tokenlist, running a full generation[/warning]")
+        else:
+            image_changes = scan.changes()
+            if image_changes.is_empty():
+                console.print("[green]No image changes since the last run, nothing to do.[/green]")
+                return
 
     # Generate the new tokenlist
     console.print("[info]Generating new tokenlist...[/info]")
-    new_tokenlist = generate_tokenlist(
-        existing_tokenlist=existing_tokenlist,
-        networks_to_include=networks_to_include,
-        networks_to_ignore=networks_to_ignore,
-    )
+    failed_tokens = {}
+    with open_caches(cache_path, [network]) as caches:
+        with span("generate"):
+            new_tokenlist = generate_tokenlist(
+                existing_tokenlist=existing_tokenlist,
+                networks_to_include=networks_to_include,
+                networks_to_ignore=NETWORKS_TO_IGNORE,
+                max_workers=max_workers,
+                token_cache=caches.token_cache,
+                image_changes=image_changes,
+                image_index=scan.index,
+                validation_cache=caches.validation_caches.get(network),
+                batch_sizes=caches.batch_sizes,
+                failed_tokens=failed_tokens,
+            )
     console.print("[green]Tokenlist generated successfully.[/green]")
 
     # Upload the tokenlist to GitHub Pages
     console.print("[info]Uploading tokenlist to GitHub Pages...[/info]")
-    github_pages_url = upload_to_github_pages(new_tokenlist, repo_name, file_path)
+    with span("publish"):
+        github_pages_url = upload_to_github_pages(new_tokenlist, REPO_NAME, file_path, OUTPUT_PROFILES[profile])
 
     console.print("[green]Tokenlist successfully uploaded to GitHub Pages[/green]")
     console.print(f"[green]GitHub Pages URL: {github_pages_url}[/green]")
-    console.print("[green]Tokenlist generation and upload completed![/green]")
 
+    finish_run(scan, caches, failed_tokens)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Generate and upload tokenlist for specified networks.")
-    parser.add_argument("networks", help="Network to process, or 'all_networks' for all networks (except harmony)")
-    args = parser.parse_args()
 
-    main(args.networks)
+def fan_out(
+    max_workers: int = 1,
+    cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+    incremental: bool = False,
+    profile: str = "default",
+):
+    """Generate and publish every per-network tokenlist and all_networks.json from a single pass."""
+    from scripts.generate import ALL_NETWORKS, generate_tokenlists
+    from scripts.pages import get_gh_pages_url, load_gh_pages_tokenlist, publish_to_github_pages
+
+    console.print("[info]Starting generation and upload of all tokenlists...[/info]")
+
+    networks = [net for net in NETWORKS.keys() if net not in NETWORKS_TO_IGNORE]
+    names = [*networks, ALL_NETWORKS]
+
+    console.print("[info]Loading existing tokenlists from GitHub Pages...[/info]")
+    with span("load_existing"):
+        existing_tokenlists = {name: load_gh_pages_tokenlist(REPO_NAME, f"{name}.json") for name in names}
+
+    # One manifest for the whole fan-out, all lists are published together
+    scan = scan_images("fan-out", networks, incremental)
+    image_changes = None
+    if incremental:
+        missing = [name for name in names if not existing_tokenlists[name].get("tokens")]
+        # The aggregate holds every network, without it nothing can be patched
+        if not scan.previous_manifest or ALL_NETWORKS in missing:
+            console.print(
+                f"[warning]No previous manifest or {ALL_NETWORKS}.json is missing, running a full generation[/warning]"
+            )
+        else:
+            image_changes = scan.changes()
+            # Lists never published (or empty) are rebuilt from all their images, the others are patched
+            for name in missing:
+                folder_index = scan.index.for_network(name)
+                if folder_index is not None:
+                    image_changes.rebuild(folder_index.folder, folder_index.addresses)
+            if missing:
+                console.print(
+                    f"[warning]No published tokenlist for {', '.join(missing)}, generating them fully[/warning]"
+                )
+            if image_changes.is_empty():
+                console.print("[green]No image changes since the last run, nothing to do.[/green]")
+                return
+
+    console.print("[info]Generating new tokenlists...[/info]")
+    failed_tokens = {}
+    with open_caches(cache_path, names) as caches:
+        with span("generate"):
+            new_tokenlists = generate_tokenlists(
+                existing_tokenlists=existing_tokenlists,
+                networks_to_include=networks,
+                max_workers=max_workers,
+                token_cache=caches.token_cache,
+                image_changes=image_changes,
+                image_index=scan.index,
+                validation_caches=caches.validation_caches,
+                batch_sizes=caches.batch_sizes,
+                failed_tokens=failed_tokens,
+            )
+    console.print(f"[green]{len(new_tokenlists)} tokenlists generated successfully.[/green]")
+
+    console.print("[info]Uploading tokenlists to GitHub Pages...[/info]")
+    published_timestamps = {f"{name}.json": existing_tokenlists[name].get("timestamp") for name in names}
+    with span("publish"):
+        result = publish_to_github_pages(
+            {f"{name}.json": tokenlist for name, tokenlist in new_tokenlists.items()},
+            REPO_NAME,
+            OUTPUT_PROFILES[profile],
+            published_timestamps,
+        )
+    if result.commit_sha:
+        console.print(f"[green]Published {len(result.changed)} tokenlists in commit {result.commit_sha}[/green]")
+        for file_path in result.changed:
+            console.print(f"[green]GitHub Pages URL: {get_gh_pages_url(REPO_NAME, file_path)}[/green]")
+    console.print(f"[info]{len(result.unchanged)} tokenlists unchanged apart from their timestamp[/info]")
+
+    finish_run(scan, caches, failed_tokens)
+
+
+def cli(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog=prog, description="Generate and upload tokenlist for specified networks.")
+    parser.add_argument(
+        "networks",
+        nargs="?",
+        help="Network to process, or 'all_networks' for all networks (except harmony). Not used with --fan-out",
+    )
+    parser.add_argument(
+        "--fan-out",
+        action="store_true",
+        help="Generate and publish every per-network list and all_networks.json in one run",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of networks to process concurrently (default: 1, sequential)",
+    )
+    parser.add_argument(
+        "--cache-path",
+        default=DEFAULT_CACHE_PATH,
+        help=f"Token metadata cache location (default: {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Always fetch token metadata over RPC")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only process images added, removed or changed since the last run and patch the published list",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=sorted(OUTPUT_PROFILES),
+        default="default",
+        help="Output profile: 'default' (indented, full tokenMap) or 'compact' (minified, index tokenMap, .gz/.br)",
+    )
+    parser.add_argument(
+        "--report",
+        default=DEFAULT_REPORT_PATH,
+        help=f"Where to write the JSON run report with stage timings and counters (default: {DEFAULT_REPORT_PATH})",
+    )
+    parser.add_argument(
+        "--metrics",
+        default=DEFAULT_METRICS_PATH,
+        help=f"Where to write the run metrics for node_exporter's textfile collector (default: {DEFAULT_METRICS_PATH})",
+    )
+    parser.add_argument(
+        "--profile-stage",
+        action="append",
+        default=[],
+        metavar="STAGE",
+        help="Profile every run of this stage, e.g. process_network or multicall (repeatable)",
+    )
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile", help="Profiler for --profile-stage")
+    parser.add_argument(
+        "--profile-dir",
+        default=DEFAULT_PROFILE_DIR,
+        help=f"Where profiles are written (default: {DEFAULT_PROFILE_DIR})",
+    )
+    args = parser.parse_args(argv)
+    if not args.fan_out and not args.networks:
+        parser.error("a network is required unless --fan-out is given")
+
+    cache_path = None if args.no_cache else args.cache_path
+    telemetry = set_telemetry(Telemetry(args.profile_stage, args.profiler, args.profile_dir))
+    # Exported as 0 on success, so alerts can tell a good run from a missing metric
+    count("run_failures", 0)
+    try:
+        with span("run"):
+            if args.fan_out:
+                fan_out(args.workers, cache_path, args.incremental, args.profile)
+            else:
+                main(args.networks, args.workers, cache_path, args.incremental, args.profile)
+    except BaseException:
+        count("run_failures")
+        raise
+    finally:
+        # Written for failed runs as well, those are the ones worth looking into
+        telemetry.write_report(args.report)
+        telemetry.write_prometheus(args.metrics)
+        telemetry.display()
+
+
+if __name__ == "__main__":
+    cli()